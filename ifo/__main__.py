@@ -1 +1,87 @@
- 
+import os
+import sys
+import argparse
+import calendar
+from datetime import datetime
+
+# The modules of the package import each other by module name, as xlwings runs them from this folder
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import compute
+import metrics
+import sinks
+import session
+import tracing
+import warmer
+
+
+def parse_arguments(argv=None):
+    # Command line arguments to select the currency and month of which the dashboard metrics are printed
+    today = datetime.today()
+
+    parser = argparse.ArgumentParser(prog="ifo", description="Computes the dashboard metrics of a currency and month "
+                                                             "without Excel")
+    parser.add_argument("--currency", help="currency of the metrics (default: first currency of the database)")
+    parser.add_argument("--investment-currency", help="currency of the investment metrics (default: the currency)")
+    parser.add_argument("--year", type=int, default=today.year, help="year of the metrics (default: this year)")
+    parser.add_argument("--month", default=calendar.month_name[today.month],
+                        help="month name or number of the metrics (default: this month)")
+    parser.add_argument("--format", choices=sinks.OUTPUT_FORMATS, default="table", help="output format")
+    parser.add_argument("--output", help="file to write the metrics to (default: print them)")
+    parser.add_argument("--warm", action="store_true", help="compute and cache the metrics of every currency, year "
+                                                            "and month of the database instead of printing them")
+    parser.add_argument("--trace", metavar="DIR", help="directory to write a timing summary and a Chrome trace to")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    if args.trace is not None:
+        tracing.enable()
+
+    try:
+        month = metrics.get_month_number(int(args.month) if args.month.isdigit() else args.month.capitalize())
+    except ValueError:
+        month = None
+    if month is None or not 1 <= month <= 12:
+        print(f"Unknown month: {args.month}", file=sys.stderr)
+        return 2
+
+    # Fill the metric cache ahead of time, for the given currency or for all of them
+    if args.warm:
+        with warmer.BufferWarmer() as buffer_warmer:
+            result = buffer_warmer.warm(currencies=None if args.currency is None else [args.currency])
+        print(f"Computed {result['computed']} months, {result['skipped']} months were already cached")
+        if args.trace is not None:
+            tracing.save(args.trace)
+        return 0
+
+    # Get the complete transaction table
+    df = session.get_session().get_dataframe()
+
+    currency_list = compute.get_validation_list(df, "CurrencyValidation")
+    currency = currency_list[0] if args.currency is None and currency_list else args.currency
+    if currency not in currency_list:
+        print(f"Unknown currency: {currency}", file=sys.stderr)
+        return 2
+
+    # Compute all dashboard values for the selection, as a refreshed Dashboard would show them
+    selection_snapshot = compute.get_default_selection(df, currency, args.year, month,
+                                                       investment_currency=args.investment_currency)
+    value_dict = compute.get_dashboard_values(df, selection_snapshot)
+
+    if args.output is None:
+        sinks.dump_values(value_dict, sys.stdout, args.format)
+    else:
+        with sinks.FileSink(args.output, args.format) as sink:
+            sink.write(value_dict)
+
+    if args.trace is not None:
+        tracing.save(args.trace)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
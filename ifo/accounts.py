@@ -0,0 +1,135 @@
+import os
+import json
+import hashlib
+from os.path import join
+import pathlib
+import numpy as np
+import pandas as pd
+
+
+ACCOUNTS_PATH = join(pathlib.Path(__file__).parent.absolute(), "data", "accounts.json")
+
+# Account types used by the filters and balances
+ACCOUNT_TYPES = ["checking accounts", "saving accounts"]
+
+# Precomputed account type column of each account column
+ACCOUNT_TYPE_COLUMNS = {"Input Account": "Input Account Type", "Output Account": "Output Account Type"}
+
+# Short account type names, as used by the Dashboard
+SHORT_ACCOUNT_TYPES = {"checking": "checking accounts", "saving": "saving accounts"}
+
+# Registry shared by everything that runs in the process, created on first use
+_current_registry = None
+
+
+def get_registry():
+    global _current_registry
+
+    if _current_registry is None:
+        _current_registry = AccountRegistry()
+
+    return _current_registry
+
+
+def classify_account_by_name(account):
+    # Classifies an account by its name as a checking or a saving account
+    return "saving accounts" if "saving" in account else "checking accounts"
+
+
+def normalize_account_type(account_type):
+    # Converts short account type names ("checking" or "saving") into the account types of the filters
+    return SHORT_ACCOUNT_TYPES.get(account_type, account_type)
+
+
+class AccountRegistry:
+
+    def __init__(self, accounts_path=None):
+        # Classifies every distinct account once. The account type of an account can be set explicitly in the accounts
+        # json file ({"account name": {"type": "saving accounts"}}), otherwise it is derived from the account name
+        self.accounts_path = ACCOUNTS_PATH if accounts_path is None else accounts_path
+
+        # Explicit meta data per account, loaded on first use
+        self.metadata_dict = None
+
+        # Account type per account, classified on first use
+        self.type_dict = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def load_metadata(self):
+        # Loads the explicit account meta data, if the accounts file exists
+        if self.metadata_dict is None:
+            if os.path.exists(self.accounts_path):
+                with open(self.accounts_path, 'r', encoding='utf8') as file:
+                    self.metadata_dict = json.load(file)
+            else:
+                self.metadata_dict = dict()
+
+        return self.metadata_dict
+
+    def save_metadata(self):
+        # Saves the account meta data, writing a temporary file first so the accounts file is never half written
+        tmp_path = self.accounts_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf8') as file:
+            json.dump(self.load_metadata(), file, indent=4, sort_keys=True, ensure_ascii=False)
+        os.replace(tmp_path, self.accounts_path)
+
+    def get_version(self):
+        # Content hash of the account meta data, since it changes the classification of accounts
+        metadata_dict = self.load_metadata()
+        if not metadata_dict:
+            return ""
+
+        return hashlib.sha1(json.dumps(metadata_dict, sort_keys=True).encode('utf8')).hexdigest()
+
+    def set_account_type(self, account, account_type):
+        # Sets the account type of an account explicitly and saves it in the accounts file
+        account_type = normalize_account_type(account_type)
+        if account_type not in ACCOUNT_TYPES:
+            raise ValueError(f"Unknown account type: {account_type}")
+
+        self.load_metadata().setdefault(account, dict())['type'] = account_type
+        self.type_dict[account] = account_type
+        self.save_metadata()
+
+    def get_account_type(self, account):
+        # Gets the account type of an account, classifying it only the first time
+        account = str(account)
+        if account not in self.type_dict:
+            account_type = self.load_metadata().get(account, dict()).get('type')
+            self.type_dict[account] = classify_account_by_name(account) if account_type is None else account_type
+
+        return self.type_dict[account]
+
+    def is_account_type(self, account, account_type):
+        return self.get_account_type(account) == normalize_account_type(account_type)
+
+    def get_accounts_of_type(self, accounts, account_type):
+        # Gets the accounts of a list that belong to the account type
+        return [account for account in accounts if self.is_account_type(account, account_type)]
+
+    def classify_column(self, series):
+        # Gets the account type of every row of an account column as a categorical column.
+        # Each distinct account is only classified once
+        categorical = pd.Categorical(series.astype(str)) if not isinstance(series.dtype, pd.CategoricalDtype) \
+            else series.array
+        type_codes = np.array([ACCOUNT_TYPES.index(self.get_account_type(account))
+                               for account in categorical.categories] + [-1], dtype='int64')
+
+        # Missing accounts (code -1) pick the last entry, which is a missing account type as well
+        codes = type_codes[categorical.codes]
+
+        return pd.Series(pd.Categorical.from_codes(codes, categories=ACCOUNT_TYPES), index=series.index)
+
+    def add_account_type_columns(self, df):
+        # Returns the dataframe with the precomputed account type columns of its account columns
+        type_columns = {type_column: self.classify_column(df[column])
+                        for column, type_column in ACCOUNT_TYPE_COLUMNS.items() if column in df.columns}
+        if not type_columns:
+            return df
+
+        return df.assign(**type_columns)
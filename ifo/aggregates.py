@@ -0,0 +1,327 @@
+import weakref
+import threading
+import collections
+import numpy as np
+import pandas as pd
+
+import accounts
+
+
+# Dimensions of the monthly cube, besides the month itself
+CUBE_DIMENSIONS = ["Currency", "Type", "Category", "Input Account", "Output Account"]
+
+# Filter keys that can be answered with the monthly cube
+CUBE_FILTER_KEYS = CUBE_DIMENSIONS + ["Start Date", "End Date", "Input Account Type", "Output Account Type"]
+
+# Aggregated values per column of the transaction table
+CUBE_VALUE_COLUMNS = {"Input Value": "input", "Output Value": "output"}
+
+# Account types that can be used for balances
+ACCOUNT_TYPES = accounts.ACCOUNT_TYPES
+
+# Amount of tables of which the aggregates are kept per aggregate class, so the complete transaction table and a
+# filtered table can be used in turns without rebuilding their aggregates every time
+AGGREGATE_CACHE_SIZE = 4
+
+# Least recently used cache per aggregate class: dataframe key -> (dataframe, aggregate). The lock makes the cache
+# safe to use from the worker threads of a refresh
+_aggregate_cache = dict()
+_aggregate_lock = threading.RLock()
+
+# Database version per transaction table loaded from the database: id of the dataframe -> (weak reference, version).
+# The version is not kept in the attrs of the dataframe, since pandas copies the attrs to every slice and derived
+# table, which would then pass for the complete table of that version
+_dataframe_versions = dict()
+
+
+def get_month_number(date):
+    # Converts a date into a running month number, so months can be used as array positions
+    return date.year * 12 + date.month - 1
+
+
+def set_dataframe_version(df, version):
+    # Registers the database version of a transaction table. The entry is removed once the dataframe is freed
+    key = id(df)
+
+    def remove_version(reference):
+        with _aggregate_lock:
+            if key in _dataframe_versions and _dataframe_versions[key][0] is reference:
+                del _dataframe_versions[key]
+
+    with _aggregate_lock:
+        _dataframe_versions[key] = (weakref.ref(df, remove_version), version)
+
+
+def get_dataframe_version(df):
+    # Gets the database version of a transaction table loaded from the database, or None for any other dataframe
+    # (e.g. a slice or filtered table)
+    with _aggregate_lock:
+        entry = _dataframe_versions.get(id(df))
+
+    return entry[1] if entry is not None and entry[0]() is df else None
+
+
+def get_dataframe_key(df):
+    # Key that identifies a dataframe and the database version of its contents. The dataframe object itself is part
+    # of the key, since slices of a table of the same length would otherwise get the same key. The cache keeps the
+    # dataframe alive, so its id can't be reused by another dataframe while the entry exists
+    return id(df), get_dataframe_version(df)
+
+
+def get_class_cache(class_name):
+    return _aggregate_cache.setdefault(class_name, collections.OrderedDict())
+
+
+def get_cached_aggregate(df, aggregate_class):
+    # Returns the aggregate of the dataframe, building it only once per dataframe and database version
+    key = get_dataframe_key(df)
+    with _aggregate_lock:
+        class_cache = get_class_cache(aggregate_class.__name__)
+        if key in class_cache:
+            class_cache.move_to_end(key)
+            return class_cache[key][1]
+
+        aggregate = aggregate_class(df)
+        set_cached_aggregate(df, aggregate)
+
+    return aggregate
+
+
+def find_cached_aggregate(df, aggregate_class):
+    # Gets the aggregate of the dataframe if it has already been built, without building it
+    with _aggregate_lock:
+        entry = get_class_cache(aggregate_class.__name__).get(get_dataframe_key(df))
+
+    return None if entry is None else entry[1]
+
+
+def set_cached_aggregate(df, aggregate):
+    # Stores an aggregate that has been maintained for the dataframe, instead of being built from it. The least
+    # recently used entry is removed once the cache is full
+    with _aggregate_lock:
+        class_cache = get_class_cache(type(aggregate).__name__)
+        class_cache[get_dataframe_key(df)] = (df, aggregate)
+        class_cache.move_to_end(get_dataframe_key(df))
+        while len(class_cache) > AGGREGATE_CACHE_SIZE:
+            class_cache.popitem(last=False)
+
+
+def clear_aggregate_cache():
+    # Removes all cached aggregates
+    with _aggregate_lock:
+        _aggregate_cache.clear()
+
+
+def get_monthly_cube(df):
+    return get_cached_aggregate(df, MonthlyCube)
+
+
+def get_balance_index(df):
+    return get_cached_aggregate(df, BalanceIndex)
+
+
+def get_account_type(account):
+    # Gets the account type of an account from the account registry
+    return accounts.get_registry().get_account_type(account)
+
+
+class MonthlyCube:
+
+    def __init__(self, df):
+        # Materialized aggregates of the transaction table per currency, type, category, input/output account and month
+
+        # Date limits of the transactions, used to check if a date range can be answered with whole months
+        self.first_date = df['Date'].min() if len(df) > 0 else None
+        self.last_date = df['Date'].max() if len(df) > 0 else None
+
+        # Running month number of every transaction
+        month = get_month_number(df['Date'].dt).rename("Month")
+
+        # Single groupby pass over the transactions
+        aggregations = {'count': ("ID", "size")}
+        for column, prefix in CUBE_VALUE_COLUMNS.items():
+            aggregations[f'{prefix}_sum'] = (column, "sum")
+            aggregations[f'{prefix}_min'] = (column, "min")
+            aggregations[f'{prefix}_max'] = (column, "max")
+
+        grouped = df.groupby([df[dimension] for dimension in CUBE_DIMENSIONS] + [month], observed=True, sort=True)
+        self.table = grouped.agg(**aggregations).reset_index()
+
+        # Account types of the accounts of the cube, for the account type filters
+        self.table = accounts.get_registry().add_account_type_columns(self.table)
+
+        # Month range covered by the cube
+        if len(self.table) > 0:
+            self.first_month = int(self.table["Month"].min())
+            self.month_count = int(self.table["Month"].max()) - self.first_month + 1
+        else:
+            self.first_month = 0
+            self.month_count = 0
+
+        # Monthly arrays per filter selection, built on first use
+        self.series_cache = dict()
+
+    def is_filter_supported(self, filter_dict):
+        # Checks if all filters can be answered by the cube
+        return all(key in CUBE_FILTER_KEYS for key in filter_dict.keys())
+
+    def get_month_range(self, start_date=None, end_date=None):
+        # Converts a date range into a range of month positions in the cube.
+        # Returns None if the range doesn't consist of whole months, as the cube can't answer it then
+        if start_date is None or self.first_date is None or pd.Timestamp(start_date) <= self.first_date:
+            start_position = 0
+        else:
+            start_date = pd.Timestamp(start_date)
+            if start_date.day != 1:
+                return None
+            start_position = get_month_number(start_date) - self.first_month
+
+        if end_date is None or self.last_date is None or pd.Timestamp(end_date) >= self.last_date:
+            end_position = self.month_count - 1
+        else:
+            end_date = pd.Timestamp(end_date)
+            if (end_date + pd.Timedelta(days=1)).day != 1:
+                return None
+            end_position = get_month_number(end_date) - self.first_month
+
+        return max(start_position, 0), min(end_position, self.month_count - 1)
+
+    def get_selection_mask(self, selection):
+        # Gets the rows of the cube that belong to a selection of dimension values and account types
+        mask = np.ones(len(self.table), dtype=bool)
+        for key, value in selection:
+            if key in ["Input Account Type", "Output Account Type"]:
+                # Account types other than checking and saving accounts don't filter anything
+                if value in ACCOUNT_TYPES:
+                    mask &= (self.table[key] == value).to_numpy()
+            else:
+                mask &= (self.table[key] == value).to_numpy()
+
+        return mask
+
+    def get_monthly_series(self, selection):
+        # Gets the monthly arrays (sums, counts, minimums and maximums) of a selection.
+        # Sums and counts are stored as prefix sums, so any month range is answered with one subtraction
+        if selection in self.series_cache:
+            return self.series_cache[selection]
+
+        rows = self.table.loc[self.get_selection_mask(selection)]
+        positions = rows["Month"].to_numpy() - self.first_month
+
+        series = dict()
+        series['count'] = np.concatenate([[0], np.cumsum(np.bincount(positions, weights=rows['count'].to_numpy(),
+                                                                     minlength=self.month_count))])
+        for prefix in CUBE_VALUE_COLUMNS.values():
+            sums = np.bincount(positions, weights=rows[f'{prefix}_sum'].to_numpy(), minlength=self.month_count)
+            series[f'{prefix}_sum'] = np.concatenate([[0.0], np.cumsum(sums)])
+
+            minimums = np.full(self.month_count, np.inf)
+            np.minimum.at(minimums, positions, rows[f'{prefix}_min'].to_numpy())
+            series[f'{prefix}_min'] = minimums
+
+            maximums = np.full(self.month_count, -np.inf)
+            np.maximum.at(maximums, positions, rows[f'{prefix}_max'].to_numpy())
+            series[f'{prefix}_max'] = maximums
+
+        self.series_cache[selection] = series
+        return series
+
+    def aggregate(self, how, column, filter_dict):
+        # Answers an aggregate ("sum", "count", "min" or "max") of a column over a filter dictionary.
+        # Returns None if the filter can't be answered by the cube
+        if not self.is_filter_supported(filter_dict):
+            return None
+
+        month_range = self.get_month_range(filter_dict.get("Start Date"), filter_dict.get("End Date"))
+        if month_range is None:
+            return None
+
+        selection = tuple((key, value) for key, value in filter_dict.items() if key not in ["Start Date", "End Date"])
+        series = self.get_monthly_series(selection)
+        start_position, end_position = month_range
+
+        # A range without months results in an empty selection
+        if start_position > end_position:
+            return {"count": 0, "sum": 0.0}.get(how, np.nan)
+
+        if how == "count":
+            return int(series['count'][end_position + 1] - series['count'][start_position])
+
+        prefix = CUBE_VALUE_COLUMNS[column]
+        if how == "sum":
+            return float(series[f'{prefix}_sum'][end_position + 1] - series[f'{prefix}_sum'][start_position])
+
+        # Minimum and maximum values of the selected months
+        values = series[f'{prefix}_{how}'][start_position:end_position + 1]
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return np.nan
+
+        return float(values.min()) if how == "min" else float(values.max())
+
+
+class BalanceIndex:
+
+    def __init__(self, df):
+        # Running balances per currency, for every account, every account type and all accounts together.
+        # Each key holds the dates of the transactions touching it (sorted) and the cumulative balance after each of
+        # them, so the balance as of a date is found with a binary search
+
+        # Every transaction is split into an input flow (added to the input account) and an output flow (subtracted
+        # from the output account), ordered by date
+        df = df.sort_values("Date", kind="mergesort")
+        input_flows = pd.DataFrame({'Currency': df["Currency"].astype(str).to_numpy(),
+                                    'Account': df["Input Account"].astype(str).to_numpy(),
+                                    'Date': df["Date"].to_numpy(),
+                                    'Value': df["Input Value"].to_numpy()})
+        output_flows = pd.DataFrame({'Currency': df["Currency"].astype(str).to_numpy(),
+                                     'Account': df["Output Account"].astype(str).to_numpy(),
+                                     'Date': df["Date"].to_numpy(),
+                                     'Value': -df["Output Value"].to_numpy()})
+        flows = pd.concat([input_flows, output_flows]).sort_values("Date", kind="mergesort")
+
+        # Classify each distinct account once
+        account_types = {account: get_account_type(account) for account in flows['Account'].unique()}
+        flows['Account Type'] = flows['Account'].map(account_types)
+
+        self.balances = dict()
+        for key_type, key_column in [('account', 'Account'), ('account type', 'Account Type'), ('all', None)]:
+            group_columns = ['Currency'] if key_column is None else ['Currency', key_column]
+            for group_key, group in flows.groupby(group_columns, sort=False):
+                if key_column is None:
+                    currency = group_key[0] if isinstance(group_key, tuple) else group_key
+                    key = (currency, key_type, None)
+                else:
+                    key = (group_key[0], key_type, group_key[1])
+                self.balances[key] = (group['Date'].to_numpy(), np.cumsum(group['Value'].to_numpy()))
+
+    def get_balance_until(self, key, date, side='right'):
+        # Gets the cumulative balance of a key, up to and including the date (right side) or before it (left side)
+        if key not in self.balances:
+            return 0.0
+
+        dates, cumulative_balance = self.balances[key]
+        position = np.searchsorted(dates, np.datetime64(pd.Timestamp(date), 'ns'), side=side)
+        if position == 0:
+            return 0.0
+
+        return float(cumulative_balance[position - 1])
+
+    def get_balance(self, currency, end_date, start_date=None, account=None, account_type=None):
+        # Gets the balance of an account, an account type or all accounts of a currency between two dates
+        if account is not None:
+            key = (currency, 'account', account)
+        elif account_type in ACCOUNT_TYPES:
+            key = (currency, 'account type', account_type)
+        else:
+            key = (currency, 'all', None)
+
+        # An empty date range has no balance
+        if start_date is not None and pd.Timestamp(start_date) > pd.Timestamp(end_date):
+            return 0.0
+
+        balance = self.get_balance_until(key, end_date)
+        if start_date is not None:
+            balance -= self.get_balance_until(key, start_date, side='left')
+
+        return balance
@@ -1,46 +1,46 @@
 from os.path import join
 import pathlib
 import json
-import pandas as pd
-import xlwings as xw
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
-import calendar
 
-import database
+import tracing
 import dashboard
+import aggregates
+import compute
+import sheet_io
+import selection
+import session
 
 
-def get_unfiltered_database(df=None):
-    # Function gets the original database if none is provided in the parent method/function
+def get_unfiltered_database(df=None, current_session=None):
+    # Function gets the original database of the session if none is provided in the parent method/function
     if df is None:
-        with database.Database() as data:
-            df = data.get_current_database_dataframe()
+        df = session.get_session(current_session).get_dataframe()
 
     return df
 
 
-def filter_dataframe(unfiltered_df, filter_dict):
-    # Get dataframe for this calculation
-    with database.Database() as data:
-        filtered_df = data.filter_data_from_dataframe(filter_dict, df=unfiltered_df)
+def filter_dataframe(unfiltered_df, filter_dict, current_session=None):
+    # Get dataframe for this calculation, using the database object of the session
+    return session.get_session(current_session).filter_dataframe(filter_dict, df=unfiltered_df)
 
-    return filtered_df
 
+def aggregate_filtered_dataframe(unfiltered_df, filter_dict, column, how="sum", current_session=None):
+    # Aggregates a column over the filtered dataframe, using the database object of the session
+    return session.get_session(current_session).aggregate_filtered(filter_dict, column, how=how, df=unfiltered_df)
 
-def get_all_dashboard_validation_selections():
-    db = dashboard.Dashboard()
+
+def get_all_dashboard_validation_selections(current_session=None):
+    db = dashboard.Dashboard(current_session=current_session)
     return db.get_all_current_data_validation_selections()
 
 
-def get_earliest_dataframe_date(df=None):
+def get_earliest_dataframe_date(df=None, current_session=None):
     # Check if database dataframe is provided. If not, gets it
-    df = get_unfiltered_database(df)
-
-    # Convert date column of dataframe into datetime format
-    df['Date'] = pd.to_datetime(df['Date'])
+    df = get_unfiltered_database(df, current_session)
 
-    # Get the latest date
+    # Get the earliest date. The date column is already in datetime format
     earliest_date = df['Date'].min().date()
 
     return earliest_date
@@ -60,54 +60,82 @@ def save_json_file(json_path, dictionary):
 
 class Backend:
 
-    def __init__(self):
-        # Excel file path
-        self.wb_path = join(pathlib.Path(__file__).parent.absolute(), "IFO.xlsm")
+    def __init__(self, selection_snapshot=None, sink=None, current_session=None):
+        # Session holding the workbook handle and the transaction table shared by all objects of the process
+        self.session = session.get_session(current_session)
 
-        # xlwings parameters
-        self.wb = xw.Book(self.wb_path)
-        self.ws = self.wb.sheets["Backend"].api
-
-        # Validation selections from Dashboard
-        self.dashboard_selection_dict = get_all_dashboard_validation_selections()
+        # Excel file path
+        self.wb_path = self.session.database.wb_path
+
+        # xlwings parameters. The workbook is only opened when the selection has to be read from it or the results
+        # have to be written to it, so the Backend can also run without Excel
+        self.wb = None
+        self.ws = None
+        if selection_snapshot is None or sink is None:
+            self.wb = self.session.get_workbook()
+            self.ws = self.session.get_sheet("Backend")
+
+        # All writes are collected in a sink. By default this is the write plan of the backend sheet, which sends the
+        # values to the sheet in bulk
+        if sink is None:
+            sink = sheet_io.RangeWritePlan(self.ws, self.session.get_layout("Backend"))
+        self.write_plan = sink
+
+        # Snapshot of the validation selections from Dashboard and the inputs of the Backend sheet, read in bulk
+        if selection_snapshot is None:
+            dashboard_layout = self.session.get_layout("Dashboard")
+            backend_layout = self.session.get_layout("Backend")
+            selection_snapshot = selection.read_selection_snapshot(self.wb, dashboard_layout=dashboard_layout,
+                                                                   backend_layout=backend_layout)
+        self.selection = selection_snapshot
+        self.dashboard_selection_dict = self.selection.selection_dict
 
         # Get the earliest dataframe date (necessary for calculating balances
-        self.earliest_df_date = get_earliest_dataframe_date()
+        self.earliest_df_date = self.session.get_earliest_date()
 
-        # Buffer and buffer template json file paths
-        self.buffer_path = join(pathlib.Path(__file__).parent.absolute(), "data", "buffer.json")
+        # Cache of the evaluated metrics per database version, shared by the session
+        self.metric_cache = self.session.metric_cache
+
+        # Buffer template json file path
         self.template_path = join(pathlib.Path(__file__).parent.absolute(), "data", "buffer_template.json")
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        pass
+        if exc_type is None:
+            self.flush_writes()
 
-    def get_validation_end_date(self):
-        # Extracts the date selected through cell validation in the Dashboard sheet
-        ws = self.wb.sheets["Dashboard"].api
+    def write_range(self, named_range, value):
+        # Adds a value for a named range of the backend sheet to the write plan
+        self.write_plan.add(named_range, value)
 
-        month_validation_name = ws.Range("MonthValidation").Value
-        month_validation_num = datetime.strptime(month_validation_name, "%B").month
-        year_validation = int(ws.Range("YearValidation").Value)
+    def read_range(self, named_range):
+        # Reads the value of a named range, taking the values that are known by the sink into account
+        if self.write_plan.has_value(named_range):
+            return self.write_plan.get_value(named_range)
+        if self.ws is None:
+            raise ValueError(f"The value of {named_range} has not been computed yet")
 
-        last_day_month = calendar.monthrange(year_validation, month_validation_num)[1]
+        with tracing.span("Backend.read_range", "sheet", named_range=named_range):
+            return self.ws.Range(named_range).Value
 
-        validation_end_date = datetime(year=year_validation, month=month_validation_num, day=last_day_month).date()
-        return validation_end_date
+    def flush_writes(self):
+        # Sends all collected writes to the backend sheet
+        self.write_plan.flush()
+
+    def get_validation_end_date(self):
+        # Gets the last day of the month selected through cell validation in the Dashboard sheet
+        return self.selection.end_date
 
     def get_validation_start_date(self):
-        validation_end_date = self.get_validation_end_date()
-        return validation_end_date.replace(day=1)
+        return self.selection.start_date
 
     def get_validation_last_month_start_date(self):
-        validation_start_date = self.get_validation_start_date()
-        return validation_start_date - relativedelta(months=1)
+        return self.selection.last_month_start_date
 
     def get_validation_last_month_end_date(self):
-        validation_start_date = self.get_validation_start_date()
-        return validation_start_date - relativedelta(days=1)
+        return self.selection.last_month_end_date
 
     def create_filter_dict(self, start_date, end_date, transaction_type=None, category=None, input_account=None,
                            output_account=None, input_account_type=None, output_account_type=None,
@@ -135,6 +163,7 @@ class Backend:
 
         return filter_dict
 
+    @tracing.traced(category="backend")
     def get_sum_value_filtered_df(self, unfiltered_df, sum_column, start_date, end_date, transaction_type=None,
                                   category=None, input_account=None, output_account=None, input_account_type=None,
                                   output_account_type=None, bool_inv_currency=False):
@@ -145,12 +174,15 @@ class Backend:
                                               output_account, input_account_type, output_account_type,
                                               bool_inv_currency)
 
-        # Filters the dataframe with the defined filters
-        filtered_df = filter_dataframe(unfiltered_df, filter_dict)
+        # Whole month, quarter and year sums are looked up in the monthly cube of the database
+        cube_value = aggregates.get_monthly_cube(unfiltered_df).aggregate("sum", sum_column, filter_dict)
+        if cube_value is not None:
+            return cube_value
 
-        # Sums the entire column and returns the value
-        return filtered_df[sum_column].sum()
+        # Sums the column over the filtered transactions, without building the filtered dataframe
+        return aggregate_filtered_dataframe(unfiltered_df, filter_dict, sum_column, "sum", self.session)
 
+    @tracing.traced(category="backend")
     def get_account_balance(self, unfiltered_df, month_selection, account):
         start_date = self.earliest_df_date
         if month_selection == "this month":
@@ -158,14 +190,13 @@ class Backend:
         else:
             end_date = self.get_validation_last_month_end_date()
 
-        input_value = self.get_sum_value_filtered_df(unfiltered_df, "Input Value", start_date=start_date,
-                                                     end_date=end_date, input_account=account)
-
-        output_value = self.get_sum_value_filtered_df(unfiltered_df, "Output Value", start_date=start_date,
-                                                      end_date=end_date, output_account=account)
+        # The balance is looked up in the running balance index of the database
+        balance_index = aggregates.get_balance_index(unfiltered_df)
 
-        return input_value - output_value
+        return balance_index.get_balance(self.dashboard_selection_dict['CurrencyValidation'], end_date,
+                                         start_date=start_date, account=account)
 
+    @tracing.traced(category="backend")
     def get_total_balance(self, unfiltered_df, month_selection, account_type):
 
         start_date = self.earliest_df_date
@@ -174,19 +205,18 @@ class Backend:
         else:
             end_date = self.get_validation_last_month_end_date()
 
-        input_value = self.get_sum_value_filtered_df(unfiltered_df, "Input Value", start_date=start_date,
-                                                     end_date=end_date, input_account_type=account_type)
+        # The balance is looked up in the running balance index of the database
+        balance_index = aggregates.get_balance_index(unfiltered_df)
 
-        output_value = self.get_sum_value_filtered_df(unfiltered_df, "Output Value", start_date=start_date,
-                                                      end_date=end_date, output_account_type=account_type)
-
-        return input_value - output_value
+        return balance_index.get_balance(self.dashboard_selection_dict['CurrencyValidation'], end_date,
+                                         start_date=start_date, account_type=account_type)
 
+    @tracing.traced(category="backend")
     def monthly_spending_earning_block(self, transaction_type, unfiltered_df=None):
         # Updates the values in the cells related to the specific function named topic
 
         # Check if database dataframe is provided. If not, gets it
-        unfiltered_df = get_unfiltered_database(unfiltered_df)
+        unfiltered_df = get_unfiltered_database(unfiltered_df, self.session)
 
         if transaction_type == "spending":
             parameter_id = "Spend"
@@ -207,14 +237,15 @@ class Backend:
                                                           transaction_type=transaction_type)
 
         # Fill in the backend sheet with calculations
-        self.ws.Range(f'ThisMonth{parameter_id}').Value = value_this_month
-        self.ws.Range(f'LastMonth{parameter_id}').Value = value_last_month
+        self.write_range(f'ThisMonth{parameter_id}', value_this_month)
+        self.write_range(f'LastMonth{parameter_id}', value_last_month)
 
+    @tracing.traced(category="backend")
     def monthly_balance_and_saving_block(self, unfiltered_df=None, saving_bool=False):
         # Updates the values in the cells related to the specific function named topic
 
         # Check if database dataframe is provided. If not, gets it
-        unfiltered_df = get_unfiltered_database(unfiltered_df)
+        unfiltered_df = get_unfiltered_database(unfiltered_df, self.session)
 
         # Defines parameters based on the type of block that will be updated: checking or saving
         if saving_bool is True:
@@ -234,8 +265,8 @@ class Backend:
         balance_value_last_month = self.get_total_balance(unfiltered_df, "last month", account_type=account_type)
 
         # Fill in the backend sheet with calculations for total balance, except savings
-        self.ws.Range('ThisMonthTotal' + id_parameter).Value = balance_value_this_month
-        self.ws.Range('LastMonthTotal' + id_parameter).Value = balance_value_last_month
+        self.write_range('ThisMonthTotal' + id_parameter, balance_value_this_month)
+        self.write_range('LastMonthTotal' + id_parameter, balance_value_last_month)
 
         # Perform the same tasks but then for specific accounts
         for i, named_range in enumerate([f"MostUsed{id_parameter2}Account", f"{id_parameter2}AccountValidation",
@@ -249,14 +280,15 @@ class Backend:
             balance_account_last_month = self.get_account_balance(unfiltered_df, "last month",
                                                                   account=account)
 
-            self.ws.Range(f'ThisMonth{id_parameter}{i + 1}').Value = balance_account_this_month
-            self.ws.Range(f'LastMonth{id_parameter}{i + 1}').Value = balance_account_last_month
+            self.write_range(f'ThisMonth{id_parameter}{i + 1}', balance_account_this_month)
+            self.write_range(f'LastMonth{id_parameter}{i + 1}', balance_account_last_month)
 
+    @tracing.traced(category="backend")
     def week_quarter_spending_and_investment_block(self, unfiltered_df=None, bool_inv=False):
         # Updates the values in the cells related to the specific function named topic
 
         # Check if database dataframe is provided. If not, gets it
-        unfiltered_df = get_unfiltered_database(unfiltered_df)
+        unfiltered_df = get_unfiltered_database(unfiltered_df, self.session)
 
         # Defines parameters based on the type of block that will be updated: checking or saving
         if bool_inv is True:
@@ -290,7 +322,7 @@ class Backend:
                                                       start_date=start_date, end_date=end_date,
                                                       transaction_type=transaction_type, bool_inv_currency=bool_inv)
 
-        self.ws.Range(focus_parameter).Value = period_value
+        self.write_range(focus_parameter, period_value)
 
         # Calculate and fill in quarter spending or investment from selected validation year
         for i in range(1, 5):
@@ -302,97 +334,84 @@ class Backend:
                                                            transaction_type=transaction_type,
                                                            bool_inv_currency=bool_inv)
 
-            self.ws.Range(f"Quarter{i}{transaction_type.capitalize()}").Value = quarter_value
+            self.write_range(f"Quarter{i}{transaction_type.capitalize()}", quarter_value)
 
+    @tracing.traced(category="backend")
     def recent_transactions_block(self, unfiltered_df=None):
         # Updates the values in the cells related to the specific function named topic
 
         # Check if database dataframe is provided. If not, gets it
-        unfiltered_df = get_unfiltered_database(unfiltered_df)
-
-        # Apply a filter to obtain the dataframe from the last 365 days in current currency
-        today = datetime.today().date()
-        start_date = today - relativedelta(years=1)
-        end_date = today
+        unfiltered_df = get_unfiltered_database(unfiltered_df, self.session)
 
-        filter_dict = self.create_filter_dict(start_date=start_date, end_date=end_date)
-        filtered_df = filter_dataframe(unfiltered_df, filter_dict)
-
-        # Get the last 10 rows from the dataframe
-        df_tail = filtered_df.tail(10).iloc[::-1]
+        # Get the last 10 transactions from the last 365 days in current currency
+        currency = self.dashboard_selection_dict['CurrencyValidation']
+        recent_dict = compute.get_recent_transactions(unfiltered_df, currency)
 
         # Fill in the values of the Recent Transactions Table
-        for i in range(0, 10):
-            self.ws.Range(f"RecentDate{i + 1}").Value = df_tail['Date'].iloc[i].strftime("%x %X")
-            self.ws.Range(f"RecentType{i + 1}").Value = df_tail['Type'].iloc[i]
-            self.ws.Range(f"RecentCategory{i + 1}").Value = df_tail['Category'].iloc[i]
-            self.ws.Range(f"RecentCurrency{i + 1}").Value = df_tail['Currency'].iloc[i]
-            self.ws.Range(f"RecentInputValue{i + 1}").Value = df_tail['Input Value'].iloc[i]
-            self.ws.Range(f"RecentInputAccount{i + 1}").Value = df_tail['Input Account'].iloc[i]
-            self.ws.Range(f"RecentOutputValue{i + 1}").Value = df_tail['Output Value'].iloc[i]
-            self.ws.Range(f"RecentOutputAccount{i + 1}").Value = df_tail['Output Account'].iloc[i]
-            self.ws.Range(f"RecentDescription{i + 1}").Value = df_tail['Description'].iloc[i]
+        for named_range, value in recent_dict.items():
+            self.write_range(named_range, value)
 
+    @tracing.traced(category="backend")
     def average_day_spending_chart(self, unfiltered_df=None):
         # Updates the values of this topic, which updates the related chart displayed in the Dashboard
 
         # Check if database dataframe is provided. If not, gets it
-        unfiltered_df = get_unfiltered_database(unfiltered_df)
+        unfiltered_df = get_unfiltered_database(unfiltered_df, self.session)
 
         # Average spending
         # Get the value of this month spending
-        this_month_spending = self.ws.Range("ThisMonthSpend").Value
+        this_month_spending = self.read_range("ThisMonthSpend")
 
         # Get the maximum amount of days in this month
         maximum_days_in_month = self.get_validation_end_date().day
 
         # Return the result to the backend sheet
-        self.ws.Range("AverageSpending").Value = round(this_month_spending / maximum_days_in_month, 2)
+        self.write_range("AverageSpending", round(this_month_spending / maximum_days_in_month, 2))
 
         # Maximal spending
         # Create a filter dictionary for the spending this month
         start_date = self.get_validation_start_date()
         end_date = self.get_validation_end_date()
         filter_dict = self.create_filter_dict(start_date, end_date, transaction_type="spending")
-        this_month_spending_df = filter_dataframe(unfiltered_df, filter_dict)
 
         # Get the maximum spending value
-        maximum_spending = this_month_spending_df["Output Value"].max()
-        self.ws.Range("MaximalSpending").Value = maximum_spending
+        maximum_spending = aggregate_filtered_dataframe(unfiltered_df, filter_dict, "Output Value", "max",
+                                                        self.session)
+        self.write_range("MaximalSpending", maximum_spending)
 
         # Get the minimal spending
-        minimal_spending = this_month_spending_df['Output Value'].min()
-        self.ws.Range("MinimalSpending").Value = minimal_spending
+        minimal_spending = aggregate_filtered_dataframe(unfiltered_df, filter_dict, "Output Value", "min",
+                                                        self.session)
+        self.write_range("MinimalSpending", minimal_spending)
 
-        # Get today's spending
+        # Get today's spending. Today is only part of the filter if it lies within this month
         today = datetime.today().date()
-        today_spending_df = this_month_spending_df.loc[this_month_spending_df["Date"] == today]
-        today_spending = today_spending_df["Output Value"].sum()
-        self.ws.Range("TodaySpending").Value = today_spending
+        today_filter_dict = dict(filter_dict)
+        today_filter_dict['Start Date'] = max(start_date, today)
+        today_filter_dict['End Date'] = min(end_date, today)
+        today_spending = aggregate_filtered_dataframe(unfiltered_df, today_filter_dict, "Output Value", "sum",
+                                                      self.session)
+        self.write_range("TodaySpending", today_spending)
 
         # Last month average spending
-        last_month_spending = self.ws.Range("LastMonthSpend").Value
+        last_month_spending = self.read_range("LastMonthSpend")
         maximum_days_last_month = self.get_validation_last_month_end_date().day
-        self.ws.Range("LastMonthAvSpending").Value = round(last_month_spending / maximum_days_last_month, 2)
+        self.write_range("LastMonthAvSpending", round(last_month_spending / maximum_days_last_month, 2))
 
+    @tracing.traced(category="backend")
     def spending_per_category_chart(self, unfiltered_df=None):
         # Updates the values of this topic, which updates the related chart displayed in the Dashboard
 
         # Check if database dataframe is provided. If not, gets it
-        unfiltered_df = get_unfiltered_database(unfiltered_df)
+        unfiltered_df = get_unfiltered_database(unfiltered_df, self.session)
 
         # Get the list of categories available
-        category_tuple = self.ws.Range("ListedCategories").Value
-        category_list = [item for t in category_tuple for item in t]
+        category_list = self.selection.category_list
 
         # The calculation is performed for every listed category for all 12 months
         # Obtain first a filtered dataframe for spending based on the complete year of display
-        end_year_number = int(self.ws.Range("EndYearNumber").Value)
-        end_month_number = int(self.ws.Range("EndMonthNumber").Value)
-
-        last_day = calendar.monthrange(end_year_number, end_month_number)[1]
-        year_end_date = datetime(year=end_year_number, month=end_month_number, day=last_day).date()
-        year_start_date = year_end_date + relativedelta(days=1) - relativedelta(years=1)
+        end_year_number = self.selection.end_year_number
+        year_start_date = self.selection.chart_start_date
 
         for category in category_list:
             for month_num in range(0, 12):
@@ -404,7 +423,7 @@ class Backend:
                                                                        end_date=month_end_date, category=category)
 
                 named_range = f"Spending{category.title().replace(' ', '')}MonthNum{month_num + 1}"
-                self.ws.Range(named_range).Value = category_spending_sum
+                self.write_range(named_range, category_spending_sum)
 
             # Calculate the total spend in a year basis for the specific category
             total_spending_sum = self.get_sum_value_filtered_df(unfiltered_df, sum_column="Output Value",
@@ -412,25 +431,22 @@ class Backend:
                                                                 end_date=datetime(end_year_number, 12, 31).date(),
                                                                 category=category)
 
-            self.ws.Range(f"{category.title().replace(' ', '')}YearTotalSpending").Value = total_spending_sum
+            self.write_range(f"{category.title().replace(' ', '')}YearTotalSpending", total_spending_sum)
 
+    @tracing.traced(category="backend")
     def transaction_per_type_chart(self, unfiltered_df=None):
         # Updates the values of this topic, which updates the related chart displayed in the Dashboard
 
         # Check if database dataframe is provided. If not, gets it
-        unfiltered_df = get_unfiltered_database(unfiltered_df)
+        unfiltered_df = get_unfiltered_database(unfiltered_df, self.session)
 
         # Get the list of types available
         type_list = ["spending", "earning", "change", "investment"]
 
         # The calculation is performed for every listed category for all 12 months
         # Obtain first a filtered dataframe for spending based on the complete year of display
-        end_year_number = int(self.ws.Range("EndYearNumber").Value)
-        end_month_number = int(self.ws.Range("EndMonthNumber").Value)
-
-        last_day = calendar.monthrange(end_year_number, end_month_number)[1]
-        year_end_date = datetime(year=end_year_number, month=end_month_number, day=last_day).date()
-        year_start_date = year_end_date + relativedelta(days=1) - relativedelta(years=1)
+        end_year_number = self.selection.end_year_number
+        year_start_date = self.selection.chart_start_date
 
         for trn_type in type_list:
 
@@ -448,7 +464,7 @@ class Backend:
                                                           end_date=month_end_date, transaction_type=trn_type)
 
                 named_range = f"{trn_type.capitalize()}MonthNum{month_num + 1}"
-                self.ws.Range(named_range).Value = type_sum
+                self.write_range(named_range, type_sum)
 
             # Calculate the total spend in a year basis for the specific category
             type_total_sum = self.get_sum_value_filtered_df(unfiltered_df, sum_column=sum_column,
@@ -456,20 +472,21 @@ class Backend:
                                                             end_date=datetime(end_year_number, 12, 31).date(),
                                                             transaction_type=trn_type)
 
-            self.ws.Range(f"{trn_type.capitalize()}YearTotal").Value = type_total_sum
+            self.write_range(f"{trn_type.capitalize()}YearTotal", type_total_sum)
 
+    @tracing.traced(category="backend")
     def investment_portfolio_chart(self, unfiltered_df=None):
         # Updates the values of this topic, which updates the related chart displayed in the Dashboard
 
         # Check if database dataframe is provided. If not, gets it
-        unfiltered_df = get_unfiltered_database(unfiltered_df)
+        unfiltered_df = get_unfiltered_database(unfiltered_df, self.session)
 
-        # Calculate the total value of investments made for stocks and bonds until month and year validation
+        # Calculate the total value of investments made for stocks and bonds until month and year validation, and until
+        # the end of the month before it
         inv_start_date = self.earliest_df_date
-        inv_end_date = self.get_validation_end_date()
 
         # General function for obtaining the total invested value for bonds and stocks
-        def total_invested_value(ws, dataframe, start_date, end_date, category, output_range_name):
+        def total_invested_value(dataframe, start_date, end_date, category, output_range_name):
             output_value = self.get_sum_value_filtered_df(dataframe, "Output Value", start_date, end_date,
                                                           transaction_type="investment", category=category,
                                                           bool_inv_currency=True)
@@ -477,37 +494,36 @@ class Backend:
                                                          transaction_type="earning", category=category,
                                                          bool_inv_currency=True)
 
-            ws.Range(output_range_name).Value = output_value - input_value
+            self.write_range(output_range_name, output_value - input_value)
 
         # Fill in all named ranges with the balance of investments of bonds and stocks
         for count, named_range in enumerate(["TotalInvestedBonds", "TotalInvestedStocks", "TotalInvestedLastMonthBonds",
                                              "TotalInvestedLastMonthStocks"]):
             if "LastMonth" in named_range:
-                inv_end_date = inv_end_date - relativedelta(months=1)
+                inv_end_date = self.get_validation_last_month_end_date()
+            else:
+                inv_end_date = self.get_validation_end_date()
             if "Bonds" in named_range:
                 inv_type = "bonds"
             else:
                 inv_type = "stocks"
 
-            total_invested_value(self.ws, unfiltered_df, inv_start_date, inv_end_date, inv_type, named_range)
+            total_invested_value(unfiltered_df, inv_start_date, inv_end_date, inv_type, named_range)
 
+    @tracing.traced(category="backend")
     def spending_per_type_chart(self, unfiltered_df=None):
         # Updates the values of this topic, which updates the related chart displayed in the Dashboard
 
         # Check if database dataframe is provided. If not, gets it
-        unfiltered_df = get_unfiltered_database(unfiltered_df)
+        unfiltered_df = get_unfiltered_database(unfiltered_df, self.session)
 
         # Get a list of the possible transactions
         transaction_list = ["spending", "earning", "change", "investment"]
 
         # The calculation is performed for every listed category for all 12 months
         # Obtain first a filtered dataframe for spending based on the complete year of display
-        end_year_number = int(self.ws.Range("EndYearNumber").Value)
-        end_month_number = int(self.ws.Range("EndMonthNumber").Value)
-
-        last_day = calendar.monthrange(end_year_number, end_month_number)[1]
-        year_end_date = datetime(year=end_year_number, month=end_month_number, day=last_day).date()
-        year_start_date = year_end_date + relativedelta(days=1) - relativedelta(years=1)
+        end_year_number = self.selection.end_year_number
+        year_start_date = self.selection.chart_start_date
 
         for transaction in transaction_list:
             for month_num in range(0, 12):
@@ -524,74 +540,71 @@ class Backend:
                                                                  end_date=month_end_date, transaction_type=transaction)
 
                 named_range = f"{transaction.capitalize()}MonthNum{month_num + 1}"
-                self.ws.Range(named_range).Value = transaction_sum
+                self.write_range(named_range, transaction_sum)
 
-    def collect_buffer_data(self):
-        # This function uses the buffer template to collect all values from named ranges in the backend sheet.
-        # The data is then stored in the buffer.json file for future use
-        # The primary motive of this is to reduce the amount calculations, increasing performance
+    def get_database_version(self):
+        # Version of the database contents the session's transaction table belongs to
+        return aggregates.get_dataframe_version(self.session.get_dataframe())
 
-        # Get relevant validation selections
-        currency = self.dashboard_selection_dict["CurrencyValidation"]
-        year = str(self.dashboard_selection_dict["YearValidation"])
-        month = self.dashboard_selection_dict["MonthValidation"]
+    @tracing.traced(category="backend")
+    def fill_backend_with_metrics(self, unfiltered_df=None):
+        # Evaluates all named ranges of the buffer template in a single computation and fills in the backend sheet.
+        # The results are cached per database version, so a repeated refresh of the same selection is served from cache
 
-        # Get the buffer template dictionary
-        template_dict = load_json_file(self.template_path)
+        # Check if database dataframe is provided. If not, gets it
+        unfiltered_df = get_unfiltered_database(unfiltered_df, self.session)
 
-        # Load the buffer json file and get that dictionary
-        buffer_dict = load_json_file(self.buffer_path)
+        # Evaluate all metrics of the buffer template, unless they are cached for this version of the database
+        version = aggregates.get_dataframe_version(unfiltered_df)
+        template_dict = load_json_file(self.template_path)
+        metric_values = self.metric_cache.get_or_compute(
+            version, self.selection,
+            lambda: compute.get_backend_metrics(unfiltered_df, self.selection, template_dict=template_dict))
+        self.metric_cache.save()
 
-        # Check if buffer dictionary has the keys required
-        if currency not in buffer_dict:
-            buffer_dict[currency] = {}
-        if year not in buffer_dict[currency]:
-            buffer_dict[currency][year] = {}
-        if month not in buffer_dict[currency][year]:
-            buffer_dict[currency][year][month] = {}
+        # Fill in the backend sheet with the results
+        for named_range, value in metric_values.items():
+            self.write_range(named_range, value)
+        self.flush_writes()
 
-        # Fill in the buffer dictionary with all the data from the backend sheet
-        for named_range in template_dict.keys():
-            buffer_dict[currency][year][month][named_range] = self.ws.Range(named_range).Value
+        return metric_values
 
-        # Save the buffer json file
-        save_json_file(self.buffer_path, buffer_dict)
+    @tracing.traced(category="backend")
+    def collect_buffer_data(self):
+        # This function uses the buffer template to collect all values from named ranges in the backend sheet.
+        # The data is stored in the metric cache for the current database version, so it is never served once the
+        # database has changed
 
-    def clear_buffer(self):
-        # Clears all content from buffer to refresh the data to be stored
+        # Get the buffer template dictionary
+        template_dict = load_json_file(self.template_path)
 
-        # Get buffer dictionary from json file
-        buffer_dict = load_json_file(self.buffer_path)
+        # Fill in the cache with all the data from the backend sheet
+        values = {named_range: self.read_range(named_range) for named_range in template_dict.keys()}
+        self.metric_cache.put(self.get_database_version(), self.selection, values)
 
-        # Clear buffer dictionary
-        buffer_dict.clear()
+        # Save the cache file
+        self.metric_cache.save()
 
-        # Save dictionary in buffer json file
-        save_json_file(self.buffer_path, buffer_dict)
+    def clear_buffer(self):
+        # Clears all content from the metric cache. This is not required after database edits, since every entry is
+        # tied to the database version it was computed for
+        self.metric_cache.clear()
+        self.metric_cache.save()
 
+    @tracing.traced(category="backend")
     def fill_backend_with_buffer_data(self):
-        # This function fills in all the relevant named ranges in the backend sheet with data from the buffer
-
-        # Get relevant validation selections
-        currency = self.dashboard_selection_dict["CurrencyValidation"]
-        year = str(self.dashboard_selection_dict["YearValidation"])
-        month = self.dashboard_selection_dict["MonthValidation"]
-
-        # Load the buffer json file and get that dictionary
-        buffer_dict = load_json_file(self.buffer_path)
+        # This function fills in all the relevant named ranges in the backend sheet with data from the metric cache
 
-        # Checks first if the specific sub dictionary for the current validation selections exists
-        # If it doesn't exist, it will return with a false boolean. Else, it will fill in the backend sheet
-        if currency not in buffer_dict:
-            return False
-        elif year not in buffer_dict[currency]:
-            return False
-        elif month not in buffer_dict[currency][year]:
+        # If the values of the current validation selections are not cached for the current database version, it will
+        # return with a false boolean. Else, it will fill in the backend sheet
+        values = self.metric_cache.get(self.get_database_version(), self.selection)
+        if values is None:
             return False
-        else:
-            for named_range, value in buffer_dict[currency][year][month].items():
-                self.ws.Range(named_range).Value = value
-            return True
+
+        for named_range, value in values.items():
+            self.write_range(named_range, value)
+        self.flush_writes()
+        return True
 
 
 def tester():
@@ -618,7 +631,8 @@ def tester():
     # test.clear_buffer()
     # print(test.fill_backend_with_buffer_data())
 
+    test.flush_writes()
+
 
 if __name__ == '__main__':
     tester()
-
@@ -0,0 +1,59 @@
+import os
+import sys
+import json
+import argparse
+
+# The modules of the package import each other by module name, as xlwings runs them from the ifo folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import runner
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(prog="ifo.benchmarks", description="Benchmarks the database, filters, Backend "
+                                                                        "blocks and metric cache on generated "
+                                                                        "transaction tables")
+    parser.add_argument("--rows", type=int, nargs="+", default=runner.DEFAULT_ROW_COUNTS,
+                        help="row counts of the generated tables (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the transaction generator (default: 0)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark (default: 3)")
+    parser.add_argument("--output", help="json file to write the results to")
+    parser.add_argument("--startup", action="store_true", help="benchmark the cold start of the entry points instead "
+                                                               "of the generated tables")
+    parser.add_argument("--compare", help="json file with the results of another commit to compare with")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    if args.repeat < 1:
+        print("The amount of runs per benchmark must be at least 1", file=sys.stderr)
+        return 2
+
+    with runner.BenchmarkRunner(row_counts=args.rows, seed=args.seed, repeat=args.repeat, log=sys.stdout) as bench:
+        if args.startup:
+            bench.run_startup_benchmarks()
+            results = bench.get_results()
+        else:
+            results = bench.run()
+        if args.output is not None:
+            bench.save(args.output)
+
+    if args.compare is not None:
+        with open(args.compare, 'r', encoding='utf8') as file:
+            previous_results = json.load(file)
+
+        comparison = runner.compare_results(previous_results, results)
+        print()
+        runner.print_comparison(comparison)
+
+        # A regression makes the run fail, so it can be used as a check between commits
+        if any(is_regression for *_, is_regression in comparison):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+from datetime import date
+import numpy as np
+import pandas as pd
+
+import schema
+
+
+# Last date of the generated transactions. It is fixed, so the same seed always generates the same table
+END_DATE = date(2021, 12, 31)
+
+# Share of the transactions per currency
+CURRENCIES = {"EUR": 0.45, "BRL": 0.45, "USD": 0.07, "GBP": 0.03}
+
+# Checking and saving accounts per currency. Saving accounts carry "saving" in their name, like in the real database
+ACCOUNTS = {"EUR": (["ING", "revolut", "cash"],
+                    ["ING saving buffer", "ING saving vacation", "revolut saving vacation"]),
+            "BRL": (["nubank", "BB", "cash"],
+                    ["BB saving", "nuconta saving"]),
+            "USD": (["chase", "cash"],
+                    ["chase saving"]),
+            "GBP": (["monzo", "cash"],
+                    ["monzo saving"])}
+
+# Share of the transactions per type
+TYPES = {"spending": 0.73, "change": 0.18, "earning": 0.08, "investment": 0.01}
+
+# Categories per type
+CATEGORIES = {"spending": ["supermarket", "restaurant", "leisure", "clothes", "gadgets", "health", "gym", "taxes",
+                           "transport", "housing", "vacation", "gifts"],
+              "change": ["credit card payment", "cash withdrawal", "savings", "account exchange", "cash deposit"],
+              "earning": ["job", "person", "selling", "refund", "discount", "government"],
+              "investment": ["bonds", "mutual funds", "stocks"]}
+
+# Mean and standard deviation of the logarithm of the transaction values per type
+VALUE_SCALES = {"spending": (3.0, 1.1), "change": (6.0, 1.0), "earning": (5.5, 1.2), "investment": (7.5, 0.8)}
+
+# Merchants and places the descriptions are made of, mixing Portuguese and English strings
+MERCHANTS = ["Padaria São João", "Pão de Açúcar", "Açougue Boi Bão", "Farmácia Popular", "Café Brasília",
+             "Drogaria São Paulo", "Lojas Americanas", "iFood *Restaurante", "Posto Ipiranga", "Livraria Cultura",
+             "Albert Heijn", "Jumbo Supermarkt", "Starbucks Coffee", "Amazon Marketplace", "Uber Trip", "Shell Station",
+             "Netflix.com", "Spotify", "Decathlon", "IKEA"]
+PLACES = ["São Paulo", "Rio de Janeiro", "Belo Horizonte", "Florianópolis", "Amsterdam", "Utrecht", "Rotterdam",
+          "London", "Lisboa", "Online"]
+
+# Amount of distinct descriptions per transaction, with a minimum for small tables
+DESCRIPTION_RATIO = 0.2
+MINIMUM_DESCRIPTION_COUNT = 200
+
+# Share of the most recent transactions that have not been completed yet
+NEW_STATUS_RATIO = 0.05
+
+
+def get_descriptions(rng, description_count):
+    # Gets a pool of distinct descriptions: merchant and place, with a reference number for most of them
+    descriptions = [f"{merchant} {place}" for merchant in MERCHANTS for place in PLACES]
+    number_count = max(description_count - len(descriptions), 0)
+    numbers = rng.choice(max(100000, 10 * number_count), size=number_count, replace=False)
+    descriptions += [f"{descriptions[number % len(descriptions)]} *{number:05d}" for number in numbers]
+
+    return np.array(descriptions[:description_count], dtype=object)
+
+
+def choose(rng, values, size, probabilities=None):
+    # Chooses values of a list (optionally with probabilities) as an object array
+    return np.array(values, dtype=object)[rng.choice(len(values), size=size, p=probabilities)]
+
+
+def generate_transactions(row_count, seed=0, years=10, end_date=None):
+    # Generates a realistic transaction table with the columns of the database: several currencies, checking and
+    # saving accounts, categories per type and dates spread over the given amount of years. The same seed always
+    # generates the same table
+    rng = np.random.default_rng(seed)
+    if end_date is None:
+        end_date = END_DATE
+
+    # Dates in order of entry
+    end_date = pd.Timestamp(end_date)
+    start_date = end_date - pd.DateOffset(years=years) + pd.Timedelta(days=1)
+    day_count = (end_date - start_date).days + 1
+    dates = start_date + pd.to_timedelta(np.sort(rng.integers(0, day_count, size=row_count)), unit='D')
+
+    currencies = choose(rng, list(CURRENCIES), row_count, list(CURRENCIES.values()))
+    types = choose(rng, list(TYPES), row_count, list(TYPES.values()))
+
+    categories = np.empty(row_count, dtype=object)
+    input_values = np.zeros(row_count)
+    output_values = np.zeros(row_count)
+    for transaction_type, category_list in CATEGORIES.items():
+        mask = types == transaction_type
+        categories[mask] = choose(rng, category_list, int(mask.sum()))
+
+        mean, sigma = VALUE_SCALES[transaction_type]
+        values = np.round(rng.lognormal(mean, sigma, size=int(mask.sum())), 2)
+        if transaction_type in ["spending", "investment"]:
+            output_values[mask] = values
+        elif transaction_type == "earning":
+            input_values[mask] = values
+        else:
+            input_values[mask] = values
+            output_values[mask] = values
+
+    # Spending and investments leave a checking account, earnings enter one and changes move money between a
+    # checking and a saving account, in either direction
+    input_accounts = np.full(row_count, "", dtype=object)
+    output_accounts = np.full(row_count, "", dtype=object)
+    for currency, (checking_accounts, saving_accounts) in ACCOUNTS.items():
+        currency_mask = currencies == currency
+        checking = choose(rng, checking_accounts, row_count)
+        saving = choose(rng, saving_accounts, row_count)
+        to_saving = rng.random(row_count) < 0.5
+
+        mask = currency_mask & np.isin(types, ["spending", "investment"])
+        output_accounts[mask] = checking[mask]
+
+        mask = currency_mask & (types == "earning")
+        input_accounts[mask] = checking[mask]
+
+        mask = currency_mask & (types == "change")
+        input_accounts[mask] = np.where(to_saving, saving, checking)[mask]
+        output_accounts[mask] = np.where(to_saving, checking, saving)[mask]
+
+    # Descriptions follow a long tail: a few merchants are used very often, most of them rarely
+    description_pool = get_descriptions(rng, max(int(row_count * DESCRIPTION_RATIO), MINIMUM_DESCRIPTION_COUNT))
+    description_numbers = (rng.zipf(1.3, size=row_count) - 1) % len(description_pool)
+    descriptions = description_pool[rng.permutation(len(description_pool))[description_numbers]]
+
+    statuses = np.full(row_count, "completed", dtype=object)
+    statuses[int(row_count * (1 - NEW_STATUS_RATIO)):] = "new"
+
+    df = pd.DataFrame({"ID": np.arange(1, row_count + 1),
+                       "Status": statuses,
+                       "Date": dates,
+                       "Type": types,
+                       "Category": categories,
+                       "Currency": currencies,
+                       "Input Value": input_values,
+                       "Output Value": output_values,
+                       "Input Account": input_accounts,
+                       "Output Account": output_accounts,
+                       "Description": descriptions})
+
+    return schema.apply_schema(df)
@@ -0,0 +1,319 @@
+import os
+from os.path import join
+import sys
+import json
+import time
+import platform
+import tempfile
+import subprocess
+import statistics
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+import store
+import journal
+import sinks
+import backend
+import orchestrator
+import compute
+import aggregates
+import session
+import database
+import metric_cache
+import snapshots
+from benchmarks import generator
+from benchmarks import startup
+
+
+# Format of the results file
+RESULTS_FORMAT = 1
+
+# Row counts of the generated tables that are benchmarked by default
+DEFAULT_ROW_COUNTS = [10000, 100000]
+
+# Currency, year and month of the benchmarked Dashboard selection
+BENCHMARK_CURRENCY = "EUR"
+BENCHMARK_YEAR = 2021
+BENCHMARK_MONTH = 6
+
+# Blocks of the Backend in the order a refresh runs them, with their arguments. The average day spending chart reads
+# the spending of this and last month from the spending block
+BACKEND_BLOCKS = [("monthly_spending_earning_block", ("spending",)),
+                  ("monthly_spending_earning_block", ("earning",)),
+                  ("monthly_balance_and_saving_block", (None, False)),
+                  ("monthly_balance_and_saving_block", (None, True)),
+                  ("week_quarter_spending_and_investment_block", (None, False)),
+                  ("week_quarter_spending_and_investment_block", (None, True)),
+                  ("average_day_spending_chart", ()),
+                  ("spending_per_category_chart", ()),
+                  ("transaction_per_type_chart", ()),
+                  ("investment_portfolio_chart", ()),
+                  ("spending_per_type_chart", ()),
+                  ("recent_transactions_block", ()),
+                  ("fill_backend_with_metrics", ())]
+
+# Slowdown of the median time from which a benchmark is reported as a regression
+REGRESSION_THRESHOLD = 1.2
+
+
+def get_commit():
+    # Gets the commit of the repository the benchmarks run on, if it is a git repository
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_environment():
+    return {'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform()}
+
+
+def get_block_name(block, arguments):
+    # Name of a Backend block in the results, including the arguments that select its variant
+    variant = [str(argument) for argument in arguments if argument is not None]
+    return f"backend {block}" + (f" ({', '.join(variant)})" if variant else "")
+
+
+def create_database(directory):
+    # Creates a database object that keeps its store and journal in a directory of its own
+    db = database.Database()
+    db.database_dir = directory
+    db.database_path = join(directory, 'database.json')
+    db.store_dir = join(directory, 'store')
+    db.journal_path = join(directory, 'journal.jsonl')
+    db.snapshot_dir = join(directory, 'snapshots')
+    db.store = store.ColumnStore(db.store_dir)
+    db.journal = journal.TransactionJournal(db.journal_path)
+    db.snapshots = snapshots.SnapshotStore(db.snapshot_dir)
+
+    return db
+
+
+def compare_results(previous_results, results, threshold=REGRESSION_THRESHOLD):
+    # Compares the median times of two results files per row count and benchmark. Returns a list of
+    # (rows, benchmark, previous median, median, ratio, is regression)
+    previous_dict = {(result['rows'], result['benchmark']): result['median'] for result in previous_results['results']}
+
+    comparison = list()
+    for result in results['results']:
+        previous_median = previous_dict.get((result['rows'], result['benchmark']))
+        if previous_median is None or previous_median == 0:
+            continue
+        ratio = result['median'] / previous_median
+        comparison.append((result['rows'], result['benchmark'], previous_median, result['median'], ratio,
+                           ratio > threshold))
+
+    return comparison
+
+
+class BenchmarkRunner:
+
+    def __init__(self, row_counts=None, seed=0, repeat=3, log=None):
+        # Runs all benchmarks on generated tables of each row count. Every benchmark is repeated, the first run is
+        # reported separately since it includes building caches and indexes
+        self.row_counts = DEFAULT_ROW_COUNTS if row_counts is None else row_counts
+        self.seed = seed
+        self.repeat = repeat
+        self.log = log
+
+        self.results = list()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def add_result(self, row_count, benchmark, times):
+        result = {'rows': row_count,
+                  'benchmark': benchmark,
+                  'first': times[0],
+                  'min': min(times),
+                  'median': statistics.median(times),
+                  'times': times}
+        self.results.append(result)
+
+        if self.log is not None:
+            print(f"{row_count:>10} {benchmark:<70} {result['median'] * 1000:>12.2f} ms", file=self.log)
+
+    def time_function(self, row_count, benchmark, function, repeat=None):
+        # Times a function and adds the times to the results. Returns the result of the last run
+        times = list()
+        value = None
+        for run in range(self.repeat if repeat is None else repeat):
+            start = time.perf_counter()
+            value = function()
+            times.append(time.perf_counter() - start)
+
+        self.add_result(row_count, benchmark, times)
+        return value
+
+    def run_store_benchmarks(self, row_count, db, df):
+        # Saving and loading the complete table, and loading a single month with the predicate pushdown of the store
+        self.time_function(row_count, "store save", lambda: db.save_database_store(df))
+        df = self.time_function(row_count, "store load", db.get_current_database_dataframe)
+
+        month_start = pd.Timestamp(BENCHMARK_YEAR, BENCHMARK_MONTH, 1)
+        month_end = month_start + pd.offsets.MonthEnd(0)
+        self.time_function(row_count, "store load month", lambda: db.get_current_database_dataframe(
+            start_date=month_start, end_date=month_end))
+
+        # The month load replaced the table of the database object
+        db.database_df = df
+        return df
+
+    def run_filter_benchmarks(self, row_count, db, df):
+        month_start = pd.Timestamp(BENCHMARK_YEAR, BENCHMARK_MONTH, 1).date()
+        month_end = (pd.Timestamp(month_start) + pd.offsets.MonthEnd(0)).date()
+        year_start = pd.Timestamp(BENCHMARK_YEAR, 1, 1).date()
+        year_end = pd.Timestamp(BENCHMARK_YEAR, 12, 31).date()
+
+        filter_cases = {
+            "month spending": {"Currency": BENCHMARK_CURRENCY, "Start Date": month_start, "End Date": month_end,
+                               "Type": "spending"},
+            "year saving accounts": {"Currency": BENCHMARK_CURRENCY, "Start Date": year_start, "End Date": year_end,
+                                     "Input Account Type": "saving accounts"},
+            "value range": {"Currency": BENCHMARK_CURRENCY, "Minimum Output Value": 100.0,
+                            "Maximum Output Value": 1000.0},
+            "description": {"Description": "sao paulo"},
+            "description prefix": {"Description Prefix": "pada"},
+        }
+        for name, filter_dict in filter_cases.items():
+            self.time_function(row_count, f"filter {name}", lambda: db.filter_data_from_dataframe(filter_dict, df=df))
+            self.time_function(row_count, f"aggregate sum {name}",
+                               lambda: db.aggregate_filtered(filter_dict, "Output Value", "sum", df=df))
+
+    def run_backend_benchmarks(self, row_count, current_session, df):
+        # Runs every block of the Backend for the benchmark selection, timing each block separately
+        selection_snapshot = compute.get_default_selection(df, BENCHMARK_CURRENCY, BENCHMARK_YEAR, BENCHMARK_MONTH)
+        selection_snapshot.category_list = generator.CATEGORIES["spending"]
+
+        times_dict = {get_block_name(block, arguments): list() for block, arguments in BACKEND_BLOCKS}
+        for run in range(self.repeat):
+            backend_object = backend.Backend(selection_snapshot=selection_snapshot, sink=sinks.MemorySink(),
+                                             current_session=current_session)
+            for block, arguments in BACKEND_BLOCKS:
+                name = get_block_name(block, arguments)
+                arguments = [df if argument is None else argument for argument in arguments]
+                start = time.perf_counter()
+                getattr(backend_object, block)(*arguments)
+                times_dict[name].append(time.perf_counter() - start)
+
+        for name, times in times_dict.items():
+            self.add_result(row_count, name, times)
+
+        # All blocks of a refresh together, as the Refresh button computes them
+        refresh_orchestrator = orchestrator.Orchestrator(current_session=current_session)
+        self.time_function(row_count, "backend refresh",
+                           lambda: refresh_orchestrator.compute_blocks(selection_snapshot, df=df))
+
+    def run_validation_benchmarks(self, row_count, df):
+        self.time_function(row_count, "validation lists", lambda: compute.get_validation_lists(df, BENCHMARK_CURRENCY))
+        self.time_function(row_count, "most used accounts",
+                           lambda: compute.get_most_used_accounts(df, BENCHMARK_CURRENCY))
+
+    def run_buffer_benchmarks(self, row_count, directory, db, df):
+        # Filling the metric cache with the twelve months of a year, serving them from it, saving and loading it and
+        # bringing it to the next database version after a new transaction
+        cache_path = join(directory, 'buffer.json')
+        cache = metric_cache.MetricCache(cache_path=cache_path)
+        template_dict = cache.get_template()
+        version = aggregates.get_dataframe_version(df)
+        selections = [compute.get_default_selection(df, BENCHMARK_CURRENCY, BENCHMARK_YEAR, month)
+                      for month in range(1, 13)]
+
+        def fill_cache(cache_object):
+            for selection_snapshot in selections:
+                cache_object.get_or_compute(version, selection_snapshot, lambda: compute.get_backend_metrics(
+                    df, selection_snapshot, template_dict=template_dict))
+
+        self.time_function(row_count, "buffer compute 12 months",
+                           lambda: fill_cache(metric_cache.MetricCache(cache_path=cache_path)))
+        fill_cache(cache)
+        self.time_function(row_count, "buffer hit 12 months", lambda: fill_cache(cache))
+        self.time_function(row_count, "buffer save", cache.save)
+        self.time_function(row_count, "buffer load", lambda: metric_cache.MetricCache(cache_path=cache_path).load())
+
+        # A single new transaction in the benchmark month
+        new_transaction = {"Status": "new", "Date": pd.Timestamp(BENCHMARK_YEAR, BENCHMARK_MONTH, 15),
+                           "Type": "spending", "Category": "supermarket", "Currency": BENCHMARK_CURRENCY,
+                           "Input Value": 0.0, "Output Value": 12.5, "Input Account": "", "Output Account": "ING",
+                           "Description": "Albert Heijn Amsterdam"}
+        db.change_log.clear()
+        new_df = self.time_function(row_count, "new transaction",
+                                    lambda: db.new_transaction_to_dataframe(new_transaction, df=df), repeat=1)
+        previous_version, new_version, changed_transactions = db.change_log[-1]
+
+        def recompute_function(selection_snapshot, today):
+            return compute.get_backend_metrics(new_df, selection_snapshot, template_dict=template_dict, today=today)
+
+        self.time_function(row_count, "buffer apply edit",
+                           lambda: cache.apply_edit(previous_version, new_version, changed_transactions,
+                                                    recompute_function=recompute_function), repeat=1)
+
+    def run_row_count(self, row_count):
+        df = self.time_function(row_count, "generate", lambda: generator.generate_transactions(row_count,
+                                                                                               seed=self.seed),
+                                repeat=1)
+
+        with tempfile.TemporaryDirectory() as directory:
+            db = create_database(directory)
+            df = self.run_store_benchmarks(row_count, db, df)
+            self.run_filter_benchmarks(row_count, db, df)
+
+            current_session = session.Session()
+            current_session.database = db
+            current_session.metric_cache = metric_cache.MetricCache(cache_path=join(directory, 'session_buffer.json'))
+            current_session.set_dataframe(df)
+            self.run_backend_benchmarks(row_count, current_session, df)
+
+            self.run_validation_benchmarks(row_count, df)
+            self.run_buffer_benchmarks(row_count, directory, db, df)
+
+    def run_startup_benchmarks(self):
+        # Cold start of every entry point of the workbook buttons, each run in a new interpreter. The results have no
+        # row count, as the entry points don't load any data before they do their work
+        for entry_point, modules in startup.get_entry_points().items():
+            wall_times, loaded_modules = list(), list()
+            for run in range(self.repeat):
+                wall_time, loaded_modules = startup.measure_startup(entry_point, modules)
+                wall_times.append(wall_time)
+
+            self.add_result(0, f"startup {entry_point}", wall_times)
+
+            if self.log is not None and statistics.median(wall_times) > startup.STARTUP_BUDGET:
+                budget = startup.STARTUP_BUDGET * 1000
+                print(f"{'':>10} {entry_point} exceeds the startup budget of {budget:.0f} ms, it loads "
+                      f"{', '.join(loaded_modules) or 'no heavy modules'}", file=self.log)
+
+    def run(self):
+        for row_count in self.row_counts:
+            self.run_row_count(row_count)
+
+        return self.get_results()
+
+    def get_results(self):
+        return {'format': RESULTS_FORMAT,
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'commit': get_commit(),
+                'environment': get_environment(),
+                'seed': self.seed,
+                'repeat': self.repeat,
+                'results': self.results}
+
+    def save(self, results_path):
+        # Saves the results as json, so they can be compared with the results of another commit
+        with open(results_path, 'w', encoding='utf8') as file:
+            json.dump(self.get_results(), file, indent=4)
+
+
+def print_comparison(comparison, file=sys.stdout):
+    for row_count, benchmark, previous_median, median, ratio, is_regression in comparison:
+        flag = "REGRESSION" if is_regression else ""
+        print(f"{row_count:>10} {benchmark:<70} {previous_median * 1000:>12.2f} ms {median * 1000:>12.2f} ms "
+              f"{ratio:>6.2f}x {flag}", file=file)
@@ -0,0 +1,69 @@
+import os
+from os.path import join
+import ast
+import sys
+import json
+import time
+import subprocess
+
+
+IFO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_POINT_PATH = join(IFO_DIR, 'ifo.py')
+
+# Functions of the entry point module that are not run by the buttons of the workbook
+EXCLUDED_FUNCTIONS = ["tester"]
+
+# Dependencies of which the benchmark reports whether an entry point loads them
+HEAVY_MODULES = ["pandas", "numpy", "xlwings", "dateutil", "pymsgbox", "openpyxl"]
+
+# Cold start time an entry point should stay below. Lightweight actions must not import the heavy dependencies
+STARTUP_BUDGET = 0.2
+
+# Script run in a new interpreter for every measurement: it imports the entry point module and the modules the entry
+# point imports when it runs, and prints the heavy dependencies that have been loaded
+STARTUP_SCRIPT = """
+import sys, json, importlib
+sys.path.insert(0, {ifo_dir!r})
+import ifo
+getattr(ifo, {entry_point!r})
+for module in {modules!r}:
+    importlib.import_module(module)
+print(json.dumps([module for module in {heavy_modules!r} if module in sys.modules]))
+"""
+
+
+def get_entry_points(entry_point_path=ENTRY_POINT_PATH):
+    # Gets the entry point functions of the module with the modules each one imports when it runs
+    with open(entry_point_path, 'r', encoding='utf8') as file:
+        tree = ast.parse(file.read())
+
+    entry_points = dict()
+    for node in tree.body:
+        if not isinstance(node, ast.FunctionDef) or node.name in EXCLUDED_FUNCTIONS:
+            continue
+
+        modules = list()
+        for child in ast.walk(node):
+            if isinstance(child, ast.Import):
+                modules += [alias.name for alias in child.names]
+            elif isinstance(child, ast.ImportFrom) and child.module is not None and child.level == 0:
+                modules.append(child.module)
+        entry_points[node.name] = modules
+
+    return entry_points
+
+
+def measure_startup(entry_point, modules):
+    # Starts a new interpreter that loads an entry point. Returns the wall time of the process, including the start of
+    # the interpreter, and the heavy dependencies it loaded
+    script = STARTUP_SCRIPT.format(ifo_dir=IFO_DIR, entry_point=entry_point, modules=modules,
+                                   heavy_modules=HEAVY_MODULES)
+
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-c", script], cwd=IFO_DIR, capture_output=True, text=True,
+                               check=True)
+    wall_time = time.perf_counter() - start
+
+    loaded_modules = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    return wall_time, loaded_modules
@@ -0,0 +1,184 @@
+import calendar
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+import tracing
+import metrics
+import accounts
+import filter_plan
+import selection
+
+
+# Pure computations of the Backend and Dashboard values. Every function takes the transaction dataframe (and a
+# Selection where required) and returns its results, so they can be written to any sink or run without Excel
+
+# Columns of the recent transactions table with the prefix of their named ranges
+RECENT_TRANSACTION_COLUMNS = {"Date": "RecentDate",
+                              "Type": "RecentType",
+                              "Category": "RecentCategory",
+                              "Currency": "RecentCurrency",
+                              "Input Value": "RecentInputValue",
+                              "Input Account": "RecentInputAccount",
+                              "Output Value": "RecentOutputValue",
+                              "Output Account": "RecentOutputAccount",
+                              "Description": "RecentDescription"}
+RECENT_TRANSACTION_COUNT = 10
+
+# Data validation cells of the Dashboard that get their list from the database
+VALIDATION_LIST_RANGES = ["CurrencyValidation",
+                          "InvestmentCurrencyValidation",
+                          "YearValidation",
+                          "MonthValidation",
+                          "CheckingAccountValidation",
+                          "CheckingAccountValidation2",
+                          "SavingAccountValidation",
+                          "SavingAccountValidation2"]
+
+# Named range of the most used account per account type
+MOST_USED_ACCOUNT_RANGES = {"checking": "MostUsedCheckingAccount", "saving": "MostUsedSavingAccount"}
+
+
+def filter_currency(df, currency):
+    # Gets the transactions of a currency
+    return df.loc[(df["Currency"] == currency).to_numpy()]
+
+
+def get_accounts_of_type(df, currency, account_type):
+    # Gets the input and output accounts of an account type ("checking" or "saving") of every transaction of a
+    # currency. The rows are selected with the filter plans, which use the currency index and the precomputed account
+    # type columns of the table loaded from the database
+    account_type = accounts.normalize_account_type(account_type)
+
+    account_arrays = list()
+    for column, type_column in accounts.ACCOUNT_TYPE_COLUMNS.items():
+        positions = filter_plan.get_filter_positions(df, {"Currency": currency, type_column: account_type})
+        account_arrays.append(df[column].astype(str).to_numpy()[positions])
+
+    account_array = np.concatenate(account_arrays)
+    return account_array[account_array != ""]
+
+
+def get_account_list(df, currency, account_type):
+    # Gets the sorted list of all accounts of an account type used in the transactions of a currency
+    return sorted(set(get_accounts_of_type(df, currency, account_type).tolist()))
+
+
+def get_validation_list(df, validation_type, currency=None):
+    # Gets the list of a data validation cell of the Dashboard, without duplicates
+    if validation_type == "YearValidation":
+        # The years of the transactions and one year extra
+        year_list = [str(int(year)) for year in sorted(df['Date'].dt.year.dropna().unique())]
+        if year_list:
+            year_list.append(str(int(year_list[-1]) + 1))
+        return year_list
+
+    elif validation_type == "MonthValidation":
+        return list(calendar.month_name)[1:]
+
+    elif "CheckingAccountValidation" in validation_type:
+        return get_account_list(df, currency, "checking")
+
+    elif "SavingAccountValidation" in validation_type:
+        return get_account_list(df, currency, "saving")
+
+    # The last option would be currency
+    return sorted(set(df["Currency"].tolist()))
+
+
+@tracing.traced(category="compute")
+def get_validation_lists(df, currency):
+    # Gets the lists of all data validation cells of the Dashboard for a currency
+    return {validation_type: get_validation_list(df, validation_type, currency)
+            for validation_type in VALIDATION_LIST_RANGES}
+
+
+def get_most_used_account(df, currency, account_type):
+    # Gets the account of an account type that is used in the most transactions of a currency
+    account_counts = pd.Series(get_accounts_of_type(df, currency, account_type)).value_counts()
+    if len(account_counts) == 0:
+        return ""
+
+    return account_counts.index[0]
+
+
+@tracing.traced(category="compute")
+def get_most_used_accounts(df, currency):
+    # Gets the most used checking and saving account of a currency, per named range
+    return {named_range: get_most_used_account(df, currency, account_type)
+            for account_type, named_range in MOST_USED_ACCOUNT_RANGES.items()}
+
+
+def get_last_transaction_entry(df, currency):
+    # Gets the date of the last transaction of a currency, as displayed in the Dashboard
+    last_date = filter_currency(df, currency)['Date'].max()
+    if pd.isna(last_date):
+        return {"LastTransactionEntry": ""}
+
+    return {"LastTransactionEntry": last_date.strftime('%x %X')}
+
+
+@tracing.traced(category="compute")
+def get_recent_transactions(df, currency, today=None):
+    # Gets the values of the recent transactions table: the last transactions of a currency in the last 365 days,
+    # the most recent first. Rows without a transaction are left empty
+    if today is None:
+        today = datetime.today().date()
+    start_date = today - relativedelta(years=1)
+
+    filter_dict = {"Currency": currency, "Start Date": start_date, "End Date": today}
+    # Only the rows of the last transactions are taken from the table
+    positions = filter_plan.get_filter_positions(df, filter_dict)
+    df_tail = df.iloc[positions[-RECENT_TRANSACTION_COUNT:][::-1]]
+
+    value_dict = dict()
+    for i in range(0, RECENT_TRANSACTION_COUNT):
+        for column, prefix in RECENT_TRANSACTION_COLUMNS.items():
+            if i >= len(df_tail):
+                value = ""
+            elif column == "Date":
+                value = df_tail[column].iloc[i].strftime("%x %X")
+            else:
+                value = df_tail[column].iloc[i]
+            value_dict[f"{prefix}{i + 1}"] = value
+
+    return value_dict
+
+
+@tracing.traced(category="compute")
+def get_backend_metrics(df, selection_snapshot, template_dict=None, today=None):
+    # Evaluates all metrics of the buffer template (balances, monthly sums and charts) for a selection
+    evaluator = metrics.MetricEvaluator(df, template_dict=template_dict)
+
+    return evaluator.evaluate_selection(selection_snapshot, today=today)
+
+
+def get_default_selection(df, currency, year, month, investment_currency=None, category_list=None):
+    # Creates the selection of a currency, year and month as a refreshed Dashboard would show it: the most used accounts
+    # and the first account of each validation list. The categories are those listed in the Backend sheet
+    selection_dict = {"CurrencyValidation": currency,
+                      "InvestmentCurrencyValidation": currency if investment_currency is None else investment_currency,
+                      "YearValidation": int(year),
+                      "MonthValidation": calendar.month_name[metrics.get_month_number(month)]}
+
+    selection_dict.update(get_most_used_accounts(df, currency))
+    for validation_type in ["CheckingAccountValidation", "CheckingAccountValidation2", "SavingAccountValidation",
+                            "SavingAccountValidation2"]:
+        validation_list = get_validation_list(df, validation_type, currency)
+        selection_dict[validation_type] = validation_list[0] if validation_list else ""
+
+    return selection.get_sheet_selection(selection_dict, category_list=category_list)
+
+
+@tracing.traced(category="compute")
+def get_dashboard_values(df, selection_snapshot, template_dict=None, today=None):
+    # Computes all values shown in the Dashboard for a selection, per named range
+    currency = selection_snapshot.currency
+
+    value_dict = get_backend_metrics(df, selection_snapshot, template_dict=template_dict, today=today)
+    value_dict.update(get_recent_transactions(df, currency, today=today))
+    value_dict.update(get_most_used_accounts(df, currency))
+    value_dict.update(get_last_transaction_entry(df, currency))
+
+    return value_dict
@@ -1,29 +1,18 @@
-import calendar
-
-import pandas as pd
-import xlwings as xw
-from xlwings import constants as xw_constants
-from os.path import join
-import pathlib
-from datetime import datetime
-
-import database
+import tracing
+import session
+import sheet_io
+import compute
+import selection
 
 
 class Dashboard:
 
-    def __init__(self):
+    def __init__(self, currency_selection=None, sink=None, current_session=None):
+        # Session holding the workbook handle and the transaction table shared by all objects of the process
+        self.session = session.get_session(current_session)
+
         # Main data validation cell names in list format
-        self.validation_type_list = ["CurrencyValidation",
-                                     "InvestmentCurrencyValidation",
-                                     "YearValidation",
-                                     "MonthValidation",
-                                     "MostUsedCheckingAccount",
-                                     "CheckingAccountValidation",
-                                     "CheckingAccountValidation2",
-                                     "MostUsedSavingAccount",
-                                     "SavingAccountValidation",
-                                     "SavingAccountValidation2"]
+        self.validation_type_list = selection.DASHBOARD_SELECTION_RANGES
 
         # Dataframe used for extracting data
         self.df = None
@@ -32,25 +21,40 @@ class Dashboard:
         self.validation_list = None
 
         # Excel file path
-        self.wb_path = join(pathlib.Path(__file__).parent.absolute(), "IFO.xlsm")
-
-        # xlwings parameters
-        self.wb = xw.Book(self.wb_path)
-        self.ws = self.wb.sheets["Dashboard"].api
-        self.currency_selection = self.ws.Range("CurrencyValidation").Value
-
-        pass
+        self.wb_path = self.session.database.wb_path
+
+        # xlwings parameters. The workbook is only opened when the currency has to be read from it or the results have
+        # to be written to it, so the Dashboard values can also be computed without Excel
+        self.wb = None
+        self.ws = None
+        if currency_selection is None or sink is None:
+            self.wb = self.session.get_workbook()
+            self.ws = self.session.get_sheet("Dashboard")
+
+        if currency_selection is None:
+            currency_selection = self.ws.Range("CurrencyValidation").Value
+        self.currency_selection = currency_selection
+
+        # All value writes are collected in a sink. By default this is the write plan of the dashboard sheet, which
+        # sends the values to the sheet in bulk
+        if sink is None:
+            sink = sheet_io.RangeWritePlan(self.ws, self.session.get_layout("Dashboard"))
+        self.write_plan = sink
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        pass
+        if exc_type is None:
+            self.flush_writes()
+
+    def flush_writes(self):
+        # Sends all collected writes to the dashboard sheet
+        self.write_plan.flush()
 
     def get_database_dataframe(self):
-        # Gets the dataframe by using the Database module functions
-        with database.Database() as data:
-            self.df = data.get_current_database_dataframe()
+        # Gets the dataframe loaded by the session, which is shared with the Backend
+        self.df = self.session.get_dataframe()
 
         return self.df
 
@@ -62,76 +66,11 @@ class Dashboard:
         if df is None:
             df = self.get_database_dataframe()
 
-        # Function for obtaining account validation
-        def get_account_validation(dataframe, account_type):
-            # Filter first the dataframe based on currency
-            dataframe = dataframe.loc[dataframe["Currency"] == self.currency_selection]
-
-            # Get all the accounts from all the input and output transactions
-            account_list = dataframe['Input Account'].tolist() + dataframe['Output Account'].tolist()
-
-            # Remove duplicates from list
-            account_list = list(set(account_list))
-
-            # Remove blank items from list
-            account_list = list(filter(None, account_list))
-
-            filtered_account_list = list()
-            for account in account_list:
-                if account_type == "saving":
-                    if "saving" in account:
-                        filtered_account_list.append(account)
-                else:
-                    if "saving" not in account:
-                        filtered_account_list.append(account)
-
-            # Sort the filtered account list
-            filtered_account_list.sort()
-
-            return filtered_account_list
-
-        # Get column of dataframe and change it into a list
-        filtered_validation_list = list()
-        if validation_type == "YearValidation":
-            validation_list = df['Date'].tolist()
-
-            # Filter out the years
-            for value in validation_list:
-                year = datetime.strptime(value, "%Y-%m-%d").year
-
-                # Convert it all to strings
-                year = str(year)
-
-                # Add to list
-                filtered_validation_list.append(year)
-
-            # Remove the duplicates from the filtered validation list and sort it
-            filtered_validation_list = list(set(filtered_validation_list))
-
-            # Sort the validation list
-            filtered_validation_list.sort()
-
-            # Add one year extra to the list
-            filtered_validation_list.append(str(int(filtered_validation_list[-1]) + 1))
-
-        elif validation_type == "MonthValidation":
-            filtered_validation_list = [month for index, month in enumerate(calendar.month_name)][1:]
-
-        elif "CheckingAccountValidation" in validation_type:
-            filtered_validation_list = get_account_validation(df, "checking")
-
-        elif "SavingAccountValidation" in validation_type:
-            filtered_validation_list = get_account_validation(df, "saving")
-
-        else:
-            # The last option would be currency
-            filtered_validation_list = list(set(df["Currency"].tolist()))
-            filtered_validation_list.sort()
-
-        # Return the list
-        self.validation_list = filtered_validation_list
+        # Get the list of the validation type for the current currency
+        self.validation_list = compute.get_validation_list(df, validation_type, self.currency_selection)
         return self.validation_list
 
+    @tracing.traced(category="dashboard")
     def data_validation_update(self, named_range, validation_list=None):
         # Updates all data based on general filters, like currency, year or month
 
@@ -140,6 +79,7 @@ class Dashboard:
             validation_list = self.get_data_validation_list(named_range)
 
         # Obtain the constants required to modify the data validation cells
+        from xlwings import constants as xw_constants
         dv_type = xw_constants.DVType.xlValidateList
         dv_alert_style = xw_constants.DVAlertStyle.xlValidAlertStop
         dv_operator = xw_constants.FormatConditionOperator.xlEqual
@@ -163,22 +103,21 @@ class Dashboard:
         # Set the original value back as current selection
         validation_range.Value = current_display_value
 
+    @tracing.traced(category="dashboard")
     def get_all_current_data_validation_selections(self):
         # Gets all current data validation selections of the Dashboard and returns it as a dictionary
 
-        # Creates the dictionary and extracts the values from the Dashboard
-        current_validation_values_dict = dict()
-        for validation_type in self.validation_type_list:
-            validation_value = self.ws.Range(validation_type).Value
-
-            # For validation values that are float, convert them into integer
-            if type(validation_value) is float:
-                validation_value = int(validation_value)
+        # Extracts all values from the Dashboard in a single read and creates the dictionary
+        validation_values_dict = sheet_io.read_named_ranges(self.ws, self.session.get_layout("Dashboard"),
+                                                           self.validation_type_list)
 
-            current_validation_values_dict[validation_type] = validation_value
+        current_validation_values_dict = dict()
+        for validation_type, validation_value in validation_values_dict.items():
+            current_validation_values_dict[validation_type] = selection.clean_selection_value(validation_value)
 
         return current_validation_values_dict
 
+    @tracing.traced(category="dashboard")
     def update_last_transaction_entry(self, df=None):
         # Searches the database for the last transaction made in het specific currency
 
@@ -186,55 +125,22 @@ class Dashboard:
         if df is None:
             df = self.get_database_dataframe()
 
-        # Apply filter to database to obtain all dates related to the currency
-        df = df.loc[df["Currency"] == self.currency_selection].copy()
-
-        # Search for last transaction date
-        df["Date"] = pd.to_datetime(df["Date"])
-        last_date = df['Date'].max()
-
-        # Update the last entry date in the dashboard
-        self.ws.Range("LastTransactionEntry").Value = last_date.strftime('%x %X')
+        # Search for last transaction date in the specific currency and update the last entry date in the dashboard
+        self.write_plan.write(compute.get_last_transaction_entry(df, self.currency_selection))
 
+    @tracing.traced(category="dashboard")
     def fill_in_most_used_account(self, account_type, df=None):
 
         # Checks first if there is dataframe input to be used if not, get dataframe
         if df is None:
             df = self.get_database_dataframe()
 
-        # Filter first the dataframe based on currency
-        df = df.loc[df["Currency"] == self.currency_selection]
-
-        # Get all the accounts from all the input and output transactions
-        account_list = df['Input Account'].tolist() + df['Output Account'].tolist()
-
-        # Remove blank items from list
-        account_list = list(filter(None, account_list))
-
-        # Filter based on account type
-        filtered_account_list = list()
-        for account in account_list:
-            if account_type == "saving":
-                if "saving" in account:
-                    filtered_account_list.append(account)
-            else:
-                if "saving" not in account:
-                    filtered_account_list.append(account)
-
-        if len(filtered_account_list) == 0:
-            most_used_account = ""
-        else:
-            # Get the most frequent account in list
-            most_used_account = max(set(filtered_account_list), key=filtered_account_list.count)
-
-        # get the correct named range
-        if account_type == "saving":
-            account_named_range = "MostUsedSavingAccount"
-        else:
-            account_named_range = "MostUsedCheckingAccount"
+        # Get the most frequent account of the account type in the specific currency
+        most_used_account = compute.get_most_used_account(df, self.currency_selection, account_type)
 
         # Fill in the data into the excel dashboard
-        self.ws.Range(account_named_range).Value = most_used_account
+        account_type = "saving" if account_type == "saving" else "checking"
+        self.write_plan.add(compute.MOST_USED_ACCOUNT_RANGES[account_type], most_used_account)
 
         return most_used_account
 
@@ -254,7 +160,8 @@ def tester():
     # test.fill_in_most_used_account("saving")
 
     # test.update_last_transaction_entry()
-    pass
+
+    test.flush_writes()
 
 
 if __name__ == '__main__':
@@ -2,11 +2,26 @@ import pandas as pd
 import numpy as np
 import os
 from os.path import join
-from datetime import datetime
 import pathlib
 import json
-import shutil
-import xlwings as xw
+
+import tracing
+import schema
+import accounts
+import store
+import importer
+import json_reader
+import journal
+import sheet_io
+import indexes
+import aggregates
+import filter_plan
+import snapshots
+
+
+# Names of the store files and the journal within a snapshot of the database
+SNAPSHOT_STORE_PREFIX = 'store/'
+SNAPSHOT_JOURNAL_NAME = 'journal.jsonl'
 
 
 class Database:
@@ -16,7 +31,9 @@ class Database:
         self.wb_path = join(pathlib.Path(__file__).parent.absolute(), "IFO.xlsm")
         self.database_dir = join(pathlib.Path(__file__).parent.absolute(), 'data')
         self.database_path = join(self.database_dir, 'database.json')
-        self.backup_dir = join(pathlib.Path(__file__).parent.absolute(), 'data', 'database backup')
+        self.store_dir = join(self.database_dir, 'store')
+        self.journal_path = join(self.database_dir, 'journal.jsonl')
+        self.snapshot_dir = join(self.database_dir, 'snapshots')
         self.database_sheet_name = "Database"
         self.temporary_sheet_name = "Filtered Data"
 
@@ -26,8 +43,24 @@ class Database:
         self.filtered_df = None
         self.database_dict = None
 
-        # xlwings parameters
-        self.wb = xw.Book(self.wb_path)
+        # Columnar store holding the transaction table
+        self.store = store.ColumnStore(self.store_dir)
+
+        # Append-only journal with the transactions entered after the last compaction of the store
+        self.journal = journal.TransactionJournal(self.journal_path)
+        self.compaction_threshold = 500
+
+        # Compressed, deduplicated snapshots of the store and journal
+        self.snapshots = snapshots.SnapshotStore(self.snapshot_dir)
+
+        # Log of the edits made through this object as (version before, version after, changed transactions), where
+        # the changed transactions are the (currency, date) of every transaction before and after the edit.
+        # Results derived from the database use it to only recompute what an edit affects
+        self.change_log = list()
+
+        # xlwings parameters. The workbook is only opened when data is exchanged with it, so the database can also be
+        # used without Excel
+        self.wb = None
 
     def __enter__(self):
         return self
@@ -35,20 +68,119 @@ class Database:
     def __exit__(self, exc_type, exc_val, exc_tb):
         pass
 
+    def get_workbook(self):
+        # Opens the workbook on first use
+        if self.wb is None:
+            self.wb = sheet_io.open_workbook(self.wb_path)
+
+        return self.wb
+
+    @tracing.traced(category="database")
     def get_legacy_database_from_ifo(self, wb_path=None):
+        # Imports the Database sheet of a workbook on disk (e.g. an exported IFO workbook) into the columnar store.
+        # The rows are streamed into the store in chunks, so the sheet is never loaded as a whole. The imported sheet
+        # holds the complete database, so the journal is cleared. Returns the amount of imported transactions
+
+        if wb_path is None:
+            wb_path = self.wb_path
+
+        row_count = importer.import_workbook(wb_path, self.store, sheet_name=self.database_sheet_name)
+        self.journal.clear()
+        self.database_df = None
+
+        return row_count
+
+    def get_current_database_dataframe(self, columns=None, start_date=None, end_date=None):
+        # Loads the transaction table from the store. Columns and a date range can be given to load only part of it
+
+        self.load_database_store(columns=columns, start_date=start_date, end_date=end_date)
+
+        return self.database_df
+
+    def migrate_database_json(self):
+        # Converts the legacy database json file into the columnar store. This only has to happen once
+        if os.path.exists(self.database_path):
+            store.migrate_json_to_store(self.database_path, self.store)
+
+    @tracing.traced(category="database")
+    def save_database_store(self, df=None):
+        # Saves the dataframe containing the database into the columnar store
+        # The dataframe must contain the complete database, so the journal is folded into it and can be cleared
+
+        # Checks if there is a dataframe as input. If not, it uses the database_df parameter
+        if df is None:
+            df = self.database_df
+
+        if df is not None:
+            self.store.save(df)
+            self.journal.clear()
+
+    @tracing.traced(category="database")
+    def load_database_store(self, columns=None, start_date=None, end_date=None):
+        # Loads the database from the columnar store, only reading the columns and dates required
+        # If the store doesn't exist yet, it is first created from the legacy database json file
+        # The transactions entered after the last compaction are replayed from the journal on top of the store
+
+        if not self.store.exists():
+            self.migrate_database_json()
+
+        # The journal is keyed by transaction ID, so that column is always needed for replaying it
+        load_columns = columns
+        if columns is not None and 'ID' not in columns:
+            load_columns = ['ID'] + list(columns)
+
+        df = self.store.load(columns=load_columns, start_date=start_date, end_date=end_date)
+        df = self.journal.replay(df, start_date=start_date, end_date=end_date)
+
+        if columns is not None:
+            df = df[list(columns)]
+
+        self.database_df = schema.apply_schema(df)
+
+        # A complete table is kept sorted by date, so date ranges can be sliced with a binary search.
+        # It is also tagged with the database version, so results derived from it can be cached per version
+        if columns is None and start_date is None and end_date is None:
+            self.database_df = indexes.sort_by_date(self.database_df)
+            aggregates.set_dataframe_version(self.database_df, self.get_database_version())
+
+        return self.database_df
+
+    def get_database_version(self):
+        # Version of the database contents, combining the compacted store and the journal on top of it.
+        # Explicit account meta data changes the classification of the accounts, so its version is added when it exists
+        if not self.store.exists():
+            return None
+
+        version = self.store.get_version() + '-' + self.journal.get_version()
+        registry_version = accounts.get_registry().get_version()
+        if registry_version:
+            version += '-' + registry_version
 
-        excel_df = self.excel_to_dataframe(wb_path=wb_path, sheet_name='Database')
-        self.convert_datetime_to_str(excel_df)
-        self.dataframe_to_dict()
-        self.save_database_json()
+        return version
 
-    def get_current_database_dataframe(self):
+    @tracing.traced(category="database")
+    def compact_database(self):
+        # Folds all journal records into the columnar store and clears the journal
 
-        self.load_database_json()
-        self.dict_to_dataframe()
+        self.load_database_store()
+        self.save_database_store(self.database_df)
 
         return self.database_df
 
+    def compact_database_if_required(self):
+        # Compacts the database once the journal has grown past the compaction threshold
+        if self.journal.get_entry_count() >= self.compaction_threshold:
+            self.compact_database()
+
+    def get_changed_transactions(self, df):
+        # Gets the (currency, date) of all transactions of a dataframe
+        return list(zip(df['Currency'].astype(str).tolist(), pd.to_datetime(df['Date']).tolist()))
+
+    def log_change(self, previous_version, changed_transactions):
+        # Adds an edit to the change log, with the database version after the edit
+        self.change_log.append((previous_version, self.get_database_version(), changed_transactions))
+
+    @tracing.traced(category="database")
     def excel_to_dataframe(self, wb_path=None, sheet_name=None):
         # Extracts data from excel tables of a sheet and converts it into a dataframe
 
@@ -59,7 +191,7 @@ class Database:
             wb_path = self.wb_path
 
         # Save workbook before extracting it
-        self.wb.save(self.wb_path)
+        self.get_workbook().save(self.wb_path)
 
         # Extract data into dataframe using pandas
         self.excel_df = pd.read_excel(wb_path, sheet_name=sheet_name, engine='openpyxl')
@@ -69,6 +201,7 @@ class Database:
 
         return self.excel_df
 
+    @tracing.traced(category="database")
     def save_database_json(self, dictionary=None):
         # Saves the dictionary containing the database into a json file
         # The database file already in the data folder will not be overwritten,
@@ -83,20 +216,43 @@ class Database:
             with open(self.database_path, 'w', encoding='utf8') as file:
                 json.dump(dictionary, file, indent=4, sort_keys=False, default=str, ensure_ascii=False)
 
-    def load_database_json(self, database_path=None):
+    @tracing.traced(category="database")
+    def load_database_json(self, database_path=None, currencies=None, start_date=None, end_date=None):
         # Loads the json file containing the database into a usable dictionary
-        # If there is no database available, it will use the most recent backup database file
+        # The file is read one record at a time, so with currencies or a date range only the matching records are
+        # kept in memory
 
         # Loads class database path if no input is provided
         if database_path is None:
             database_path = self.database_path
 
         # Extracts the data from the database path
-        with open(database_path, 'r', encoding='utf8') as file:
-            self.database_dict = json.load(file)
+        self.database_dict = dict(json_reader.iter_records(database_path, currencies=currencies,
+                                                           start_date=start_date, end_date=end_date))
 
         return self.database_dict
 
+    def iter_transactions(self, currencies=None, start_date=None, end_date=None):
+        # Yields the transactions of the database as records, optionally only those of some currencies and a date range.
+        # The dates are pushed down into the store (or the json file, if it hasn't been migrated yet), so only the
+        # rows of the date range are loaded
+        if isinstance(currencies, str):
+            currencies = [currencies]
+
+        # The records of the json file are typed a chunk at a time, like the rows loaded from the store
+        if not self.store.exists() and os.path.exists(self.database_path):
+            for chunk_df in json_reader.iter_chunks(self.database_path, currencies=currencies, start_date=start_date,
+                                                    end_date=end_date):
+                yield from schema.apply_schema(chunk_df).to_dict(orient='records')
+            return
+
+        df = self.store.load(start_date=start_date, end_date=end_date)
+        df = schema.apply_schema(self.journal.replay(df, start_date=start_date, end_date=end_date))
+        if currencies is not None:
+            df = df[df['Currency'].isin(currencies).to_numpy()]
+
+        yield from df.to_dict(orient='records')
+
     def dataframe_to_dict(self, df=None):
         # Converts a standard database dataframe into a dictionary
 
@@ -116,52 +272,66 @@ class Database:
         if dictionary is None:
             dictionary = self.database_dict
 
-        # Converts the dictionary to a dataframe
-        self.database_df = pd.DataFrame(dictionary).transpose()
+        # Converts the dictionary to a dataframe with the columns typed according to the schema
+        self.database_df = schema.apply_schema(pd.DataFrame(dictionary).transpose())
 
         return self.database_df
 
+    @tracing.traced(category="database")
     def remove_transaction_from_dataframe(self, index_list, df=None):
         # Removes the rows from dataframe containing the transaction based on index
-
-        # TODO: test this function
+        # Every removal is recorded in the journal instead of rewriting the database
 
         # Checks if there is a dataframe as input. If not, it uses the database_df parameter
         if df is None:
             df = self.database_df
 
-        # Deleting the rows with a specific indexes
-        for index in index_list:
-            df = df.drop(df.iloc[index])
+        # Record the removal of each transaction by its ID
+        previous_version = self.get_database_version()
+        for transaction_id in df['ID'].iloc[index_list].tolist():
+            self.journal.append("remove", {'ID': transaction_id})
+        changed_transactions = self.get_changed_transactions(df.iloc[index_list])
+
+        # Deleting the rows with a specific indexes. The index is reset, so it stays equal to the row position
+        df = indexes.sort_by_date(df.drop(df.index[index_list]))
 
         self.database_df = df
+        self.compact_database_if_required()
+        aggregates.set_dataframe_version(self.database_df, self.get_database_version())
+        self.log_change(previous_version, changed_transactions)
+
         return self.database_df
 
+    @tracing.traced(category="database")
     def new_transaction_to_dataframe(self, new_trn_dict, df=None):
         # Enters a new row in the dataframe, containing the new transaction
-
-        # TODO: test this function
+        # The transaction is appended to the journal, so entering it doesn't rewrite the database
 
         # Checks if there is a dataframe as input. If not, it uses the database_df parameter
         if df is None:
             df = self.database_df
 
-        # Converts dataframe into a dictionary
-        self.dataframe_to_dict(df)
+        # New transactions get the next free ID
+        new_trn_dict = dict(new_trn_dict)
+        if new_trn_dict.get('ID') is None:
+            new_trn_dict['ID'] = int(df['ID'].max()) + 1 if len(df) > 0 else 1
 
-        # Converts dictionary into a list with dictionaries
-        db_list = list()
-        for key, value in self.database_dict.items():
-            db_list.append(value)
+        previous_version = self.get_database_version()
+        self.journal.append("new", new_trn_dict)
 
-        # Adds new transaction to list
-        db_list.append(new_trn_dict)
+        # Adds new transaction to the dataframe, at the position of its date
+        new_df = pd.DataFrame([new_trn_dict])
+        self.database_df = indexes.sort_by_date(schema.apply_schema(pd.concat([df, new_df], ignore_index=True)))
+        self.compact_database_if_required()
+        aggregates.set_dataframe_version(self.database_df, self.get_database_version())
 
-        # Converts list into dataframe
-        self.database_df = pd.DataFrame(db_list)
+        # A transaction of the latest date is appended at the end, so the indexes of the table are extended with it
+        indexes.carry_over_indexes(df, self.database_df)
+        self.log_change(previous_version, self.get_changed_transactions(new_df))
 
         return self.database_df
 
+    @tracing.traced(category="database")
     def update_transactions_in_dataframe(self, filtered_df=None):
         # Compares all indexes of updated filtered dataframe
 
@@ -172,12 +342,29 @@ class Database:
         # get current dataframe from database file
         self.get_current_database_dataframe()
 
-        # Iterate through each row of the filtered data to substitute it in the database
+        # The transactions are changed both at their previous and at their updated currency and date
+        previous_version = self.get_database_version()
+        changed_transactions = self.get_changed_transactions(filtered_df)
+        changed_transactions += self.get_changed_transactions(
+            self.database_df.loc[self.database_df['ID'].isin(filtered_df['ID'])])
+
+        # Iterate through each row of the filtered data to record the update in the journal
+        new_entries = list()
         for index, row in filtered_df.iterrows():
-            self.database_df.iloc[index] = row
+            row = row[[column for column in self.database_df.columns if column in row.index]]
+            new_entries.append(self.journal.append("update", row.to_dict()))
+
+        # Substitute the updated rows in the database by replaying only the new records, since the loaded table
+        # already contains the earlier ones
+        self.database_df = indexes.sort_by_date(schema.apply_schema(
+            self.journal.replay(self.database_df, entries=new_entries)))
+        self.compact_database_if_required()
+        aggregates.set_dataframe_version(self.database_df, self.get_database_version())
+        self.log_change(previous_version, changed_transactions)
 
         return self.database_df
 
+    @tracing.traced(category="database")
     def filter_data_from_dataframe(self, filter_dict, df=None):
         # Returns a filtered dataframe based on the filters applied to the original database
 
@@ -185,109 +372,103 @@ class Database:
         if df is None:
             df = self.database_df
 
-        # Converts column with dates as string in dataframe to datetime format
-        df['Date'] = pd.to_datetime(df['Date']).dt.date
-
-        # Filter out per column type
-        for key, value in filter_dict.items():
-            if key == "Start Date":
-                # value = datetime.strptime(value, "%Y-%m-%d")
-                df = df.loc[df["Date"] >= value]
-
-            elif key == "End Date":
-                # value = datetime.strptime(value, "%Y-%m-%d")
-                df = df.loc[df["Date"] <= value]
-
-            elif key == "Minimum Input Value" or key == "Minimum Output Value":
-                df = df.loc[df[key] >= value]
-
-            elif key == "Maximum Input Value" or key == "Maximum Output Value":
-                df = df.loc[df[key] <= value]
-
-            elif key == "Description":
-                df = df.loc[df[key].str.contains(value)]
-
-            elif key == "Input Account Type":
-                if value == "checking accounts":
-                    df = df.loc[~df["Input Account"].str.contains('saving')]
-                elif value == "saving accounts":
-                    df = df.loc[df["Input Account"].str.contains('saving')]
-                else:
-                    pass
+        # The filter is compiled into a plan: the date range, the equality, account type and description filters are
+        # answered by the indexes of the table and the remaining filters by one combined mask, so the rows are only
+        # taken once
+        df = filter_plan.compile_filter(filter_dict, df).select(df, filter_dict)
 
-            elif key == "Output Account Type":
-                if value == "checking accounts":
-                    df = df.loc[~df["Output Account"].str.contains('saving')]
-                elif value == "saving accounts":
-                    df = df.loc[df["Output Account"].str.contains('saving')]
-                else:
-                    pass
-
-            else:
-                df = df.loc[df[key] == value]
-
-        # Convert index of dataframe into column
-        df['Index'] = df.index
+        # Convert index of dataframe into column, without modifying the dataframe of the caller
+        df = df.assign(Index=df.index)
 
         self.filtered_df = df
         return self.filtered_df
 
-    def backup_old_database(self):
-        # Moves the current database json file to the backup folder and changes it name with a suffix timestamp
-
-        # Checks if there exists a database file
-        if not os.path.exists(self.database_path):
-            return
-
-        # Creates a new name for old database file
-        backup_file_name = 'database_' + datetime.today().strftime("%Y-%m-%d") + '.json'
-        backup_file_path = join(self.backup_dir, backup_file_name)
-
-        # Checks if the file exists. If true, delete it
-        if os.path.exists(backup_file_path):
-            os.remove(backup_file_path)
-
-        # Copy database file and rename it to the backup folder
-        shutil.copy(self.database_path, backup_file_path)
-
-    def restore_old_database(self):
-        # Searches for the most recent database json file in the backup folder,
-        # moves it to the data folder and changes it name to database.json
-
-        # Check if there exists database files in the backup folder
-        if not os.listdir(self.backup_dir):
-            return
+    @tracing.traced(category="database")
+    def aggregate_filtered(self, filter_dict, column, how="sum", df=None):
+        # Aggregates a column (sum, min, max or count) over the transactions matching the filters, without building
+        # the filtered dataframe
 
-        # Loop through each file in directory, applying filters to find the correct ones
-        date_list = list()
-        date_dict = dict()
-        for file_path in os.listdir(self.backup_dir):
-            filename = os.path.split(file_path)[1]
-            filetype = os.path.splitext(file_path)[1]
-
-            if 'database' in filename and filetype == 'json':
-                date_str = filename.replace('database_', '')
-                date = datetime.strptime(date_str, '%Y-%m-%d')
-
-                # Add parameters to list and dictionary
-                date_list.append(date)
-                date_dict[date] = file_path
-
-        # Obtain the latest file path
-        latest_file_path = date_dict[max(date_list)]
+        # Checks if there is a dataframe as input. If not, it uses the database_df parameter
+        if df is None:
+            df = self.database_df
 
-        # If there exists a current database file in data directory, delete it
-        if os.path.exists(self.database_path):
-            os.remove(self.database_path)
+        return filter_plan.aggregate_filtered(df, filter_dict, how, column)
+
+    def search_transactions(self, query, prefix=False, filter_dict=None, df=None):
+        # Finds the transactions whose description contains all terms of the query, case and accent insensitive.
+        # With prefix, the terms have to be at the start of a word of the description. Other filters can be added
+        filter_dict = dict() if filter_dict is None else dict(filter_dict)
+        filter_dict["Description Prefix" if prefix else "Description"] = query
+
+        return self.filter_data_from_dataframe(filter_dict, df=df)
+
+    def get_snapshot_files(self):
+        # Files making up the database, by their name in a snapshot: the files of the store and the journal
+        file_dict = dict()
+        if os.path.exists(self.store_dir):
+            for file_name in sorted(os.listdir(self.store_dir)):
+                file_dict[SNAPSHOT_STORE_PREFIX + file_name] = join(self.store_dir, file_name)
+        file_dict[SNAPSHOT_JOURNAL_NAME] = self.journal_path
+
+        return file_dict
+
+    @tracing.traced(category="database")
+    def backup_old_database(self, label=None):
+        # Takes a snapshot of the current database and removes the snapshots the retention policy doesn't keep.
+        # A snapshot of an unchanged database is not taken again. Returns the ID of the snapshot
+
+        # The legacy database json file is migrated first, so the snapshot holds the store
+        if not self.store.exists():
+            self.migrate_database_json()
+        if not self.store.exists():
+            return None
+
+        snapshot = self.snapshots.create(self.get_snapshot_files(), version=self.get_database_version(), label=label)
+        self.snapshots.prune()
+
+        return snapshot['id']
+
+    @tracing.traced(category="database")
+    def restore_old_database(self, snapshot_id=None, timestamp=None):
+        # Restores the store and journal of a snapshot, given by its ID or as the latest snapshot taken at or before a
+        # timestamp. Without either, the latest snapshot is restored. Returns the ID of the restored snapshot
+
+        snapshot = self.snapshots.find(snapshot_id=snapshot_id, timestamp=timestamp)
+        if snapshot is None:
+            return None
+
+        # The store is rebuilt in a temporary directory and swapped in at once, like when it is saved
+        tree = self.snapshots.get_tree(snapshot)
+        tmp_dir = self.store.create_tmp_dir()
+        for name, chunk_hashes in tree.items():
+            if name.startswith(SNAPSHOT_STORE_PREFIX):
+                self.snapshots.restore_file(chunk_hashes, join(tmp_dir, name[len(SNAPSHOT_STORE_PREFIX):]))
+
+        with open(join(tmp_dir, store.META_FILE_NAME), 'r', encoding='utf8') as file:
+            meta = json.load(file)
+        self.store.swap_in(tmp_dir, meta)
+
+        if SNAPSHOT_JOURNAL_NAME in tree:
+            self.snapshots.restore_file(tree[SNAPSHOT_JOURNAL_NAME], self.journal_path)
+            self.journal.reset()
+        else:
+            self.journal.clear()
+
+        # The restored database replaces the complete transaction table, so the tables, aggregates, indexes and filter
+        # plans derived from the previous one are dropped, as well as the edits logged for it
+        self.database_df = None
+        self.filtered_df = None
+        self.change_log.clear()
+        aggregates.clear_aggregate_cache()
+        filter_plan.clear_plan_cache()
 
-        # replace the latest backup file to the data folder
-        shutil.move(latest_file_path, self.database_path)
+        return snapshot['id']
 
     def get_filtered_excel_data(self):
         # Extracts the filtered excel data which has been updated by user and converts it into a dataframe
 
         # check if temporary sheet exists in excel workbook
-        sheet_list = [sh.name for sh in self.wb.sheets]
+        sheet_list = [sh.name for sh in self.get_workbook().sheets]
         if self.temporary_sheet_name not in sheet_list:
             return
 
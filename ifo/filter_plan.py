@@ -0,0 +1,132 @@
+import numpy as np
+
+import indexes
+
+
+# Value range filters of the Backend, with the column and the comparison they apply
+RANGE_FILTERS = {"Minimum Input Value": ("Input Value", "min"),
+                 "Maximum Input Value": ("Input Value", "max"),
+                 "Minimum Output Value": ("Output Value", "min"),
+                 "Maximum Output Value": ("Output Value", "max")}
+
+# Aggregations that can be requested from a filter, without materializing the filtered dataframe
+AGGREGATIONS = ["sum", "min", "max", "count"]
+
+# Compiled plans per filter shape
+_plan_cache = dict()
+
+
+def get_filter_shape(filter_dict, df):
+    # Shape of a filter: its keys and the columns of the table. Filters with the same shape only differ in their
+    # values, so they share the same plan
+    return tuple(filter_dict.keys()), tuple(df.columns)
+
+
+def compile_filter(filter_dict, df):
+    # Gets the plan of a filter dictionary for a table, compiling it only once per filter shape
+    shape = get_filter_shape(filter_dict, df)
+    if shape not in _plan_cache:
+        _plan_cache[shape] = FilterPlan(list(filter_dict.keys()), list(df.columns))
+
+    return _plan_cache[shape]
+
+
+def clear_plan_cache():
+    # Drops the compiled plans, e.g. after the database has been replaced as a whole
+    _plan_cache.clear()
+
+
+def get_filter_positions(df, filter_dict):
+    # Gets the row positions of the transactions matching a filter dictionary, or None if all rows match
+    return compile_filter(filter_dict, df).get_positions(df, filter_dict)
+
+
+def aggregate_filtered(df, filter_dict, how, column):
+    # Aggregates a column over the transactions matching a filter dictionary
+    return compile_filter(filter_dict, df).aggregate(df, filter_dict, how, column)
+
+
+def aggregate_values(values, how):
+    # Aggregates an array of values. The minimum and maximum of no values are not a number, like in pandas
+    if how == "count":
+        return len(values)
+    elif how == "sum":
+        return float(values.sum())
+    elif len(values) == 0:
+        return np.nan
+
+    return float(values.min()) if how == "min" else float(values.max())
+
+
+class FilterPlan:
+
+    def __init__(self, filter_keys, columns):
+        # Plan of a filter shape. The filters answered by the indexes of the table (date range, equality, account type
+        # and description filters) become one intersection of sorted row positions. The remaining filters (value
+        # ranges and equality filters of columns without an index) become one combined mask over those rows only
+        self.index_keys = [key for key in filter_keys if indexes.is_indexed_filter(key, columns)]
+        self.range_keys = [key for key in filter_keys if key not in self.index_keys and key in RANGE_FILTERS]
+        self.equality_keys = [key for key in filter_keys if key not in self.index_keys and key not in RANGE_FILTERS]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def get_positions(self, df, filter_dict):
+        # Executes the plan on a table and gets the row positions of the matching transactions, or None if the plan
+        # doesn't filter anything. Tables without indexes (anything but the table loaded from the database) answer the
+        # indexed filters with a mask instead
+        index_filter_dict = {key: filter_dict[key] for key in self.index_keys}
+        positions = None
+        if self.index_keys and indexes.is_indexed_table(df):
+            positions = indexes.get_transaction_indexes(df).get_positions(index_filter_dict)
+        elif self.index_keys:
+            positions = indexes.get_mask_positions(df, index_filter_dict)
+
+        if not self.range_keys and not self.equality_keys:
+            return positions
+
+        # The mask is only evaluated on the rows left by the indexes
+        mask = None
+        for key in self.range_keys + self.equality_keys:
+            column, comparison = RANGE_FILTERS.get(key, (key, "equal"))
+            values = df[column].to_numpy()
+            if positions is not None:
+                values = values[positions]
+
+            if comparison == "min":
+                key_mask = values >= filter_dict[key]
+            elif comparison == "max":
+                key_mask = values <= filter_dict[key]
+            else:
+                key_mask = values == filter_dict[key]
+
+            mask = key_mask if mask is None else mask & key_mask
+
+        if positions is None:
+            return np.flatnonzero(mask)
+
+        return positions[mask]
+
+    def select(self, df, filter_dict):
+        # Gets the matching transactions as a dataframe, taking the rows in a single step
+        positions = self.get_positions(df, filter_dict)
+        if positions is None:
+            return df
+
+        return df.iloc[positions]
+
+    def aggregate(self, df, filter_dict, how, column):
+        # Aggregates a column (sum, min, max or count) over the matching transactions. Only the values of that column
+        # are read, the filtered dataframe is never built
+        if how not in AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation: {how}")
+
+        positions = self.get_positions(df, filter_dict)
+        values = df[column].to_numpy()
+        if positions is not None:
+            values = values[positions]
+
+        return aggregate_values(values, how)
@@ -1,14 +1,24 @@
-import pymsgbox
-
-import backend
-import dashboard
-import database
+# The buttons of the workbook run these functions in a new Python process on every click. Importing this module
+# therefore doesn't import anything: every function imports the modules it needs (and with them pandas, numpy and
+# xlwings) when it runs, so actions that don't need them start without that cost
 
 
 def update_ifo():
-    # TODO
-    # Updates all data of backend based on database
-    pass
+    # Updates all data of backend based on database. The values of all blocks are computed first and then written to
+    # the Backend sheet at once
+    import orchestrator
+
+    with orchestrator.Orchestrator() as refresh_orchestrator:
+        refresh_orchestrator.refresh()
+
+
+def warm_buffer():
+    # Computes the metrics of every currency, year and month of the database ahead of time, so switching the month or
+    # currency of the Dashboard is served from the buffer
+    import warmer
+
+    with warmer.BufferWarmer() as buffer_warmer:
+        buffer_warmer.warm()
 
 
 def currency_update():
@@ -0,0 +1,136 @@
+import pandas as pd
+
+import tracing
+import store
+
+
+# Headers of older workbooks that have been renamed in the transaction table
+HEADER_ALIASES = {"Input Bank": "Input Account",
+                  "Output Bank": "Output Account",
+                  "Discription": "Description"}
+
+# Amount of rows converted and written to the store at once. Only one chunk is held in memory during an import
+DEFAULT_CHUNK_SIZE = 10000
+
+# Status of imported transactions in workbooks without a status column
+DEFAULT_STATUS = "completed"
+
+VALUE_COLUMNS = ["Input Value", "Output Value"]
+TEXT_COLUMNS = ["Status", "Type", "Category", "Currency", "Input Account", "Output Account", "Description"]
+
+
+def open_workbook(wb_path):
+    # Opens a workbook in read-only mode, which streams the rows of a sheet instead of loading the complete sheet.
+    # Formulas are read as their last calculated values
+    import openpyxl
+
+    return openpyxl.load_workbook(wb_path, read_only=True, data_only=True)
+
+
+def get_column_positions(header_row):
+    # Gets the position of every transaction column in the header row of the sheet
+    position_dict = dict()
+    for position, header in enumerate(header_row):
+        if header is None:
+            continue
+        column = HEADER_ALIASES.get(str(header).strip(), str(header).strip())
+        if column in store.STORE_COLUMNS and column not in position_dict:
+            position_dict[column] = position
+
+    missing_columns = [column for column in ["Date", "Currency"] + VALUE_COLUMNS if column not in position_dict]
+    if missing_columns:
+        raise ValueError(f"The sheet has no column(s) {', '.join(missing_columns)}")
+
+    return position_dict
+
+
+def is_blank(value):
+    return value is None or (isinstance(value, str) and value.strip() == "")
+
+
+def convert_chunk(rows, row_numbers, position_dict, first_id):
+    # Converts the raw cell values of a chunk of rows into a typed dataframe. Invalid dates and values raise an error
+    # with the row number of the sheet, instead of silently becoming empty or zero
+    column_dict = dict()
+    for column, position in position_dict.items():
+        column_dict[column] = [row[position] if position < len(row) else None for row in rows]
+
+    chunk_df = pd.DataFrame(index=range(len(rows)))
+
+    # Workbooks without an ID column get consecutive IDs
+    if "ID" in column_dict:
+        ids = pd.to_numeric(pd.Series(column_dict["ID"], dtype=object), errors='coerce')
+        raise_invalid_cells(column_dict["ID"], ids.isna().to_numpy(), row_numbers, "ID", allow_blank=False)
+        chunk_df["ID"] = ids.astype('int64')
+    else:
+        chunk_df["ID"] = range(first_id, first_id + len(rows))
+
+    dates = pd.to_datetime(pd.Series(column_dict["Date"], dtype=object), errors='coerce')
+    raise_invalid_cells(column_dict["Date"], dates.isna().to_numpy(), row_numbers, "Date", allow_blank=False)
+    chunk_df["Date"] = dates.dt.normalize()
+
+    for column in VALUE_COLUMNS:
+        values = pd.to_numeric(pd.Series(column_dict[column], dtype=object), errors='coerce')
+        blank_mask = [is_blank(value) for value in column_dict[column]]
+        raise_invalid_cells(column_dict[column], values.isna().to_numpy() & ~pd.Series(blank_mask).to_numpy(),
+                            row_numbers, column)
+        chunk_df[column] = values.fillna(0).astype('float64')
+
+    for column in TEXT_COLUMNS:
+        if column in column_dict:
+            chunk_df[column] = ["" if value is None else str(value) for value in column_dict[column]]
+        elif column == "Status":
+            chunk_df[column] = DEFAULT_STATUS
+        else:
+            chunk_df[column] = ""
+
+    return chunk_df[list(store.STORE_COLUMNS.keys())]
+
+
+def raise_invalid_cells(values, invalid_mask, row_numbers, column, allow_blank=True):
+    # Raises an error naming the first invalid cell of a column
+    for value, is_invalid, row_number in zip(values, invalid_mask, row_numbers):
+        if is_invalid and not (allow_blank and is_blank(value)):
+            raise ValueError(f"Invalid {column} {value!r} in row {row_number} of the sheet")
+
+
+def iter_chunks(wb_path, sheet_name="Database", chunk_size=DEFAULT_CHUNK_SIZE):
+    # Reads the transactions of a sheet row by row and yields them as typed dataframes of at most chunk_size rows.
+    # The first row of the sheet holds the headers, empty rows are skipped
+    wb = open_workbook(wb_path)
+    try:
+        if sheet_name not in wb.sheetnames:
+            raise ValueError(f"The workbook has no sheet {sheet_name}")
+
+        row_iterator = wb[sheet_name].iter_rows(values_only=True)
+        header_row = next(row_iterator, None)
+        if header_row is None:
+            return
+        position_dict = get_column_positions(header_row)
+
+        rows = list()
+        row_numbers = list()
+        next_id = 1
+        for row_number, row in enumerate(row_iterator, start=2):
+            if all(is_blank(value) for value in row):
+                continue
+
+            rows.append(row)
+            row_numbers.append(row_number)
+
+            if len(rows) >= chunk_size:
+                yield convert_chunk(rows, row_numbers, position_dict, next_id)
+                next_id += len(rows)
+                rows, row_numbers = list(), list()
+
+        if rows:
+            yield convert_chunk(rows, row_numbers, position_dict, next_id)
+    finally:
+        wb.close()
+
+
+@tracing.traced(category="importer")
+def import_workbook(wb_path, column_store, sheet_name="Database", chunk_size=DEFAULT_CHUNK_SIZE):
+    # Streams the transactions of a sheet into the columnar store, replacing its contents. The old store stays in place
+    # if the import fails. Returns the amount of imported transactions
+    return column_store.save_chunks(iter_chunks(wb_path, sheet_name=sheet_name, chunk_size=chunk_size))
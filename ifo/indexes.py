@@ -0,0 +1,437 @@
+import copy
+import unicodedata
+import numpy as np
+import pandas as pd
+
+import accounts
+import aggregates
+
+
+# Columns with an inverted index, used for the equality filters of the Backend
+INDEXED_COLUMNS = ["Currency", "Type", "Category", "Input Account", "Output Account"]
+
+# Account type filters, answered with the precomputed account type column of the account column
+ACCOUNT_TYPE_FILTERS = {type_column: column for column, type_column in accounts.ACCOUNT_TYPE_COLUMNS.items()}
+
+
+# Description filters, answered with the description index: all terms of the query have to occur in the description
+# (anywhere, or at the start of one of its words)
+DESCRIPTION_FILTERS = {"Description": "substring", "Description Prefix": "prefix"}
+
+# Length of the n-grams of the description index
+NGRAM_LENGTH = 3
+
+
+def sort_by_date(df):
+    # Returns the transaction table sorted by date, keeping the order of entry of transactions of the same date.
+    # The index is reset, so it stays equal to the row position
+    if df['Date'].is_monotonic_increasing and isinstance(df.index, pd.RangeIndex) and df.index.start == 0 \
+            and df.index.step == 1:
+        return df
+
+    return df.sort_values("Date", kind="mergesort").reset_index(drop=True)
+
+
+def is_indexed_table(df):
+    # Only the transaction table loaded from the database (which has a database version) gets indexes. Building them
+    # costs more than a single scan of the rows, which is all a one-off filtered table or slice usually gets
+    return aggregates.get_dataframe_version(df) is not None
+
+
+def get_transaction_indexes(df):
+    # The indexes are rebuilt when the account meta data has changed, since it changes the account type columns
+    transaction_indexes = aggregates.get_cached_aggregate(df, TransactionIndexes)
+    if transaction_indexes.registry_version != accounts.get_registry().get_version():
+        transaction_indexes = TransactionIndexes(df)
+        aggregates.set_cached_aggregate(df, transaction_indexes)
+
+    return transaction_indexes
+
+
+def is_appended_to(df, previous_df):
+    # Checks if a table consists of the rows of the previous table followed by new rows, by comparing the IDs
+    if len(df) <= len(previous_df) or list(df.columns) != list(previous_df.columns):
+        return False
+
+    return np.array_equal(df['ID'].to_numpy()[:len(previous_df)], previous_df['ID'].to_numpy())
+
+
+def carry_over_indexes(previous_df, df):
+    # Maintains the indexes of a table for its next version when transactions have only been appended to it (e.g. a
+    # new transaction of the latest date), instead of rebuilding them. Returns True if the indexes were carried over
+    previous_indexes = aggregates.find_cached_aggregate(previous_df, TransactionIndexes)
+    if previous_indexes is None or not is_appended_to(df, previous_df):
+        return False
+
+    aggregates.set_cached_aggregate(df, previous_indexes.extend(df, len(previous_df)))
+    return True
+
+
+def normalize_text(text):
+    # Converts a text into its case and accent insensitive form (e.g. "Padaria São João" into "padaria sao joao")
+    text = unicodedata.normalize('NFKD', str(text).casefold())
+    return ''.join(character for character in text if not unicodedata.combining(character))
+
+
+def get_ngrams(text):
+    # Gets the set of n-grams of a normalized text
+    return {text[position:position + NGRAM_LENGTH] for position in range(len(text) - NGRAM_LENGTH + 1)}
+
+
+def get_query_terms(query):
+    # Splits a search query into its normalized terms
+    return normalize_text(query).split()
+
+
+def is_description_match(normalized_description, terms, mode):
+    # Checks if a normalized description contains all terms, anywhere (substring mode) or at the start of a word
+    # (prefix mode)
+    if mode == "prefix":
+        words = normalized_description.split()
+        return all(any(word.startswith(term) for word in words) for term in terms)
+
+    return all(term in normalized_description for term in terms)
+
+
+def is_indexed_filter(key, columns):
+    # Checks if a filter key is answered by the indexes of a table with these columns
+    if key in ["Start Date", "End Date"]:
+        return True
+    elif key in ACCOUNT_TYPE_FILTERS:
+        return ACCOUNT_TYPE_FILTERS[key] in columns
+    elif key in DESCRIPTION_FILTERS:
+        return 'Description' in columns
+
+    return key in INDEXED_COLUMNS and key in columns
+
+
+def get_filter_mask(df, key, value):
+    # Gets the boolean mask of the rows matching an indexed filter by scanning the column, for tables without indexes.
+    # Filters that don't filter anything (a missing date, another account type or an empty description) give None
+    if key in ["Start Date", "End Date"]:
+        if value is None:
+            return None
+        dates = df['Date'].to_numpy(dtype='datetime64[ns]')
+        date = np.datetime64(pd.Timestamp(value), 'ns')
+        return dates >= date if key == "Start Date" else dates <= date
+    elif key in ACCOUNT_TYPE_FILTERS:
+        if value not in accounts.ACCOUNT_TYPES:
+            return None
+        account_types = accounts.get_registry().classify_column(df[ACCOUNT_TYPE_FILTERS[key]]).array
+        return account_types.codes == accounts.ACCOUNT_TYPES.index(value)
+    elif key in DESCRIPTION_FILTERS:
+        terms = get_query_terms(value)
+        if not terms:
+            return None
+        # Every distinct description is only normalized once
+        descriptions = df['Description'].astype(str)
+        matches = [description for description in descriptions.unique()
+                   if is_description_match(normalize_text(description), terms, DESCRIPTION_FILTERS[key])]
+        return descriptions.isin(matches).to_numpy()
+
+    return df[key].astype(str).to_numpy() == str(value)
+
+
+def get_mask_positions(df, filter_dict):
+    # Gets the sorted row positions of the transactions matching the indexed filters of a filter dictionary with one
+    # combined mask, for tables without indexes. Returns None if none of the filters filters anything
+    mask = None
+    for key, value in filter_dict.items():
+        key_mask = get_filter_mask(df, key, value)
+        if key_mask is not None:
+            mask = key_mask if mask is None else mask & key_mask
+
+    return None if mask is None else np.flatnonzero(mask)
+
+
+def group_positions(series, first_position=0):
+    # Groups the row positions of a column per value, with a single sort of the factorized values. The positions of
+    # each value are sorted and start at the first position
+    codes, values = pd.factorize(series.astype(str))
+    order = np.argsort(codes, kind='stable') + first_position
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(values)))])
+
+    return {str(value): order[offsets[code]:offsets[code + 1]] for code, value in enumerate(values)}
+
+
+class DateIndex:
+
+    def __init__(self, df):
+        # Dates of the transaction table as a numpy array. If the table is sorted by date, a date range is a contiguous
+        # range of rows that is found with a binary search
+        self.dates = df['Date'].to_numpy(dtype='datetime64[ns]')
+        self.is_sorted = bool(df['Date'].is_monotonic_increasing)
+
+    def get_position_range(self, start_date=None, end_date=None):
+        # Gets the first and (exclusive) last row position of the transactions between two dates
+        start = 0
+        stop = len(self.dates)
+        if start_date is not None:
+            start = int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start_date), 'ns'), side='left'))
+        if end_date is not None:
+            stop = int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end_date), 'ns'), side='right'))
+
+        return start, max(start, stop)
+
+    def extend(self, df, first_new_position):
+        # Gets the date index of the table with rows appended from the first new position on
+        date_index = copy.copy(self)
+        new_dates = df['Date'].to_numpy(dtype='datetime64[ns]')[first_new_position:]
+        date_index.dates = np.concatenate([self.dates, new_dates])
+        date_index.is_sorted = self.is_sorted and bool(np.all(new_dates[1:] >= new_dates[:-1])) \
+            and (len(self.dates) == 0 or len(new_dates) == 0 or new_dates[0] >= self.dates[-1])
+
+        return date_index
+
+    def get_date_mask(self, start_date=None, end_date=None):
+        # Gets a boolean mask of the transactions between two dates, for tables that are not sorted by date
+        mask = np.ones(len(self.dates), dtype=bool)
+        if start_date is not None:
+            mask &= self.dates >= np.datetime64(pd.Timestamp(start_date), 'ns')
+        if end_date is not None:
+            mask &= self.dates <= np.datetime64(pd.Timestamp(end_date), 'ns')
+
+        return mask
+
+
+class InvertedIndex:
+
+    def __init__(self, series):
+        # Sorted row positions per value of a column
+        self.position_dict = group_positions(series)
+
+    def get_positions(self, value):
+        # Gets the sorted row positions of a value
+        return self.position_dict.get(str(value), np.empty(0, dtype=np.int64))
+
+    def get_positions_of_values(self, values):
+        # Gets the sorted row positions of all values of a list
+        position_list = [self.get_positions(value) for value in values]
+        if not position_list:
+            return np.empty(0, dtype=np.int64)
+
+        return np.sort(np.concatenate(position_list))
+
+    def extend(self, series, first_new_position):
+        # Gets the inverted index with the values of rows appended from the first new position on
+        inverted_index = copy.copy(self)
+        inverted_index.position_dict = dict(self.position_dict)
+
+        # The new rows are grouped per value first, so the positions of every value are concatenated only once
+        for value, new_positions in group_positions(series.iloc[first_new_position:], first_new_position).items():
+            inverted_index.position_dict[value] = np.concatenate([self.get_positions(value), new_positions])
+
+        return inverted_index
+
+
+class DescriptionIndex:
+
+    def __init__(self, series):
+        # N-gram index over the distinct descriptions of the transaction table. Every distinct description is
+        # normalized once (case and accent insensitive) and its n-grams point to it, so a search only verifies the
+        # descriptions that contain all n-grams of the query instead of scanning every row
+        self.row_index = InvertedIndex(series)
+
+        # Normalized text and words per distinct description, in order of first occurrence
+        self.descriptions = list()
+        self.normalized_descriptions = list()
+        self.description_words = list()
+
+        # Description numbers per n-gram
+        self.ngram_dict = dict()
+
+        for description in self.row_index.position_dict:
+            self.add_description(description)
+
+    def add_description(self, description):
+        # Adds a new distinct description to the index
+        number = len(self.descriptions)
+        normalized_description = normalize_text(description)
+
+        self.descriptions.append(description)
+        self.normalized_descriptions.append(normalized_description)
+        self.description_words.append(normalized_description.split())
+        for ngram in get_ngrams(normalized_description):
+            self.ngram_dict.setdefault(ngram, set()).add(number)
+
+    def extend(self, series, first_new_position):
+        # Gets the description index of the table with rows appended from the first new position on. Only the
+        # descriptions that didn't occur before are normalized and indexed
+        description_index = copy.copy(self)
+        description_index.row_index = self.row_index.extend(series, first_new_position)
+        description_index.descriptions = list(self.descriptions)
+        description_index.normalized_descriptions = list(self.normalized_descriptions)
+        description_index.description_words = list(self.description_words)
+        description_index.ngram_dict = {ngram: set(numbers) for ngram, numbers in self.ngram_dict.items()}
+
+        for description in description_index.row_index.position_dict:
+            if description not in self.row_index.position_dict:
+                description_index.add_description(description)
+
+        return description_index
+
+    def is_match(self, number, terms, mode):
+        # Checks if a description contains all terms, anywhere (substring mode) or at the start of a word (prefix mode)
+        if mode == "prefix":
+            return all(any(word.startswith(term) for word in self.description_words[number]) for term in terms)
+
+        return all(term in self.normalized_descriptions[number] for term in terms)
+
+    def get_candidates(self, terms):
+        # Gets the numbers of the descriptions that contain all n-grams of the terms. Terms shorter than an n-gram
+        # don't narrow the candidates down, so all descriptions are candidates if none of the terms is long enough
+        candidates = None
+        for term in terms:
+            for ngram in get_ngrams(term):
+                numbers = self.ngram_dict.get(ngram, set())
+                candidates = set(numbers) if candidates is None else candidates & numbers
+                if not candidates:
+                    return set()
+
+        return set(range(len(self.descriptions))) if candidates is None else candidates
+
+    def search(self, query, mode="substring"):
+        # Gets the distinct descriptions that match all terms of a query
+        terms = get_query_terms(query)
+        return [self.descriptions[number] for number in sorted(self.get_candidates(terms))
+                if self.is_match(number, terms, mode)]
+
+    def get_positions(self, query, mode="substring"):
+        # Gets the sorted row positions of the transactions whose description matches all terms of a query.
+        # Returns None for a query without terms, since it doesn't filter anything
+        if not get_query_terms(query):
+            return None
+
+        return self.row_index.get_positions_of_values(self.search(query, mode))
+
+
+class TransactionIndexes:
+
+    def __init__(self, df):
+        # Date index and inverted indexes of the equality filter columns of the transaction table. Filters are answered
+        # by intersecting sorted row positions instead of scanning every row
+        self.row_count = len(df)
+        self.date_index = DateIndex(df)
+        self.inverted_indexes = {column: InvertedIndex(df[column])
+                                 for column in INDEXED_COLUMNS if column in df.columns}
+
+        # Account type of every row per account column, as categorical columns. Each distinct account is classified
+        # once by the account registry, so an account type filter is a comparison of the category codes
+        registry = accounts.get_registry()
+        self.registry_version = registry.get_version()
+        self.account_type_columns = {type_column: registry.classify_column(df[column]).array
+                                     for column, type_column in accounts.ACCOUNT_TYPE_COLUMNS.items()
+                                     if column in df.columns}
+
+        # The description index is only built once a description is searched
+        self.descriptions = df['Description'] if 'Description' in df.columns else None
+        self.description_index = None
+
+    def get_description_index(self):
+        if self.description_index is None:
+            self.description_index = DescriptionIndex(self.descriptions)
+
+        return self.description_index
+
+    def extend(self, df, first_new_position):
+        # Gets the indexes of the table with rows appended from the first new position on
+        transaction_indexes = copy.copy(self)
+        transaction_indexes.row_count = len(df)
+        transaction_indexes.date_index = self.date_index.extend(df, first_new_position)
+        transaction_indexes.inverted_indexes = {column: inverted_index.extend(df[column], first_new_position)
+                                                for column, inverted_index in self.inverted_indexes.items()}
+
+        # Only the accounts of the new rows are classified
+        registry = accounts.get_registry()
+        transaction_indexes.account_type_columns = dict()
+        for type_column, account_types in self.account_type_columns.items():
+            new_accounts = df[ACCOUNT_TYPE_FILTERS[type_column]].iloc[first_new_position:]
+            codes = np.concatenate([account_types.codes, registry.classify_column(new_accounts).array.codes])
+            transaction_indexes.account_type_columns[type_column] = pd.Categorical.from_codes(
+                codes, categories=accounts.ACCOUNT_TYPES)
+
+        if self.descriptions is not None:
+            transaction_indexes.descriptions = df['Description']
+            if self.description_index is not None:
+                transaction_indexes.description_index = self.description_index.extend(df['Description'],
+                                                                                       first_new_position)
+
+        return transaction_indexes
+
+    def is_indexed_filter(self, key):
+        # Checks if a filter can be answered by the indexes
+        if key in ["Start Date", "End Date"]:
+            return True
+        elif key in ACCOUNT_TYPE_FILTERS:
+            return key in self.account_type_columns
+        elif key in DESCRIPTION_FILTERS:
+            return self.descriptions is not None
+        return key in self.inverted_indexes
+
+    def get_account_type_mask(self, key, value):
+        # Gets the boolean mask of the rows whose account belongs to an account type ("Input Account Type" or
+        # "Output Account Type" as key). Returns None for other account types, since they don't filter anything
+        if value not in accounts.ACCOUNT_TYPES:
+            return None
+
+        return self.account_type_columns[key].codes == accounts.ACCOUNT_TYPES.index(value)
+
+    def get_filter_positions(self, key, value):
+        # Gets the sorted row positions that match an equality, account type or description filter.
+        # Account types other than checking and saving accounts and empty descriptions don't filter anything, which is
+        # denoted by None
+        if key in ACCOUNT_TYPE_FILTERS:
+            mask = self.get_account_type_mask(key, value)
+            return None if mask is None else np.flatnonzero(mask)
+        elif key in DESCRIPTION_FILTERS:
+            return self.get_description_index().get_positions(value, DESCRIPTION_FILTERS[key])
+
+        return self.inverted_indexes[key].get_positions(value)
+
+    def get_positions(self, filter_dict):
+        # Gets the sorted row positions of the transactions matching all indexed filters of a filter dictionary.
+        # Returns None if none of the filters is indexed
+        start_date = filter_dict.get("Start Date")
+        end_date = filter_dict.get("End Date")
+        has_date_range = start_date is not None or end_date is not None
+
+        # The date range of a sorted table is a contiguous range of rows, which cuts a contiguous part out of the
+        # sorted positions of every equality filter before they are intersected
+        start, stop = self.date_index.get_position_range(start_date, end_date) if has_date_range else (None, None)
+
+        positions = None
+        for key, value in filter_dict.items():
+            if key in ["Start Date", "End Date"] or not self.is_indexed_filter(key):
+                continue
+
+            filter_positions = self.get_filter_positions(key, value)
+            if filter_positions is None:
+                continue
+            if has_date_range and self.date_index.is_sorted:
+                filter_positions = filter_positions[np.searchsorted(filter_positions, start):
+                                                    np.searchsorted(filter_positions, stop)]
+
+            if positions is None:
+                positions = filter_positions
+            else:
+                positions = np.intersect1d(positions, filter_positions, assume_unique=True)
+
+        if not has_date_range:
+            return positions
+        elif not self.date_index.is_sorted:
+            date_mask = self.date_index.get_date_mask(start_date, end_date)
+            return np.flatnonzero(date_mask) if positions is None else positions[date_mask[positions]]
+        elif positions is None:
+            return np.arange(start, stop)
+
+        return positions
+
+    def filter_dataframe(self, df, filter_dict):
+        # Applies the indexed filters to the dataframe (the one these indexes were built for).
+        # Returns the filtered dataframe and the filters that still have to be applied
+        positions = self.get_positions(filter_dict)
+        remaining_filter_dict = {key: value for key, value in filter_dict.items() if not self.is_indexed_filter(key)}
+        if positions is not None:
+            df = df.iloc[positions]
+
+        return df, remaining_filter_dict
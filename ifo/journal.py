@@ -0,0 +1,200 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+import tracing
+
+
+# Operations that can be recorded in the journal
+JOURNAL_OPERATIONS = ["new", "update", "remove"]
+
+
+def to_json_value(value):
+    # Converts the values of a transaction into plain python types that can be written to json
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, pd.Timestamp):
+        return value.strftime('%Y-%m-%d')
+
+    return str(value)
+
+
+class TransactionJournal:
+
+    def __init__(self, journal_path):
+        # Path of the journal file, with one json record per line
+        self.journal_path = journal_path
+
+        # Amount of records and running content hash of the journal, kept up to date by every append so neither has
+        # to re-read the file. They are loaded from the file on first use, and again if the file has been changed
+        # by something else than this object (its size and modification time are compared)
+        self.entry_count = None
+        self.content_hash = None
+        self.file_state = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def get_file_state(self):
+        if not os.path.exists(self.journal_path):
+            return None
+
+        file_stat = os.stat(self.journal_path)
+        return file_stat.st_size, file_stat.st_mtime_ns
+
+    def reset(self):
+        # Forgets the record count and hash, so they are loaded from the file again (e.g. after it has been restored)
+        self.entry_count = None
+        self.content_hash = None
+        self.file_state = None
+
+    def load_state(self):
+        # Loads the record count and the content hash from the file, unless they are still up to date
+        file_state = self.get_file_state()
+        if self.content_hash is not None and file_state == self.file_state:
+            return
+
+        self.content_hash = hashlib.sha1()
+        if file_state is not None:
+            with open(self.journal_path, 'rb') as file:
+                self.content_hash.update(file.read())
+        self.entry_count = len(self.read_entries())
+        self.file_state = file_state
+
+    @tracing.traced(category="journal")
+    def append(self, operation, transaction):
+        # Appends one operation to the journal. New and updated transactions contain the complete transaction
+        # dictionary, removals only need the ID. The record is flushed to disk before returning.
+        # Returns the record as it has been written, so it can be replayed on its own
+        if operation not in JOURNAL_OPERATIONS:
+            raise ValueError(f"Unknown journal operation: {operation}")
+
+        if operation == "remove":
+            record = {'op': operation, 'ID': transaction['ID']}
+        else:
+            record = {'op': operation, 'transaction': transaction}
+
+        self.load_state()
+
+        line = json.dumps(record, sort_keys=False, default=to_json_value, ensure_ascii=False) + '\n'
+        with open(self.journal_path, 'a', encoding='utf8') as file:
+            file.write(line)
+            file.flush()
+            os.fsync(file.fileno())
+
+        self.content_hash.update(line.encode('utf8'))
+        self.entry_count += 1
+        self.file_state = self.get_file_state()
+
+        return json.loads(line)
+
+    @tracing.traced(category="journal")
+    def read_entries(self):
+        # Reads all records of the journal in order of entry
+        entries = list()
+        if not os.path.exists(self.journal_path):
+            return entries
+
+        with open(self.journal_path, 'r', encoding='utf8') as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A line that was only partially written (e.g. on a crash) is skipped
+                    continue
+
+        return entries
+
+    def get_version(self):
+        # Content hash of the journal, which changes with every record appended to it
+        self.load_state()
+        if self.file_state is None:
+            return ""
+
+        return self.content_hash.hexdigest()
+
+    def get_entry_count(self):
+        self.load_state()
+        return self.entry_count
+
+    def clear(self):
+        # Removes all records from the journal, after they have been folded into the compacted database
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.reset()
+
+    def get_final_transactions(self, entries=None):
+        # Collapses all journal records into the final state per transaction ID.
+        # A value of None means that the transaction has been removed
+        if entries is None:
+            entries = self.read_entries()
+
+        final_dict = dict()
+        for entry in entries:
+            if entry['op'] == "remove":
+                final_dict[entry['ID']] = None
+            else:
+                transaction = entry['transaction']
+                final_dict[transaction['ID']] = transaction
+
+        return final_dict
+
+    @tracing.traced(category="journal")
+    def replay(self, df, start_date=None, end_date=None, entries=None):
+        # Applies the journal (or only the given records of it) on top of a dataframe and returns the result. The
+        # dataframe of the caller is never changed. Replaying is idempotent, since every record is keyed by the
+        # transaction ID
+        final_dict = self.get_final_transactions(entries)
+        if not final_dict:
+            return df
+
+        # Split the journal into rows to remove and rows to write, taking the date range of the dataframe into account
+        changed_df = pd.DataFrame([transaction for transaction in final_dict.values() if transaction is not None])
+        if len(changed_df) > 0:
+            changed_df['Date'] = pd.to_datetime(changed_df['Date'])
+            if start_date is not None:
+                changed_df = changed_df.loc[changed_df['Date'] >= pd.Timestamp(start_date)]
+            if end_date is not None:
+                changed_df = changed_df.loc[changed_df['Date'] <= pd.Timestamp(end_date)]
+            changed_df = changed_df[[column for column in df.columns if column in changed_df.columns]]
+
+        changed_ids = pd.Index(list(final_dict.keys()))
+        kept_ids = pd.Index(changed_df['ID']) if len(changed_df) > 0 else pd.Index([])
+
+        # Rows that are updated in place keep their position in the dataframe
+        in_place_mask = df['ID'].isin(kept_ids).to_numpy()
+        if in_place_mask.any():
+            df = df.copy()
+            updates_df = changed_df.set_index('ID').loc[df.loc[in_place_mask, 'ID']]
+            for column in updates_df.columns:
+                # Categorical columns are written as plain values, since the update can contain new categories
+                if isinstance(df[column].dtype, pd.CategoricalDtype):
+                    df[column] = df[column].astype(object)
+                df.loc[in_place_mask, column] = updates_df[column].to_numpy()
+
+        # Removed rows (or rows updated to a date outside of the range) are dropped
+        drop_mask = df['ID'].isin(changed_ids).to_numpy() & ~in_place_mask
+        if drop_mask.any():
+            df = df.loc[~drop_mask]
+
+        # Transactions that are not in the dataframe yet are appended at the end
+        if len(changed_df) > 0:
+            new_df = changed_df.loc[~changed_df['ID'].isin(df['ID'])].copy()
+            if len(new_df) > 0:
+                first_label = df.index.max() + 1 if len(df) > 0 else 0
+                new_df.index = pd.RangeIndex(first_label, first_label + len(new_df))
+                df = pd.concat([df, new_df])
+
+        # A complete table keeps its index equal to the row position
+        if start_date is None and end_date is None:
+            df = df.reset_index(drop=True)
+
+        return df
@@ -0,0 +1,144 @@
+import re
+import json
+import pandas as pd
+
+import schema
+
+
+# Amount of characters read from the file at once. Only the records of the current block are held in memory
+READ_BLOCK_SIZE = 1 << 16
+
+# Amount of records per dataframe when the file is read in chunks
+DEFAULT_CHUNK_SIZE = 10000
+
+WHITESPACE_RE = re.compile(r"[ \t\n\r]*")
+
+
+class JsonRecordReader:
+
+    def __init__(self, json_path, block_size=READ_BLOCK_SIZE):
+        # Reads the database json file (an object of row records keyed by the row index) one record at a time, instead
+        # of loading the complete object with json.load. Every record is decoded on its own from a buffer that holds
+        # a single block of the file
+        self.json_path = json_path
+        self.block_size = block_size
+        self.decoder = json.JSONDecoder()
+
+        self.file = None
+        self.buffer = ""
+        self.position = 0
+        self.is_eof = False
+
+    def __enter__(self):
+        self.file = open(self.json_path, 'r', encoding='utf8')
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.file.close()
+
+    def read_block(self):
+        # Drops the part of the buffer that has been decoded and appends the next block of the file
+        block = self.file.read(self.block_size)
+        self.buffer = self.buffer[self.position:] + block
+        self.position = 0
+        self.is_eof = block == ""
+
+    def next_char(self):
+        # Skips whitespace and gets the next character, without consuming it. Returns "" at the end of the file
+        while True:
+            self.position = WHITESPACE_RE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer) or self.is_eof:
+                return self.buffer[self.position:self.position + 1]
+            self.read_block()
+
+    def expect(self, chars):
+        char = self.next_char()
+        if char == "" or char not in chars:
+            raise ValueError(f"Expected {' or '.join(repr(c) for c in chars)} in {self.json_path}, got {char!r}")
+        self.position += 1
+
+        return char
+
+    def decode_value(self):
+        # Decodes the next value. A value reaching the end of the buffer may continue in the next block
+        self.next_char()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                if end < len(self.buffer) or self.is_eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.is_eof:
+                    raise
+            self.read_block()
+
+    def __iter__(self):
+        # Yields the (row index, record) pairs in the order of the file
+        self.expect("{")
+        if self.next_char() == "}":
+            return
+
+        while True:
+            key = self.decode_value()
+            self.expect(":")
+            record = self.decode_value()
+            yield key, record
+
+            if self.expect(",}") == "}":
+                return
+
+
+def to_date_str(value):
+    # Converts a date-like value into the iso date string the json file holds the dates as
+    if value is None:
+        return None
+
+    return pd.Timestamp(value).strftime('%Y-%m-%d')
+
+
+def iter_records(json_path, currencies=None, start_date=None, end_date=None):
+    # Yields the (row index, record) pairs of the database json file that match the currencies and date range.
+    # The dates are compared as iso strings, so records that don't match are dropped right after decoding
+    if isinstance(currencies, str):
+        currencies = [currencies]
+    currency_set = None if currencies is None else set(currencies)
+    start_str = to_date_str(start_date)
+    end_str = to_date_str(end_date)
+
+    with JsonRecordReader(json_path) as reader:
+        for key, record in reader:
+            if currency_set is not None and record.get("Currency") not in currency_set:
+                continue
+
+            if start_str is not None or end_str is not None:
+                date_str = str(record.get("Date", ""))[:10]
+                if start_str is not None and date_str < start_str:
+                    continue
+                if end_str is not None and date_str > end_str:
+                    continue
+
+            yield key, record
+
+
+def iter_transactions(json_path, currencies=None, start_date=None, end_date=None):
+    # Yields the matching transaction records of the database json file
+    for key, record in iter_records(json_path, currencies=currencies, start_date=start_date, end_date=end_date):
+        yield record
+
+
+def iter_chunks(json_path, chunk_size=DEFAULT_CHUNK_SIZE, currencies=None, start_date=None, end_date=None):
+    # Yields the matching transactions as dataframes of at most chunk_size rows
+    records = list()
+    for record in iter_transactions(json_path, currencies=currencies, start_date=start_date, end_date=end_date):
+        records.append(record)
+        if len(records) >= chunk_size:
+            yield records_to_dataframe(records)
+            records = list()
+
+    if records:
+        yield records_to_dataframe(records)
+
+
+def records_to_dataframe(records):
+    return pd.DataFrame(records, columns=list(schema.TRANSACTION_SCHEMA.keys()) if not records else None)
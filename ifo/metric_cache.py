@@ -0,0 +1,278 @@
+import os
+import json
+import hashlib
+import threading
+import functools
+from os.path import join
+import pathlib
+from collections import OrderedDict
+from datetime import datetime, date
+import pandas as pd
+
+import tracing
+import sinks
+import metrics
+import selection
+
+
+CACHE_PATH = join(pathlib.Path(__file__).parent.absolute(), "data", "buffer.json")
+
+# Format of the cache file. Files in another format (like the legacy buffer per currency, year and month) are ignored,
+# since their values can't be related to a database version
+CACHE_FORMAT = 2
+
+# Selections of the Dashboard that define which month is evaluated. All other selections are part of the fingerprint
+SELECTION_KEY_RANGES = ["CurrencyValidation", "YearValidation", "MonthValidation"]
+
+
+def get_selection_fingerprint(selection_snapshot, today=None):
+    # Hash of everything besides the currency, year and month that the metrics of a selection depend on: the account
+    # selections, the investment currency, the inputs of the Backend sheet and, for the current month, today's date
+    # (for week and day metrics)
+    if today is None:
+        today = datetime.today().date()
+
+    # An empty cell of the sheet is read as None, while the selections created without the workbook hold "" for it
+    fingerprint_dict = {named_range: "" if value is None else value
+                        for named_range, value in sorted(selection_snapshot.selection_dict.items())
+                        if named_range not in SELECTION_KEY_RANGES}
+    fingerprint_dict['EndYearNumber'] = selection_snapshot.end_year_number
+    fingerprint_dict['EndMonthNumber'] = selection_snapshot.end_month_number
+    fingerprint_dict['ListedCategories'] = sorted(selection_snapshot.category_list)
+    if selection_snapshot.start_date <= today <= selection_snapshot.end_date:
+        fingerprint_dict['Today'] = today.isoformat()
+
+    fingerprint_json = json.dumps(fingerprint_dict, sort_keys=True, default=str)
+    return hashlib.sha1(fingerprint_json.encode('utf8')).hexdigest()[:16]
+
+
+def synchronized(method):
+    # Runs a method of the cache while holding its lock, so the cache can be filled by a background warm-up while the
+    # Backend uses it
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def get_cache_key(currency, year, month, fingerprint):
+    return f"{currency}|{int(year)}|{month}|{fingerprint}"
+
+
+def dependencies_to_json(dependency_dict):
+    # Converts the date ranges per currency into iso date strings
+    return {currency: [[None if start_date is None else start_date.isoformat(), end_date.isoformat()]
+                       for start_date, end_date in date_ranges]
+            for currency, date_ranges in dependency_dict.items()}
+
+
+def is_affected(dependency_json, currency, transaction_date):
+    # Checks if a transaction of a currency on a date lies within the date ranges a cache entry depends on
+    transaction_date = pd.Timestamp(transaction_date).date().isoformat()
+    for start_date, end_date in dependency_json.get(currency, []):
+        if (start_date is None or start_date <= transaction_date) and transaction_date <= end_date:
+            return True
+
+    return False
+
+
+def get_entry_selection(entry):
+    # Recreates the selection a cache entry was computed for
+    return selection.Selection(entry['selection'], end_year_number=entry.get('end_year_number'),
+                               end_month_number=entry.get('end_month_number'), category_list=entry.get('category_list'))
+
+
+class MetricCache:
+
+    def __init__(self, cache_path=None, max_entries=256, template_dict=None):
+        # Cache of the evaluated metrics per currency, year, month and selection fingerprint.
+        # Each entry holds the database version it was computed for, and is only served for that version.
+        # The least recently used entries are evicted once the cache holds more than max_entries
+        self.cache_path = CACHE_PATH if cache_path is None else cache_path
+        self.max_entries = max_entries
+
+        # Template of the cached metrics, which defines the date ranges each entry depends on
+        self.template_dict = template_dict
+
+        # Entries in order of use, the most recently used last
+        self.entry_dict = None
+        self.lock = threading.RLock()
+
+        # Usage statistics since the cache was created
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0, 'rebased': 0, 'recomputed': 0,
+                      'invalidated': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    @synchronized
+    @tracing.traced(category="metric cache")
+    def load(self):
+        # Loads the entries from the cache file on first use
+        if self.entry_dict is not None:
+            return self.entry_dict
+
+        self.entry_dict = OrderedDict()
+        if not os.path.exists(self.cache_path):
+            return self.entry_dict
+
+        try:
+            with open(self.cache_path, 'r', encoding='utf8') as file:
+                cache_dict = json.load(file)
+        except (OSError, ValueError):
+            # An unreadable cache is rebuilt
+            return self.entry_dict
+
+        if isinstance(cache_dict, dict) and cache_dict.get('format') == CACHE_FORMAT:
+            for entry in cache_dict.get('entries', []):
+                key = get_cache_key(entry['currency'], entry['year'], entry['month'], entry['fingerprint'])
+                self.entry_dict[key] = entry
+
+        return self.entry_dict
+
+    @synchronized
+    @tracing.traced(category="metric cache")
+    def save(self):
+        # Saves the entries, writing a temporary file first so the cache file is never half written
+        entry_dict = self.load()
+        cache_dict = {'format': CACHE_FORMAT, 'entries': list(entry_dict.values())}
+
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf8') as file:
+            json.dump(cache_dict, file, indent=4, default=sinks.to_output_value, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
+
+    def get_template(self):
+        # Loads the metric template on first use
+        if self.template_dict is None:
+            self.template_dict = metrics.load_metric_template()
+
+        return self.template_dict
+
+    @synchronized
+    def get(self, version, selection_snapshot, today=None):
+        # Gets the metric values of a selection computed for the database version, or None if they are not cached
+        entry_dict = self.load()
+        key = get_cache_key(selection_snapshot.currency, selection_snapshot.year, selection_snapshot.month,
+                            get_selection_fingerprint(selection_snapshot, today=today))
+
+        entry = entry_dict.get(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        if version is None or entry['version'] != version:
+            self.stats['stale'] += 1
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['hits'] += 1
+        entry_dict.move_to_end(key)
+        return dict(entry['values'])
+
+    @synchronized
+    def contains(self, version, selection_snapshot, today=None):
+        # Checks if the metric values of a selection are cached for the database version, without counting it as a
+        # lookup
+        key = get_cache_key(selection_snapshot.currency, selection_snapshot.year, selection_snapshot.month,
+                            get_selection_fingerprint(selection_snapshot, today=today))
+        entry = self.load().get(key)
+
+        return entry is not None and version is not None and entry['version'] == version
+
+    @synchronized
+    def put(self, version, selection_snapshot, values, today=None):
+        # Stores the metric values of a selection for a database version. Values without a version are not cached
+        if version is None:
+            return
+
+        if today is None:
+            today = datetime.today().date()
+
+        entry_dict = self.load()
+        fingerprint = get_selection_fingerprint(selection_snapshot, today=today)
+        key = get_cache_key(selection_snapshot.currency, selection_snapshot.year, selection_snapshot.month,
+                            fingerprint)
+
+        dependency_dict = metrics.get_metric_dependencies(self.get_template(), selection_snapshot, today=today)
+        entry_dict[key] = {'currency': selection_snapshot.currency,
+                           'year': selection_snapshot.year,
+                           'month': selection_snapshot.month,
+                           'fingerprint': fingerprint,
+                           'selection': selection_snapshot.selection_dict,
+                           'end_year_number': selection_snapshot.end_year_number,
+                           'end_month_number': selection_snapshot.end_month_number,
+                           'category_list': selection_snapshot.category_list,
+                           'today': today.isoformat(),
+                           'dependencies': dependencies_to_json(dependency_dict),
+                           'version': version,
+                           'values': {named_range: sinks.to_output_value(value)
+                                      for named_range, value in values.items()}}
+        entry_dict.move_to_end(key)
+
+        while len(entry_dict) > self.max_entries:
+            entry_dict.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def get_or_compute(self, version, selection_snapshot, compute_function, today=None):
+        # Gets the metric values of a selection from the cache, computing and storing them on a miss
+        values = self.get(version, selection_snapshot, today=today)
+        if values is None:
+            values = compute_function()
+            self.put(version, selection_snapshot, values, today=today)
+
+        return values
+
+    @synchronized
+    @tracing.traced(category="metric cache")
+    def apply_edit(self, previous_version, version, changed_transactions, recompute_function=None):
+        # Brings the entries of the previous database version to the new version after transactions have been added,
+        # removed or edited. changed_transactions is a list of (currency, date) of every changed transaction, before
+        # and after the edit. Entries whose date ranges don't contain any of them are still valid and are only
+        # rebased. The other entries are recomputed with recompute_function(selection, today), or removed without it
+        entry_dict = self.load()
+
+        result = {'rebased': 0, 'recomputed': 0, 'invalidated': 0}
+        for key, entry in list(entry_dict.items()):
+            if entry['version'] != previous_version:
+                continue
+
+            # Entries without known dependencies are always treated as affected
+            dependency_json = entry.get('dependencies')
+            if dependency_json is not None and not any(is_affected(dependency_json, currency, transaction_date)
+                                                       for currency, transaction_date in changed_transactions):
+                entry['version'] = version
+                result['rebased'] += 1
+            elif recompute_function is not None:
+                today = date.fromisoformat(entry['today'])
+                values = recompute_function(get_entry_selection(entry), today)
+                entry['values'] = {named_range: sinks.to_output_value(value) for named_range, value in values.items()}
+                entry['version'] = version
+                result['recomputed'] += 1
+            else:
+                del entry_dict[key]
+                result['invalidated'] += 1
+
+        for name, count in result.items():
+            self.stats[name] += count
+
+        return result
+
+    @synchronized
+    def clear(self):
+        # Removes all entries
+        self.load().clear()
+
+    @synchronized
+    def get_stats(self):
+        # Gets the usage statistics, together with the amount of entries and the hit rate
+        stats = dict(self.stats)
+        stats['entries'] = len(self.load())
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups > 0 else 0.0
+
+        return stats
@@ -0,0 +1,261 @@
+from os.path import join
+import pathlib
+import json
+import calendar
+from datetime import datetime, date, timedelta
+from dateutil.relativedelta import relativedelta
+
+import aggregates
+import filter_plan
+
+
+TEMPLATE_PATH = join(pathlib.Path(__file__).parent.absolute(), "data", "buffer_template.json")
+
+# Account type that belongs to each balance reference type of the template
+BALANCE_ACCOUNT_TYPES = {"balance": "checking accounts", "saving": "saving accounts"}
+
+
+def load_metric_template(template_path=None):
+    # Loads the template describing how each named range of the Backend sheet is calculated
+    if template_path is None:
+        template_path = TEMPLATE_PATH
+
+    with open(template_path, 'r', encoding='utf8') as file:
+        template_dict = json.load(file)
+
+    return template_dict
+
+
+def get_listed_categories(template_dict):
+    # Gets the categories of the spending per category chart of the template, in order of first occurrence. These are
+    # the categories listed in ListedCategories of the Backend sheet
+    category_list = list()
+    for metric_dict in template_dict.values():
+        category = metric_dict.get('category')
+        if 'month_num' in metric_dict and category is not None and category not in category_list:
+            category_list.append(category)
+
+    return category_list
+
+
+def get_sum_column(transaction_type):
+    # Earnings are summed on the input value, all other transaction types on the output value
+    return "Input Value" if transaction_type == "earning" else "Output Value"
+
+
+def get_month_number(month):
+    # Converts a month name (as used in the Dashboard validation) or number into the month number
+    if isinstance(month, str):
+        return datetime.strptime(month, "%B").month
+
+    return int(month)
+
+
+def merge_date_ranges(date_ranges):
+    # Merges overlapping and adjacent date ranges. A start date of None means the range has no lower limit
+    merged_ranges = list()
+    for start_date, end_date in sorted(date_ranges, key=lambda item: (item[0] is not None, item[0] or date.min)):
+        if merged_ranges:
+            last_start_date, last_end_date = merged_ranges[-1]
+            if start_date is None or start_date <= last_end_date + timedelta(days=1):
+                merged_ranges[-1] = (last_start_date, max(last_end_date, end_date))
+                continue
+        merged_ranges.append((start_date, end_date))
+
+    return merged_ranges
+
+
+def get_metric_dependencies(template_dict, selection_snapshot, today=None):
+    # Gets the date ranges per currency that the metrics of a selection are computed from, so a cached result only has
+    # to be recomputed when a transaction within one of them changes. Balances reach back to the first transaction,
+    # which is denoted by a start date of None
+    timeframes = MetricTimeframes()
+    timeframes.set_selection(selection_snapshot.currency, selection_snapshot.year, selection_snapshot.month,
+                             selections=selection_snapshot.selection_dict, today=today,
+                             chart_end_date=selection_snapshot.chart_end_date)
+
+    range_dict = dict()
+    for metric_dict in template_dict.values():
+        start_date, end_date = timeframes.get_timeframe_dates(metric_dict)
+        if start_date is not None and start_date > end_date:
+            continue
+        range_dict.setdefault(timeframes.get_metric_currency(metric_dict), set()).add((start_date, end_date))
+
+    return {currency: merge_date_ranges(date_ranges) for currency, date_ranges in range_dict.items()}
+
+
+class MetricTimeframes:
+
+    def __init__(self, earliest_date=None):
+        # Converts the timeframes of the template into dates for a selected currency and month
+        self.earliest_date = earliest_date
+
+        # Selection parameters, set per evaluation
+        self.currency = None
+        self.investment_currency = None
+        self.selections = None
+        self.today = None
+        self.start_date = None
+        self.end_date = None
+        self.ref_date = None
+        self.chart_end_date = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def set_selection(self, currency, year, month, selections=None, today=None, chart_end_date=None):
+        # Sets the currency and month for which the metrics are evaluated, and derives all dates from it once.
+        # The charts end at the selected month, unless another chart end date (EndYearNumber and EndMonthNumber of the
+        # Backend sheet) is given
+        self.currency = currency
+        self.selections = dict() if selections is None else selections
+        self.investment_currency = self.selections.get('InvestmentCurrencyValidation') or currency
+        self.today = datetime.today().date() if today is None else today
+
+        year = int(year)
+        month_number = get_month_number(month)
+        last_day = calendar.monthrange(year, month_number)[1]
+        self.start_date = date(year, month_number, 1)
+        self.end_date = date(year, month_number, last_day)
+
+        self.chart_end_date = self.end_date if chart_end_date is None else chart_end_date
+
+        # If the selected month is the current month, today is the reference date for weeks and quarters
+        if self.start_date <= self.today <= self.end_date:
+            self.ref_date = self.today
+        else:
+            self.ref_date = self.end_date
+
+    def get_timeframe_dates(self, metric_dict):
+        # Converts the timeframe of a metric into its start and end date
+        timeframe = metric_dict['timeframe']
+        last_month_end_date = self.start_date - timedelta(days=1)
+
+        if timeframe == "month" and 'month_num' in metric_dict:
+            # Charts show the twelve months up to and including the month the charts end at
+            year_start_date = self.chart_end_date + relativedelta(days=1) - relativedelta(years=1)
+            start_date = year_start_date + relativedelta(months=metric_dict['month_num'] - 1)
+            return start_date, start_date + relativedelta(months=1) - relativedelta(days=1)
+        elif timeframe == "month":
+            return self.start_date, self.end_date
+        elif timeframe == "last month":
+            return last_month_end_date.replace(day=1), last_month_end_date
+        elif timeframe == "until month":
+            return self.earliest_date, self.end_date
+        elif timeframe == "until last month":
+            return self.earliest_date, last_month_end_date
+        elif timeframe == "week":
+            start_date = self.ref_date - timedelta(days=self.ref_date.weekday())
+            return start_date, start_date + timedelta(days=6)
+        elif timeframe.startswith("quarter"):
+            quarter = int(timeframe.replace("quarter", ""))
+            start_date = date(self.ref_date.year, 3 * quarter - 2, 1)
+            return start_date, start_date + relativedelta(months=3) - timedelta(days=1)
+        elif timeframe == "year":
+            # Year totals of the charts are of the year the charts end in
+            return date(self.chart_end_date.year, 1, 1), date(self.chart_end_date.year, 12, 31)
+        elif timeframe == "day":
+            # Today only counts when it lies in the selected month
+            if self.start_date <= self.today <= self.end_date:
+                return self.today, self.today
+            return self.today, self.today - timedelta(days=1)
+        else:
+            raise ValueError(f"Unknown timeframe: {timeframe}")
+
+    def get_metric_currency(self, metric_dict):
+        # Balances are always of the selected currency, other metrics can be of the investment currency
+        if metric_dict['calc_type'] != "balance sum" and metric_dict.get('currency') == "investment":
+            return self.investment_currency
+
+        return self.currency
+
+
+class MetricEvaluator(MetricTimeframes):
+
+    def __init__(self, df, template_dict=None):
+        # Evaluates all metrics of the buffer template over the transaction table.
+        # The aggregates are computed once per database version and shared by all metrics
+        super().__init__(earliest_date=df['Date'].min().date() if len(df) > 0 else None)
+        self.df = df
+        self.template_dict = load_metric_template() if template_dict is None else template_dict
+
+        self.cube = aggregates.get_monthly_cube(df)
+        self.balance_index = aggregates.get_balance_index(df)
+
+    def create_filter_dict(self, metric_dict, transaction_type=None, category=None):
+        # Creates the filter of a metric, in the same format as the Backend filters
+        start_date, end_date = self.get_timeframe_dates(metric_dict)
+
+        filter_dict = dict()
+        filter_dict['Currency'] = self.get_metric_currency(metric_dict)
+        filter_dict['Start Date'] = start_date
+        filter_dict['End Date'] = end_date
+
+        # The reference type "all" includes every transaction type (e.g. the spending per category chart)
+        if transaction_type is not None and transaction_type != "all":
+            filter_dict['Type'] = transaction_type
+        if category is not None:
+            filter_dict['Category'] = category
+
+        return filter_dict
+
+    def aggregate(self, how, column, filter_dict):
+        # Aggregates a column over a filter. Whole months are looked up in the monthly cube, other periods (weeks and
+        # days) are computed from the rows of that period
+        value = self.cube.aggregate(how, column, filter_dict)
+        if value is not None:
+            return value
+
+        # The filters are answered by the compiled filter plan, the rows of that period are only read for the values
+        return filter_plan.aggregate_filtered(self.df, filter_dict, how, column)
+
+    def evaluate_metric(self, metric_dict):
+        # Evaluates a single metric of the template for the current selection
+        calc_type = metric_dict['calc_type']
+        ref_type = metric_dict['ref_type']
+        category = metric_dict.get('category')
+
+        if calc_type == "balance sum":
+            start_date, end_date = self.get_timeframe_dates(metric_dict)
+            if 'ref_named_range' in metric_dict:
+                account = self.selections.get(metric_dict['ref_named_range'])
+                return self.balance_index.get_balance(self.currency, end_date, start_date=start_date, account=account)
+
+            return self.balance_index.get_balance(self.currency, end_date, start_date=start_date,
+                                                  account_type=BALANCE_ACCOUNT_TYPES[ref_type])
+
+        elif calc_type == "inverse sum":
+            # Invested value: the amount put into the investment minus the amount earned back from it
+            invested = self.aggregate("sum", "Output Value", self.create_filter_dict(metric_dict, ref_type, category))
+            returned = self.aggregate("sum", "Input Value", self.create_filter_dict(metric_dict, "earning", category))
+            return invested - returned
+
+        elif calc_type == "average":
+            # Average per day of the month
+            start_date, end_date = self.get_timeframe_dates(metric_dict)
+            value = self.aggregate("sum", get_sum_column(ref_type),
+                                   self.create_filter_dict(metric_dict, ref_type, category))
+            return round(value / end_date.day, 2)
+
+        return self.aggregate(calc_type, get_sum_column(ref_type),
+                              self.create_filter_dict(metric_dict, ref_type, category))
+
+    def evaluate(self, currency, year, month, selections=None, today=None, chart_end_date=None):
+        # Evaluates all metrics of the template for a currency, year and month.
+        # Returns a dictionary with the value of each named range
+        self.set_selection(currency, year, month, selections=selections, today=today, chart_end_date=chart_end_date)
+
+        metric_values = dict()
+        for named_range, metric_dict in self.template_dict.items():
+            metric_values[named_range] = self.evaluate_metric(metric_dict)
+
+        return metric_values
+
+    def evaluate_selection(self, selection_snapshot, today=None):
+        # Evaluates all metrics of the template for a Selection of the Dashboard
+        return self.evaluate(selection_snapshot.currency, selection_snapshot.year, selection_snapshot.month,
+                             selections=selection_snapshot.selection_dict, today=today,
+                             chart_end_date=selection_snapshot.chart_end_date)
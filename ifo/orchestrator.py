@@ -0,0 +1,106 @@
+import tracing
+import sinks
+import backend
+import compute
+import sheet_io
+import selection
+import session
+import aggregates
+
+
+# Blocks of the Backend computed by a refresh, in order, with their arguments (None stands for the transaction table).
+# The average day spending chart reads the spending of this and last month from the spending block, so it comes after it
+REFRESH_BLOCKS = [("monthly_spending_earning_block", ("spending",)),
+                  ("average_day_spending_chart", (None,)),
+                  ("monthly_spending_earning_block", ("earning",)),
+                  ("monthly_balance_and_saving_block", (None, False)),
+                  ("monthly_balance_and_saving_block", (None, True)),
+                  ("week_quarter_spending_and_investment_block", (None, False)),
+                  ("week_quarter_spending_and_investment_block", (None, True)),
+                  ("spending_per_category_chart", (None,)),
+                  ("transaction_per_type_chart", (None,)),
+                  ("investment_portfolio_chart", (None,)),
+                  ("spending_per_type_chart", (None,)),
+                  ("recent_transactions_block", (None,))]
+
+# Blocks that are computed on every refresh, besides the cached metrics. The recent transactions depend on today's date
+# and on the latest transactions, which the date ranges of the cached metrics don't cover
+UNCACHED_BLOCK_NAMES = ["recent_transactions_block"]
+UNCACHED_BLOCKS = [(block, arguments) for block, arguments in REFRESH_BLOCKS if block in UNCACHED_BLOCK_NAMES]
+
+
+class Orchestrator:
+
+    def __init__(self, current_session=None):
+        # Runs the blocks of a Backend refresh against the transaction table of the session. The values of all blocks
+        # are collected in memory and written to the sheet at once. The blocks run one after the other: they are
+        # numpy and pandas work that holds the GIL, so worker threads didn't make a refresh faster
+        self.session = session.get_session(current_session)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def read_selection(self):
+        # Reads the selections of the Dashboard and the inputs of the Backend sheet in bulk
+        return selection.read_selection_snapshot(self.session.get_workbook(),
+                                                 dashboard_layout=self.session.get_layout("Dashboard"),
+                                                 backend_layout=self.session.get_layout("Backend"))
+
+    @tracing.traced(category="orchestrator")
+    def compute_blocks(self, selection_snapshot, df=None, blocks=None):
+        # Computes the values of the blocks (by default all blocks of a refresh) for a selection, per named range
+        if df is None:
+            df = self.session.get_dataframe()
+        if blocks is None:
+            blocks = REFRESH_BLOCKS
+
+        sink = sinks.MemorySink()
+        backend_object = backend.Backend(selection_snapshot=selection_snapshot, sink=sink, current_session=self.session)
+        for block, arguments in blocks:
+            arguments = [df if argument is None else argument for argument in arguments]
+            getattr(backend_object, block)(*arguments)
+        backend_object.flush_writes()
+
+        return sink.get_values()
+
+    @tracing.traced(category="orchestrator")
+    def get_values(self, selection_snapshot, df=None):
+        # Gets the values of all blocks for a selection. The metrics are served from the metric cache of the session
+        # when they are cached for the database version of the transaction table (e.g. by the buffer warm-up), and
+        # stored in it after they have been computed. They are always evaluated from the metric template, like the
+        # warm-up and the recomputation after an edit do, so a cached entry has the same values whichever of them
+        # stored it
+        if df is None:
+            df = self.session.get_dataframe()
+
+        version = aggregates.get_dataframe_version(df)
+        metric_cache = self.session.metric_cache
+        value_dict = metric_cache.get(version, selection_snapshot)
+        if value_dict is None:
+            value_dict = compute.get_backend_metrics(df, selection_snapshot, template_dict=metric_cache.get_template())
+            if version is not None:
+                metric_cache.put(version, selection_snapshot, value_dict)
+                metric_cache.save()
+
+        value_dict.update(self.compute_blocks(selection_snapshot, df=df, blocks=UNCACHED_BLOCKS))
+
+        return value_dict
+
+    @tracing.traced(category="orchestrator")
+    def refresh(self, selection_snapshot=None, sink=None):
+        # Refreshes the Backend: reads the selection, gets the values of all blocks and writes them in a single flush.
+        # By default the selection is read from the workbook and the values are written to the Backend sheet
+        if selection_snapshot is None:
+            selection_snapshot = self.read_selection()
+        if sink is None:
+            sink = sheet_io.RangeWritePlan(self.session.get_sheet("Backend"), self.session.get_layout("Backend"))
+
+        value_dict = self.get_values(selection_snapshot)
+
+        sink.write(value_dict)
+        sink.flush()
+
+        return value_dict
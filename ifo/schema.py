@@ -0,0 +1,55 @@
+import pandas as pd
+
+
+# Declared schema of the transaction table. It is applied once when the database is loaded, so all other functions
+# can rely on typed columns (e.g. no more date parsing before every filter)
+TRANSACTION_SCHEMA = {
+    "ID": "int64",
+    "Status": "category",
+    "Date": "datetime64[ns]",
+    "Type": "category",
+    "Category": "category",
+    "Currency": "category",
+    "Input Value": "float64",
+    "Output Value": "float64",
+    "Input Account": "category",
+    "Output Account": "category",
+    "Description": "object",
+}
+
+
+def has_schema_dtype(series, dtype):
+    # Checks if a column already has the dtype declared in the schema
+    if dtype == "category":
+        return isinstance(series.dtype, pd.CategoricalDtype)
+    elif dtype == "object":
+        return series.dtype == object
+
+    return series.dtype == pd.Series(dtype=dtype).dtype
+
+
+def convert_column(series, dtype):
+    # Converts a single column to the dtype declared in the schema
+    if dtype == "datetime64[ns]":
+        return pd.to_datetime(series).astype(dtype)
+    elif dtype == "float64":
+        return pd.to_numeric(series, errors='coerce').fillna(0).astype(dtype)
+    elif dtype == "int64":
+        return pd.to_numeric(series).astype(dtype)
+    else:
+        # Text columns never contain missing values, only empty strings
+        return series.fillna("").astype(str).astype(dtype)
+
+
+def apply_schema(df):
+    # Returns the dataframe with all transaction columns converted to the declared schema.
+    # Columns that already have the correct dtype are left untouched, so applying the schema twice costs nothing
+    converted_columns = dict()
+    for column, dtype in TRANSACTION_SCHEMA.items():
+        if column in df.columns and not has_schema_dtype(df[column], dtype):
+            converted_columns[column] = convert_column(df[column], dtype)
+
+    if not converted_columns:
+        return df
+
+    return df.assign(**converted_columns)
@@ -0,0 +1,93 @@
+import calendar
+from datetime import datetime, date
+from dateutil.relativedelta import relativedelta
+
+import sheet_io
+
+
+# Data validation cells of the Dashboard that define the current selection
+DASHBOARD_SELECTION_RANGES = ["CurrencyValidation",
+                              "InvestmentCurrencyValidation",
+                              "YearValidation",
+                              "MonthValidation",
+                              "MostUsedCheckingAccount",
+                              "CheckingAccountValidation",
+                              "CheckingAccountValidation2",
+                              "MostUsedSavingAccount",
+                              "SavingAccountValidation",
+                              "SavingAccountValidation2"]
+
+# Named inputs of the Backend sheet that are used by the chart blocks
+BACKEND_INPUT_RANGES = ["EndYearNumber", "EndMonthNumber", "ListedCategories"]
+
+
+def clean_selection_value(value):
+    # For validation values that are float, convert them into integer
+    if type(value) is float:
+        value = int(value)
+
+    return value
+
+
+class Selection:
+
+    def __init__(self, selection_dict, end_year_number=None, end_month_number=None, category_list=None):
+        # In-memory snapshot of the Dashboard selections and Backend inputs of one refresh.
+        # All dates derived from the selection are computed once here
+        self.selection_dict = selection_dict
+
+        self.currency = selection_dict["CurrencyValidation"]
+        self.investment_currency = selection_dict.get("InvestmentCurrencyValidation")
+        self.year = int(selection_dict["YearValidation"])
+        self.month = selection_dict["MonthValidation"]
+        self.month_number = datetime.strptime(self.month, "%B").month
+
+        # Selected month and the month before it
+        last_day_month = calendar.monthrange(self.year, self.month_number)[1]
+        self.end_date = date(year=self.year, month=self.month_number, day=last_day_month)
+        self.start_date = self.end_date.replace(day=1)
+        self.last_month_start_date = self.start_date - relativedelta(months=1)
+        self.last_month_end_date = self.start_date - relativedelta(days=1)
+
+        # The charts end at the selected month, unless the Backend sheet states otherwise
+        self.end_year_number = self.year if end_year_number is None else int(end_year_number)
+        self.end_month_number = self.month_number if end_month_number is None else int(end_month_number)
+        last_day = calendar.monthrange(self.end_year_number, self.end_month_number)[1]
+        self.chart_end_date = date(year=self.end_year_number, month=self.end_month_number, day=last_day)
+        self.chart_start_date = self.chart_end_date + relativedelta(days=1) - relativedelta(years=1)
+
+        # Categories listed in the spending per category chart
+        self.category_list = list() if category_list is None else category_list
+
+
+def get_sheet_selection(selection_dict, category_list=None):
+    # Creates the Selection a refresh would read from the workbook for Dashboard selections that are not read from it
+    # (e.g. the selections of the buffer warm-up). The values are cleaned like the values read from the sheet and the
+    # Backend inputs follow the formulas of the Backend sheet: EndYearNumber is the selected year and EndMonthNumber
+    # the number of the selected month
+    selection_dict = {named_range: clean_selection_value(value) for named_range, value in selection_dict.items()}
+    end_year_number = int(selection_dict["YearValidation"])
+    end_month_number = datetime.strptime(selection_dict["MonthValidation"], "%B").month
+
+    return Selection(selection_dict, end_year_number=end_year_number, end_month_number=end_month_number,
+                     category_list=category_list)
+
+
+def read_selection_snapshot(wb, dashboard_layout=None, backend_layout=None):
+    # Reads all named inputs required for a refresh with one batched read per sheet and returns them as a Selection
+    dashboard_ws = wb.sheets["Dashboard"].api
+    backend_ws = wb.sheets["Backend"].api
+
+    if dashboard_layout is None:
+        dashboard_layout = sheet_io.RangeLayout(dashboard_ws, "Dashboard")
+    if backend_layout is None:
+        backend_layout = sheet_io.RangeLayout(backend_ws, "Backend")
+
+    dashboard_values = sheet_io.read_named_ranges(dashboard_ws, dashboard_layout, DASHBOARD_SELECTION_RANGES)
+    backend_values = sheet_io.read_named_ranges(backend_ws, backend_layout, BACKEND_INPUT_RANGES)
+
+    selection_dict = {named_range: clean_selection_value(value) for named_range, value in dashboard_values.items()}
+    category_list = [item for t in backend_values["ListedCategories"] for item in t]
+
+    return Selection(selection_dict, end_year_number=backend_values["EndYearNumber"],
+                     end_month_number=backend_values["EndMonthNumber"], category_list=category_list)
@@ -0,0 +1,194 @@
+import database
+import compute
+import sheet_io
+import metric_cache
+import filter_plan
+
+
+# Session shared by everything that runs in the process, created on first use
+_current_session = None
+
+
+def get_session(session=None):
+    # Returns the given session, or the process-wide session if none is given
+    global _current_session
+
+    if session is not None:
+        return session
+    if _current_session is None:
+        _current_session = Session()
+
+    return _current_session
+
+
+def set_session(session):
+    # Replaces the process-wide session, e.g. with a session of another workbook
+    global _current_session
+    _current_session = session
+
+
+def reset_session():
+    # Drops the process-wide session, so the next use starts with a fresh workbook handle and transaction table
+    set_session(None)
+
+
+class Session:
+
+    def __init__(self, wb_path=None):
+        # Owns the resources shared by the Database, Backend and Dashboard objects of a refresh: one database object,
+        # one lazily opened workbook handle, one loaded transaction table, the named range layouts of the sheets and
+        # the metric cache
+        self.database = database.Database()
+        if wb_path is not None:
+            self.database.wb_path = wb_path
+
+        # Complete transaction table, loaded on first use
+        self.df = None
+
+        # Named range layouts per sheet name
+        self.layout_dict = dict()
+
+        # Cache of the evaluated metrics per database version
+        self.metric_cache = metric_cache.MetricCache()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def get_workbook(self):
+        # Opens the workbook on first use. The handle is shared with the database object
+        return self.database.get_workbook()
+
+    def get_sheet(self, sheet_name):
+        return self.get_workbook().sheets[sheet_name].api
+
+    def get_layout(self, sheet_name):
+        # Gets the named range layout of a sheet, so the layout file is read only once per process
+        if sheet_name not in self.layout_dict:
+            self.layout_dict[sheet_name] = sheet_io.RangeLayout(self.get_sheet(sheet_name), sheet_name)
+
+        return self.layout_dict[sheet_name]
+
+    def get_dataframe(self, reload=False):
+        # Gets the complete transaction table, loading it from the database only once
+        if self.df is None or reload:
+            self.df = self.database.get_current_database_dataframe()
+
+        return self.df
+
+    def set_dataframe(self, df):
+        # Replaces the transaction table of the session, e.g. after transactions have been entered
+        self.df = df
+
+    def apply_database_changes(self, recompute=True):
+        # Takes over the transaction table edited through the database object of the session and brings the metric
+        # cache to the new database version. Only the cached months that depend on the changed transactions are
+        # recomputed (or removed when recompute is False), all other months are kept
+        change_log = self.database.change_log
+        if not change_log:
+            return None
+
+        self.df = self.database.database_df
+
+        # The edits are applied as a single edit from the first to the last version
+        previous_version = change_log[0][0]
+        version = change_log[-1][1]
+        changed_transactions = [transaction for log_entry in change_log for transaction in log_entry[2]]
+        change_log.clear()
+
+        recompute_function = None
+        if recompute:
+            def recompute_function(selection_snapshot, today):
+                return compute.get_backend_metrics(self.df, selection_snapshot,
+                                                   template_dict=self.metric_cache.get_template(), today=today)
+
+        result = self.metric_cache.apply_edit(previous_version, version, changed_transactions,
+                                              recompute_function=recompute_function)
+        self.metric_cache.save()
+
+        return result
+
+    def new_transaction(self, new_trn_dict, recompute=True):
+        # Enters a transaction in the database and brings the transaction table and the metric cache up to date
+        self.database.new_transaction_to_dataframe(new_trn_dict, df=self.get_dataframe())
+
+        return self.apply_database_changes(recompute=recompute)
+
+    def remove_transactions(self, index_list, recompute=True):
+        # Removes the transactions at some row positions of the transaction table from the database
+        self.database.remove_transaction_from_dataframe(index_list, df=self.get_dataframe())
+
+        return self.apply_database_changes(recompute=recompute)
+
+    def update_transactions(self, filtered_df=None, recompute=True):
+        # Updates the transactions of a filtered table (by their ID) in the database
+        self.database.update_transactions_in_dataframe(filtered_df=filtered_df)
+
+        return self.apply_database_changes(recompute=recompute)
+
+    def import_workbook(self, wb_path=None):
+        # Replaces the database with the Database sheet of a workbook. Every transaction may have changed, so the
+        # transaction table is loaded again on its next use. The cached metrics belong to an older database version and
+        # are no longer served. Returns the amount of imported transactions
+        row_count = self.database.get_legacy_database_from_ifo(wb_path=wb_path)
+        self.reset_dataframe()
+
+        return row_count
+
+    def restore_database(self, snapshot_id=None, timestamp=None):
+        # Restores a snapshot of the database. Like an import, the complete transaction table is replaced
+        restored_id = self.database.restore_old_database(snapshot_id=snapshot_id, timestamp=timestamp)
+        if restored_id is not None:
+            self.reset_dataframe()
+
+        return restored_id
+
+    def reset_dataframe(self):
+        # Drops the transaction table and the edits logged for it, after the database has been replaced as a whole
+        self.df = None
+        self.database.change_log.clear()
+
+    def get_earliest_date(self):
+        # Earliest transaction date of the table (necessary for calculating balances)
+        df = self.get_dataframe()
+        if len(df) == 0:
+            return None
+
+        return df['Date'].min().date()
+
+    def filter_dataframe(self, filter_dict, df=None):
+        # Filters the transaction table (or another dataframe) with the database object of the session
+        if df is None:
+            df = self.get_dataframe()
+
+        return self.database.filter_data_from_dataframe(filter_dict, df=df)
+
+    def iter_transactions(self, currencies=None, start_date=None, end_date=None):
+        # Yields the transactions of some currencies and a date range as records. Once the transaction table of the
+        # session is loaded they are taken from it, before that only the date range is read from the database
+        if self.df is None:
+            yield from self.database.iter_transactions(currencies=currencies, start_date=start_date,
+                                                       end_date=end_date)
+            return
+
+        if isinstance(currencies, str):
+            currencies = [currencies]
+
+        filter_dict = {key: value for key, value in [("Start Date", start_date), ("End Date", end_date)]
+                       if value is not None}
+        positions = filter_plan.get_filter_positions(self.df, filter_dict)
+        df = self.df if positions is None else self.df.iloc[positions]
+        if currencies is not None:
+            df = df[df['Currency'].isin(currencies).to_numpy()]
+
+        yield from df.to_dict(orient='records')
+
+    def aggregate_filtered(self, filter_dict, column, how="sum", df=None):
+        # Aggregates a column over the filtered transaction table (or another dataframe), without building the
+        # filtered dataframe
+        if df is None:
+            df = self.get_dataframe()
+
+        return self.database.aggregate_filtered(filter_dict, column, how=how, df=df)
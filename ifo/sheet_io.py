@@ -0,0 +1,222 @@
+import os
+from os.path import join
+import pathlib
+import json
+import numpy as np
+
+import tracing
+import sinks
+
+
+LAYOUT_PATH = join(pathlib.Path(__file__).parent.absolute(), "data", "range_layout.json")
+
+# Excel calculation mode constants (XlCalculation enumeration)
+XL_CALCULATION_MANUAL = -4135
+
+
+@tracing.traced(category="sheet")
+def open_workbook(wb_path):
+    # Opens the workbook with xlwings. xlwings is only imported here, so all computations can run without Excel
+    import xlwings as xw
+
+    return xw.Book(wb_path)
+
+
+def to_sheet_value(value):
+    # Converts numpy values into plain python values that can be sent to the sheet
+    if isinstance(value, np.generic):
+        return value.item()
+
+    return value
+
+
+class RangeLayout:
+
+    def __init__(self, ws, sheet_name, layout_path=None):
+        # Position (row, column, amount of rows and columns) of each named range of a sheet.
+        # Resolving a named range costs several COM calls, so the positions are stored in a json file and reused.
+        # The stored positions are only trusted while the named ranges of the workbook refer to the same cells
+        self.ws = ws
+        self.sheet_name = sheet_name
+        self.layout_path = LAYOUT_PATH if layout_path is None else layout_path
+
+        self.layout_dict = None
+        self.is_validated = False
+
+    def get_name_count(self):
+        # Amount of names of the workbook, read with a single COM call. Adding or removing a named range changes it
+        return self.ws.Parent.Names.Count
+
+    def get_range_position(self, named_range):
+        # Resolves the position of a named range in the sheet, which costs several COM calls
+        cell_range = self.ws.Range(named_range)
+
+        return [cell_range.Row, cell_range.Column, cell_range.Rows.Count, cell_range.Columns.Count]
+
+    def is_valid_entry(self, sheet_entry, name_count):
+        # Checks the stored positions of the sheet with a cheap signature instead of every name of the workbook: the
+        # amount of names, and the positions of the stored named ranges that end furthest down and furthest to the
+        # right. Inserting or deleting rows or columns in front of any stored named range moves at least one of those
+        if not isinstance(sheet_entry, dict) or sheet_entry.get('name_count') != name_count:
+            return False
+
+        ranges = sheet_entry.get('ranges', dict())
+        if not ranges:
+            return True
+
+        sample_ranges = {max(ranges, key=lambda named_range: ranges[named_range][0] + ranges[named_range][2]),
+                         max(ranges, key=lambda named_range: ranges[named_range][1] + ranges[named_range][3])}
+
+        return all(self.get_range_position(named_range) == list(ranges[named_range]) for named_range in sample_ranges)
+
+    def load_layout(self):
+        # Loads the stored positions of all sheets. The positions of the sheet are validated once and dropped if the
+        # named ranges of the workbook changed since they were stored
+        if self.layout_dict is None:
+            if os.path.exists(self.layout_path):
+                with open(self.layout_path, 'r', encoding='utf8') as file:
+                    self.layout_dict = json.load(file)
+            else:
+                self.layout_dict = dict()
+
+        if not self.is_validated:
+            name_count = self.get_name_count()
+            if not self.is_valid_entry(self.layout_dict.get(self.sheet_name), name_count):
+                self.layout_dict[self.sheet_name] = {'name_count': name_count, 'ranges': dict()}
+            self.is_validated = True
+
+        return self.layout_dict[self.sheet_name]['ranges']
+
+    def save_layout(self):
+        # Saves the positions, writing a temporary file first so the layout file is never half written
+        tmp_path = self.layout_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf8') as file:
+            json.dump(self.layout_dict, file, indent=4, sort_keys=True)
+        os.replace(tmp_path, self.layout_path)
+
+    @tracing.traced(category="sheet")
+    def resolve(self, named_ranges):
+        # Resolves the positions of named ranges that are not in the layout yet
+        sheet_layout = self.load_layout()
+        missing_ranges = [named_range for named_range in named_ranges if named_range not in sheet_layout]
+        if not missing_ranges:
+            return
+
+        for named_range in missing_ranges:
+            sheet_layout[named_range] = self.get_range_position(named_range)
+
+        self.save_layout()
+
+    def get_position(self, named_range):
+        # Gets the position of a named range as (row, column, amount of rows, amount of columns)
+        sheet_layout = self.load_layout()
+        if named_range not in sheet_layout:
+            self.resolve([named_range])
+
+        return tuple(sheet_layout[named_range])
+
+    def clear(self):
+        # Removes the stored positions of the sheet. They are validated again on the next use
+        self.load_layout()
+        self.layout_dict[self.sheet_name] = dict()
+        self.is_validated = False
+        self.save_layout()
+
+
+@tracing.traced(category="sheet")
+def read_named_ranges(ws, layout, named_ranges):
+    # Reads the values of several named ranges of a sheet with a single COM call, by reading the block of cells that
+    # spans all of them. Single cells are returned as a value, larger ranges as a 2D tuple (as the sheet returns them)
+    layout.resolve(named_ranges)
+    position_dict = {named_range: layout.get_position(named_range) for named_range in named_ranges}
+
+    first_row = min(row for row, column, row_count, column_count in position_dict.values())
+    first_column = min(column for row, column, row_count, column_count in position_dict.values())
+    last_row = max(row + row_count - 1 for row, column, row_count, column_count in position_dict.values())
+    last_column = max(column + column_count - 1 for row, column, row_count, column_count in position_dict.values())
+
+    values = ws.Range(ws.Cells(first_row, first_column), ws.Cells(last_row, last_column)).Value
+    if first_row == last_row and first_column == last_column:
+        values = ((values,),)
+
+    value_dict = dict()
+    for named_range, (row, column, row_count, column_count) in position_dict.items():
+        block = tuple(tuple(row_values[column - first_column:column - first_column + column_count])
+                      for row_values in values[row - first_row:row - first_row + row_count])
+        if row_count == 1 and column_count == 1:
+            value_dict[named_range] = block[0][0]
+        else:
+            value_dict[named_range] = block
+
+    return value_dict
+
+
+class RangeWritePlan(sinks.Sink):
+
+    def __init__(self, ws, layout):
+        # Collects all writes to named ranges of a sheet, so they can be sent in as few COM calls as possible.
+        # This is the xlwings sink of the computed values
+        super().__init__()
+        self.ws = ws
+        self.layout = layout
+
+    def get_write_blocks(self):
+        # Groups the pending writes into rectangular blocks of contiguous cells.
+        # Returns a list of (row, column, 2D tuple of values)
+        self.layout.resolve(list(self.pending_dict.keys()))
+
+        # Single cells are grouped, named ranges of multiple cells are written as their own block
+        cell_dict = dict()
+        blocks = list()
+        for named_range, value in self.pending_dict.items():
+            row, column, row_count, column_count = self.layout.get_position(named_range)
+            if row_count == 1 and column_count == 1:
+                cell_dict[(row, column)] = to_sheet_value(value)
+            else:
+                blocks.append((row, column, value))
+
+        # First group the cells per column into runs of consecutive rows
+        runs = list()
+        for row, column in sorted(cell_dict.keys(), key=lambda position: (position[1], position[0])):
+            last_run = runs[-1] if runs else None
+            if last_run is not None and last_run['column'] == column \
+                    and last_run['row'] + len(last_run['values']) == row:
+                last_run['values'].append(cell_dict[(row, column)])
+            else:
+                runs.append({'row': row, 'column': column, 'values': [cell_dict[(row, column)]]})
+
+        # Then merge runs of neighbouring columns that span the same rows into rectangles
+        rectangles = list()
+        for run in sorted(runs, key=lambda item: (item['row'], len(item['values']), item['column'])):
+            last_rectangle = rectangles[-1] if rectangles else None
+            if last_rectangle is not None and last_rectangle['row'] == run['row'] \
+                    and len(last_rectangle['columns'][0]) == len(run['values']) \
+                    and last_rectangle['column'] + len(last_rectangle['columns']) == run['column']:
+                last_rectangle['columns'].append(run['values'])
+            else:
+                rectangles.append({'row': run['row'], 'column': run['column'], 'columns': [run['values']]})
+
+        for rectangle in rectangles:
+            values = tuple(zip(*rectangle['columns']))
+            blocks.append((rectangle['row'], rectangle['column'], values))
+
+        return blocks
+
+    @tracing.traced(category="sheet")
+    def write_values(self, value_dict):
+        # Writes all pending values to the sheet, with screen updating and calculation suspended during the writes
+        blocks = self.get_write_blocks()
+
+        app = self.ws.Application
+        screen_updating = app.ScreenUpdating
+        calculation = app.Calculation
+        app.ScreenUpdating = False
+        app.Calculation = XL_CALCULATION_MANUAL
+        try:
+            for row, column, values in blocks:
+                last_row = row + len(values) - 1
+                last_column = column + len(values[0]) - 1
+                self.ws.Range(self.ws.Cells(row, column), self.ws.Cells(last_row, last_column)).Value = values
+        finally:
+            app.Calculation = calculation
+            app.ScreenUpdating = screen_updating
@@ -0,0 +1,147 @@
+import os
+import csv
+import json
+import math
+from datetime import date
+import numpy as np
+
+
+# Output formats that can be written by the file sinks and the command line
+OUTPUT_FORMATS = ["table", "json", "csv"]
+
+
+def to_output_value(value):
+    # Converts numpy, date and missing values into plain python values that can be written to any output
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+
+    return value
+
+
+def dump_values(value_dict, file, output_format):
+    # Writes a dictionary of named range values to an open text file in one of the output formats
+    if output_format == "json":
+        json.dump({named_range: to_output_value(value) for named_range, value in value_dict.items()}, file, indent=4,
+                  ensure_ascii=False)
+        file.write('\n')
+    elif output_format == "csv":
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(["Named Range", "Value"])
+        for named_range, value in value_dict.items():
+            value = to_output_value(value)
+            writer.writerow([named_range, "" if value is None else value])
+    elif output_format == "table":
+        width = max([len(named_range) for named_range in value_dict.keys()], default=0) + 2
+        for named_range, value in value_dict.items():
+            value = to_output_value(value)
+            file.write(f"{named_range:<{width}}{'' if value is None else value}\n")
+    else:
+        raise ValueError(f"Unknown output format: {output_format}")
+
+
+class Sink:
+
+    def __init__(self):
+        # Destination of the computed values of named ranges. Values are collected with add/write and sent to the
+        # destination on flush. The xlwings sink is the RangeWritePlan of the sheet_io module
+        self.pending_dict = dict()
+
+        # All values that have been flushed to the destination
+        self.written_dict = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush()
+
+    def add(self, named_range, value):
+        # Adds the value of a named range. A later value of the same named range replaces the earlier one
+        self.pending_dict[named_range] = value
+
+    def write(self, value_dict):
+        # Adds the values of several named ranges at once
+        for named_range, value in value_dict.items():
+            self.add(named_range, value)
+
+    def has_pending(self, named_range):
+        return named_range in self.pending_dict
+
+    def get_pending(self, named_range):
+        return self.pending_dict[named_range]
+
+    def has_value(self, named_range):
+        # Checks if a value of the named range is known by the sink, whether it has been flushed or not
+        return named_range in self.pending_dict or named_range in self.written_dict
+
+    def get_value(self, named_range):
+        if named_range in self.pending_dict:
+            return self.pending_dict[named_range]
+
+        return self.written_dict[named_range]
+
+    def get_values(self):
+        # Gets all values known by the sink
+        value_dict = dict(self.written_dict)
+        value_dict.update(self.pending_dict)
+
+        return value_dict
+
+    def write_values(self, value_dict):
+        # Sends the pending values to the destination of the sink
+        raise NotImplementedError
+
+    def flush(self):
+        # Sends all pending values to the destination
+        if not self.pending_dict:
+            return
+
+        self.write_values(self.pending_dict)
+        self.written_dict.update(self.pending_dict)
+        self.pending_dict.clear()
+
+
+class MemorySink(Sink):
+
+    def write_values(self, value_dict):
+        # The values are only kept in memory, in the written values of the sink
+        pass
+
+
+class FileSink(Sink):
+
+    def __init__(self, path, output_format):
+        # Writes all values to a file in one of the output formats. The file is rewritten completely on every flush
+        super().__init__()
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}")
+
+        self.path = path
+        self.output_format = output_format
+
+    def write_values(self, value_dict):
+        value_dict = dict(self.written_dict)
+        value_dict.update(self.pending_dict)
+
+        # A temporary file is written first, so the output file is never half written
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf8', newline='') as file:
+            dump_values(value_dict, file, self.output_format)
+        os.replace(tmp_path, self.path)
+
+
+class JsonSink(FileSink):
+
+    def __init__(self, path):
+        super().__init__(path, "json")
+
+
+class CsvSink(FileSink):
+
+    def __init__(self, path):
+        super().__init__(path, "csv")
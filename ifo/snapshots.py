@@ -0,0 +1,236 @@
+import os
+from os.path import join
+import json
+import zlib
+import bisect
+import hashlib
+from datetime import datetime
+
+
+# Format of the manifest file
+MANIFEST_FORMAT = 1
+MANIFEST_FILE_NAME = 'manifest.json'
+CHUNK_DIR_NAME = 'chunks'
+
+# Files are split into chunks of a fixed size. The store keeps its rows sorted by date and new transactions mostly
+# have recent dates, so the chunks at the start of the column files rarely change between snapshots and are stored once
+CHUNK_SIZE = 1 << 18
+COMPRESSION_LEVEL = 6
+
+# Snapshots kept by the retention policy: the most recent ones, plus the newest snapshot of each of the most recent
+# days and months
+RETENTION_POLICY = {'last': 10, 'daily': 30, 'monthly': 24}
+
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def get_chunk_hash(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def to_datetime(value):
+    # Converts a timestamp (str, date or datetime) into a datetime. A date without a time stands for the end of that day
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value) if len(value) > 10 else datetime.fromisoformat(value).date()
+    if not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day, 23, 59, 59, 999999)
+
+    return value
+
+
+class SnapshotStore:
+
+    def __init__(self, snapshot_dir, chunk_size=CHUNK_SIZE, retention_policy=None):
+        # Keeps snapshots of a set of files in a directory. The contents are split into compressed chunks that are
+        # stored once under their hash, so unchanged parts of the files cost no extra disk space. Every snapshot is a
+        # tree object listing the chunks of its files, and the manifest indexes the snapshots by ID and creation time
+        self.snapshot_dir = snapshot_dir
+        self.chunk_dir = join(snapshot_dir, CHUNK_DIR_NAME)
+        self.manifest_path = join(snapshot_dir, MANIFEST_FILE_NAME)
+        self.chunk_size = chunk_size
+        self.retention_policy = RETENTION_POLICY if retention_policy is None else retention_policy
+
+        # Manifest with the snapshots sorted by creation time, loaded on demand
+        self.manifest = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def load_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf8') as file:
+                self.manifest = json.load(file)
+        else:
+            self.manifest = {'format': MANIFEST_FORMAT, 'snapshots': list()}
+
+        return self.manifest
+
+    def save_manifest(self):
+        # The manifest is replaced at once, so it always describes complete snapshots
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf8') as file:
+            json.dump(self.manifest, file, indent=4)
+        os.replace(tmp_path, self.manifest_path)
+
+    def get_snapshots(self):
+        if self.manifest is None:
+            self.load_manifest()
+
+        return self.manifest['snapshots']
+
+    def get_chunk_path(self, chunk_hash):
+        return join(self.chunk_dir, chunk_hash[:2], chunk_hash)
+
+    def put_chunk(self, data):
+        # Stores a chunk under the hash of its contents, unless it is stored already. Returns the hash
+        chunk_hash = get_chunk_hash(data)
+        chunk_path = self.get_chunk_path(chunk_hash)
+        if not os.path.exists(chunk_path):
+            os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+            tmp_path = chunk_path + '.tmp'
+            with open(tmp_path, 'wb') as file:
+                file.write(zlib.compress(data, COMPRESSION_LEVEL))
+            os.replace(tmp_path, chunk_path)
+
+        return chunk_hash
+
+    def get_chunk(self, chunk_hash):
+        with open(self.get_chunk_path(chunk_hash), 'rb') as file:
+            data = zlib.decompress(file.read())
+
+        if get_chunk_hash(data) != chunk_hash:
+            raise ValueError(f"Chunk {chunk_hash} of the snapshots is corrupted")
+
+        return data
+
+    def put_file(self, file_path):
+        # Stores the contents of a file as chunks. Returns the hashes of the chunks in order
+        chunk_hashes = list()
+        with open(file_path, 'rb') as file:
+            while True:
+                data = file.read(self.chunk_size)
+                if not data:
+                    break
+                chunk_hashes.append(self.put_chunk(data))
+
+        return chunk_hashes
+
+    def get_tree(self, snapshot):
+        # Gets the chunk hashes of every file of a snapshot
+        return json.loads(self.get_chunk(snapshot['tree']).decode('utf8'))
+
+    @staticmethod
+    def get_new_snapshot_id(created, snapshot_ids):
+        # IDs are based on the creation time, so several snapshots a day (or even a second) get their own ID
+        snapshot_id = created.strftime('%Y%m%d-%H%M%S-%f')
+        suffix = 1
+        while snapshot_id in snapshot_ids:
+            snapshot_id = created.strftime('%Y%m%d-%H%M%S-%f') + f"-{suffix}"
+            suffix += 1
+
+        return snapshot_id
+
+    def create(self, file_dict, version=None, label=None, created=None):
+        # Takes a snapshot of the files of a dictionary (name in the snapshot: path). Files that don't exist are left
+        # out. If the version equals the version of the latest snapshot, nothing changed and that snapshot is returned
+        snapshots = self.get_snapshots()
+        if version is not None and snapshots and snapshots[-1]['version'] == version:
+            return snapshots[-1]
+
+        if created is None:
+            created = datetime.now()
+
+        tree = {name: self.put_file(file_path) for name, file_path in file_dict.items() if os.path.exists(file_path)}
+        tree_hash = self.put_chunk(json.dumps(tree, sort_keys=True).encode('utf8'))
+
+        snapshot = {'id': self.get_new_snapshot_id(created, {snapshot['id'] for snapshot in snapshots}),
+                    'created': created.strftime(TIMESTAMP_FORMAT),
+                    'version': version,
+                    'label': label,
+                    'tree': tree_hash,
+                    'size': sum(os.path.getsize(file_dict[name]) for name in tree)}
+
+        # The snapshots stay sorted by creation time, so a timestamp is found with a binary search
+        position = bisect.bisect_right([snapshot['created'] for snapshot in snapshots], snapshot['created'])
+        snapshots.insert(position, snapshot)
+        self.save_manifest()
+
+        return snapshot
+
+    def find(self, snapshot_id=None, timestamp=None):
+        # Finds a snapshot by its ID, or the latest snapshot taken at or before a timestamp. Without either, the latest
+        # snapshot is returned. Returns None if there is no such snapshot
+        snapshots = self.get_snapshots()
+
+        if snapshot_id is not None:
+            for snapshot in snapshots:
+                if snapshot['id'] == snapshot_id:
+                    return snapshot
+            return None
+
+        if timestamp is None:
+            return snapshots[-1] if snapshots else None
+
+        timestamp_str = to_datetime(timestamp).strftime(TIMESTAMP_FORMAT)
+        position = bisect.bisect_right([snapshot['created'] for snapshot in snapshots], timestamp_str)
+
+        return snapshots[position - 1] if position > 0 else None
+
+    def restore_file(self, chunk_hashes, file_path):
+        # Writes the chunks of a file to a path, replacing the file at once
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            for chunk_hash in chunk_hashes:
+                file.write(self.get_chunk(chunk_hash))
+        os.replace(tmp_path, file_path)
+
+    def get_kept_snapshot_ids(self, snapshots):
+        # Applies the retention policy to snapshots sorted by creation time
+        kept_ids = {snapshot['id'] for snapshot in snapshots[-self.retention_policy.get('last', 0):]
+                    if self.retention_policy.get('last', 0) > 0}
+
+        for period, key_length in [('daily', 10), ('monthly', 7)]:
+            period_count = self.retention_policy.get(period, 0)
+            period_dict = dict()
+            for snapshot in snapshots:
+                period_dict[snapshot['created'][:key_length]] = snapshot['id']
+            for period_key in sorted(period_dict.keys())[-period_count:] if period_count > 0 else []:
+                kept_ids.add(period_dict[period_key])
+
+        return kept_ids
+
+    def prune(self):
+        # Removes the snapshots the retention policy doesn't keep, and the chunks only they referred to.
+        # Returns the IDs of the removed snapshots
+        snapshots = self.get_snapshots()
+        kept_ids = self.get_kept_snapshot_ids(snapshots)
+
+        kept_snapshots = [snapshot for snapshot in snapshots if snapshot['id'] in kept_ids]
+        removed_snapshots = [snapshot for snapshot in snapshots if snapshot['id'] not in kept_ids]
+        if not removed_snapshots:
+            return list()
+
+        def get_chunk_hashes(snapshot_list):
+            chunk_hashes = set()
+            for snapshot in snapshot_list:
+                chunk_hashes.add(snapshot['tree'])
+                for file_chunk_hashes in self.get_tree(snapshot).values():
+                    chunk_hashes.update(file_chunk_hashes)
+            return chunk_hashes
+
+        unused_chunk_hashes = get_chunk_hashes(removed_snapshots) - get_chunk_hashes(kept_snapshots)
+
+        # The manifest is saved first, so a failure while removing chunks never leaves a snapshot without its chunks
+        self.manifest['snapshots'] = kept_snapshots
+        self.save_manifest()
+
+        for chunk_hash in unused_chunk_hashes:
+            chunk_path = self.get_chunk_path(chunk_hash)
+            if os.path.exists(chunk_path):
+                os.remove(chunk_path)
+
+        return [snapshot['id'] for snapshot in removed_snapshots]
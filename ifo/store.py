@@ -0,0 +1,367 @@
+import os
+from os.path import join
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+import tracing
+import schema
+import json_reader
+
+
+# On-disk encoding of every column of the transaction table.
+# Text columns are dictionary encoded: the distinct values are kept in the meta file and the rows only hold codes
+STORE_COLUMNS = {
+    "ID": "int64",
+    "Status": "dictionary",
+    "Date": "date",
+    "Type": "dictionary",
+    "Category": "dictionary",
+    "Currency": "dictionary",
+    "Input Value": "float64",
+    "Output Value": "float64",
+    "Input Account": "dictionary",
+    "Output Account": "dictionary",
+    "Description": "dictionary",
+}
+
+# Numpy dtype of the binary file that holds each encoding
+ENCODING_DTYPES = {
+    "int64": np.dtype('<i8'),
+    "float64": np.dtype('<f8'),
+    "date": np.dtype('<M8[D]'),
+    "dictionary": np.dtype('<i4'),
+}
+
+META_FILE_NAME = 'meta.json'
+
+
+def column_file_name(column):
+    # Converts a column name into the name of the binary file holding its data
+    return column.lower().replace(' ', '_') + '.bin'
+
+
+def to_date64(value):
+    # Converts a date-like value (str, date, datetime or Timestamp) into a numpy day precision datetime
+    if value is None:
+        return None
+
+    return np.datetime64(pd.Timestamp(value).date(), 'D')
+
+
+class ColumnStore:
+
+    def __init__(self, store_dir):
+        # Directory holding one binary file per column plus the meta file
+        self.store_dir = store_dir
+        self.meta_path = join(self.store_dir, META_FILE_NAME)
+
+        # Meta data of the store, loaded on demand
+        self.meta = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def exists(self):
+        # Checks if the store has already been written to disk
+        return os.path.exists(self.meta_path)
+
+    def load_meta(self):
+        # Loads the meta file describing the columns, the amount of rows and the dictionaries of the store
+        with open(self.meta_path, 'r', encoding='utf8') as file:
+            self.meta = json.load(file)
+
+        return self.meta
+
+    def get_row_count(self):
+        if self.meta is None:
+            self.load_meta()
+
+        return self.meta['rows']
+
+    def get_version(self):
+        # Content hash of the store, which changes every time different data is saved
+        if self.meta is None:
+            self.load_meta()
+
+        return self.meta['version']
+
+    def read_column_array(self, column):
+        # Memory maps the raw binary array of a column, so only the rows that are accessed are read from disk
+        encoding = self.meta['columns'][column]['encoding']
+        dtype = ENCODING_DTYPES[encoding]
+        rows = self.meta['rows']
+
+        if rows == 0:
+            return np.empty(0, dtype=dtype)
+
+        return np.memmap(join(self.store_dir, column_file_name(column)), dtype=dtype, mode='r', shape=(rows,))
+
+    def decode_column(self, column, array):
+        # Converts the stored array of a column back into the values used by the dataframe
+        column_meta = self.meta['columns'][column]
+        encoding = column_meta['encoding']
+
+        if encoding == "dictionary":
+            # Categorical columns of the schema can use the stored codes and dictionary directly
+            if schema.TRANSACTION_SCHEMA.get(column) == "category":
+                return pd.Categorical.from_codes(np.asarray(array), categories=column_meta['dictionary'])
+
+            dictionary = np.array(column_meta['dictionary'], dtype=object)
+            return dictionary[array] if len(dictionary) else np.empty(len(array), dtype=object)
+        elif encoding == "date":
+            return array.astype('datetime64[ns]')
+        else:
+            return np.array(array)
+
+    def get_row_selection(self, start_date=None, end_date=None):
+        # Applies the date predicates directly on the stored Date column and returns the positions of the matching
+        # rows. None means that all rows are selected
+        if start_date is None and end_date is None:
+            return None
+
+        dates = self.read_column_array("Date")
+
+        # Rows are stored sorted by date, so the range is found with a binary search
+        if self.meta.get('sorted_by') == "Date":
+            start = 0 if start_date is None else np.searchsorted(dates, to_date64(start_date), side='left')
+            stop = len(dates) if end_date is None else np.searchsorted(dates, to_date64(end_date), side='right')
+            return np.arange(start, max(start, stop))
+
+        mask = np.ones(len(dates), dtype=bool)
+        if start_date is not None:
+            mask &= dates >= to_date64(start_date)
+        if end_date is not None:
+            mask &= dates <= to_date64(end_date)
+
+        return np.flatnonzero(mask)
+
+    @tracing.traced(category="store")
+    def load(self, columns=None, start_date=None, end_date=None):
+        # Loads the transaction table from the store. Only the selected columns are read (column projection) and only
+        # the rows between the start and end date are materialized (predicate pushdown)
+        self.load_meta()
+
+        # If no columns are given, all stored columns are loaded
+        if columns is None:
+            columns = list(self.meta['columns'].keys())
+
+        rows = self.get_row_selection(start_date, end_date)
+
+        data = dict()
+        for column in columns:
+            array = self.read_column_array(column)
+            if rows is not None:
+                array = array[rows]
+            data[column] = self.decode_column(column, array)
+
+        if rows is None:
+            index = pd.RangeIndex(self.meta['rows'])
+        else:
+            index = pd.Index(rows)
+
+        return pd.DataFrame(data, index=index, columns=columns)
+
+    def encode_column(self, column, series):
+        # Converts a dataframe column into the array that is written to disk, plus the meta data of that column
+        encoding = STORE_COLUMNS.get(column, "dictionary")
+        column_meta = {'encoding': encoding}
+
+        if encoding == "dictionary":
+            values = series.fillna("").astype(str)
+            codes, dictionary = pd.factorize(values)
+            array = codes.astype(ENCODING_DTYPES[encoding])
+            column_meta['dictionary'] = [str(value) for value in dictionary]
+        elif encoding == "date":
+            array = pd.to_datetime(series).values.astype(ENCODING_DTYPES[encoding])
+        else:
+            # Blank cells (e.g. from an excel import) are stored as zero
+            array = pd.to_numeric(series, errors='coerce').fillna(0).to_numpy(dtype=ENCODING_DTYPES[encoding])
+
+        return array, column_meta
+
+    def create_tmp_dir(self):
+        # Creates the empty temporary directory in which a new store is built
+        tmp_dir = self.store_dir + '.tmp'
+        old_dir = self.store_dir + '.old'
+        for directory in [tmp_dir, old_dir]:
+            if os.path.exists(directory):
+                shutil.rmtree(directory)
+        os.makedirs(tmp_dir)
+
+        return tmp_dir
+
+    def swap_in(self, tmp_dir, meta):
+        # Writes the meta file of the store built in the temporary directory and swaps it with the old store
+        old_dir = self.store_dir + '.old'
+
+        with open(join(tmp_dir, META_FILE_NAME), 'w', encoding='utf8') as file:
+            json.dump(meta, file, ensure_ascii=False)
+
+        if os.path.exists(self.store_dir):
+            os.rename(self.store_dir, old_dir)
+        os.rename(tmp_dir, self.store_dir)
+        if os.path.exists(old_dir):
+            shutil.rmtree(old_dir)
+
+        self.meta = meta
+
+    @tracing.traced(category="store")
+    def save(self, df):
+        # Writes the dataframe into the store. The new store is built in a temporary directory and swapped in at the
+        # end, so a failure halfway never leaves a half written store behind
+        tmp_dir = self.create_tmp_dir()
+
+        encoded_dict = {column: self.encode_column(column, df[column]) for column in df.columns}
+
+        # The rows are stored sorted by date (keeping the order of rows of the same date), so date ranges are
+        # contiguous row ranges
+        meta = {'rows': len(df), 'columns': dict()}
+        if "Date" in encoded_dict:
+            order = np.argsort(encoded_dict["Date"][0], kind='stable')
+            encoded_dict = {column: (array[order], column_meta)
+                            for column, (array, column_meta) in encoded_dict.items()}
+            meta['sorted_by'] = "Date"
+
+        version_hash = hashlib.sha1()
+        for column, (array, column_meta) in encoded_dict.items():
+
+            with open(join(tmp_dir, column_file_name(column)), 'wb') as file:
+                array.tofile(file)
+
+            update_version_hash(version_hash, column, array, column_meta)
+            meta['columns'][column] = column_meta
+
+        meta['version'] = version_hash.hexdigest()
+
+        # Swap the new store with the old one
+        self.swap_in(tmp_dir, meta)
+
+    @tracing.traced(category="store")
+    def save_chunks(self, chunks, columns=None):
+        # Writes the dataframes of an iterable into the store, one chunk at a time, so the complete table is never held
+        # in memory. Returns the amount of rows written
+        with StoreWriter(self, columns=columns) as writer:
+            for chunk in chunks:
+                writer.write_chunk(chunk)
+
+        return writer.row_count
+
+
+class StoreWriter:
+
+    def __init__(self, column_store, columns=None):
+        # Builds a new store from chunks of rows. Every chunk is encoded and appended to the column files right away.
+        # The dictionaries of the text columns grow with every chunk, in order of first occurrence like in a single save
+        self.column_store = column_store
+        self.columns = list(STORE_COLUMNS.keys()) if columns is None else list(columns)
+
+        self.tmp_dir = column_store.create_tmp_dir()
+        self.file_dict = {column: open(join(self.tmp_dir, column_file_name(column)), 'wb') for column in self.columns}
+        self.dictionaries = {column: dict() for column in self.columns
+                             if STORE_COLUMNS.get(column, "dictionary") == "dictionary"}
+
+        # Rows only have to be sorted at the end if the dates of the chunks are out of order
+        self.row_count = 0
+        self.last_date = None
+        self.is_sorted = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # The store is only swapped in if all chunks have been written
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def encode_chunk(self, column, series):
+        # Encodes a column of a chunk, with the codes of the dictionary shared by all chunks for text columns
+        if column not in self.dictionaries:
+            return self.column_store.encode_column(column, series)[0]
+
+        dictionary = self.dictionaries[column]
+        codes, values = pd.factorize(series.fillna("").astype(str))
+        value_codes = np.array([dictionary.setdefault(str(value), len(dictionary)) for value in values],
+                               dtype=ENCODING_DTYPES["dictionary"])
+        if len(codes) == 0:
+            return np.empty(0, dtype=ENCODING_DTYPES["dictionary"])
+
+        return value_codes[codes]
+
+    def write_chunk(self, df):
+        for column in self.columns:
+            array = self.encode_chunk(column, df[column])
+            array.tofile(self.file_dict[column])
+
+            if column == "Date" and len(array) > 0:
+                if np.any(array[1:] < array[:-1]) or (self.last_date is not None and array[0] < self.last_date):
+                    self.is_sorted = False
+                self.last_date = array[-1]
+
+        self.row_count += len(df)
+
+    def get_column_meta(self, column):
+        column_meta = {'encoding': STORE_COLUMNS.get(column, "dictionary")}
+        if column in self.dictionaries:
+            column_meta['dictionary'] = list(self.dictionaries[column].keys())
+
+        return column_meta
+
+    def read_column_file(self, column):
+        dtype = ENCODING_DTYPES[STORE_COLUMNS.get(column, "dictionary")]
+        return np.fromfile(join(self.tmp_dir, column_file_name(column)), dtype=dtype)
+
+    def close(self):
+        # Sorts the rows by date if required, one column at a time, computes the version and swaps the store in
+        for file in self.file_dict.values():
+            file.close()
+
+        order = None
+        if "Date" in self.columns and not self.is_sorted:
+            order = np.argsort(self.read_column_file("Date"), kind='stable')
+
+        meta = {'rows': self.row_count, 'columns': dict()}
+        if "Date" in self.columns:
+            meta['sorted_by'] = "Date"
+
+        version_hash = hashlib.sha1()
+        for column in self.columns:
+            array = self.read_column_file(column)
+            if order is not None:
+                array = array[order]
+                array.tofile(join(self.tmp_dir, column_file_name(column)))
+
+            column_meta = self.get_column_meta(column)
+            update_version_hash(version_hash, column, array, column_meta)
+            meta['columns'][column] = column_meta
+
+        meta['version'] = version_hash.hexdigest()
+
+        self.column_store.swap_in(self.tmp_dir, meta)
+
+    def abort(self):
+        # Removes the partially written store, leaving the old store untouched
+        for file in self.file_dict.values():
+            file.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def update_version_hash(version_hash, column, array, column_meta):
+    # Adds a column of the store to its content hash
+    version_hash.update(column.encode('utf8'))
+    version_hash.update(array.tobytes())
+    version_hash.update(json.dumps(column_meta, ensure_ascii=False).encode('utf8'))
+
+
+def migrate_json_to_store(json_path, column_store):
+    # One-shot migration of the legacy database.json file (dict of rows keyed by the row index) into the column store.
+    # The records are streamed into the store in chunks, in the order of the file, which holds them by row index.
+    # Returns the amount of migrated rows
+    return column_store.save_chunks(json_reader.iter_chunks(json_path))
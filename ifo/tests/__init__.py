@@ -1 +1,5 @@
- 
+import os
+import sys
+
+# The modules of the package import each other by module name, as xlwings runs them from the ifo folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
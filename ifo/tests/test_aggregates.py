@@ -0,0 +1,117 @@
+import unittest
+
+import pandas as pd
+
+import indexes
+import aggregates
+import filter_plan
+from benchmarks import generator
+
+
+class AggregateCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        aggregates.clear_aggregate_cache()
+        self.df = indexes.sort_by_date(generator.generate_transactions(3000, seed=1, years=2))
+        aggregates.set_dataframe_version(self.df, "test-version")
+
+    def tearDown(self):
+        aggregates.clear_aggregate_cache()
+
+    def test_same_length_slices_get_their_own_cube(self):
+        first_df = self.df.iloc[:1500]
+        second_df = self.df.iloc[1500:]
+
+        first_cube = aggregates.get_monthly_cube(first_df)
+        second_cube = aggregates.get_monthly_cube(second_df)
+
+        self.assertIsNot(first_cube, second_cube)
+        self.assertEqual(first_cube.last_date, first_df['Date'].max())
+        self.assertEqual(second_cube.first_date, second_df['Date'].min())
+        self.assertEqual(second_cube.table['count'].sum(), len(second_df))
+
+    def test_tables_used_in_turns_keep_their_cube(self):
+        filtered_df = self.df[(self.df['Currency'] == "EUR").to_numpy()]
+
+        full_cube = aggregates.get_monthly_cube(self.df)
+        filtered_cube = aggregates.get_monthly_cube(filtered_df)
+
+        self.assertIs(aggregates.get_monthly_cube(self.df), full_cube)
+        self.assertIs(aggregates.get_monthly_cube(filtered_df), filtered_cube)
+
+    def test_least_recently_used_table_is_evicted(self):
+        slice_count = aggregates.AGGREGATE_CACHE_SIZE + 1
+        slices = [self.df.iloc[start:start + 100] for start in range(0, 100 * slice_count, 100)]
+        first_cube = aggregates.get_monthly_cube(slices[0])
+        for df in slices[1:]:
+            aggregates.get_monthly_cube(df)
+
+        self.assertIsNone(aggregates.find_cached_aggregate(slices[0], aggregates.MonthlyCube))
+        self.assertIsNot(aggregates.get_monthly_cube(slices[0]), first_cube)
+
+    def test_slices_have_no_database_version(self):
+        self.assertEqual(aggregates.get_dataframe_version(self.df), "test-version")
+        self.assertIsNone(aggregates.get_dataframe_version(self.df.iloc[:1500]))
+        self.assertIsNone(aggregates.get_dataframe_version(indexes.sort_by_date(self.df.iloc[::-1])))
+
+    def test_same_length_slices_get_their_own_positions(self):
+        for df in [self.df.iloc[:1500], self.df.iloc[1500:]]:
+            positions = filter_plan.get_filter_positions(df, {"Type": "spending"})
+            self.assertEqual(list(positions), list((df['Type'] == "spending").to_numpy().nonzero()[0]))
+
+
+class AggregateValueTest(unittest.TestCase):
+
+    def setUp(self):
+        aggregates.clear_aggregate_cache()
+        self.df = indexes.sort_by_date(generator.generate_transactions(4000, seed=9, years=2))
+        self.month = self.df['Date'].dt.to_period('M')
+
+    def tearDown(self):
+        aggregates.clear_aggregate_cache()
+
+    def test_monthly_cube_equals_a_groupby(self):
+        cube = aggregates.get_monthly_cube(self.df)
+        expected = self.df.groupby([self.df['Currency'].astype(str), self.df['Type'].astype(str), self.month],
+                                   observed=True)['Output Value'].agg(['sum', 'count', 'max'])
+
+        for (currency, transaction_type, month), row in expected.iterrows():
+            filter_dict = {"Currency": currency, "Type": transaction_type, "Start Date": month.start_time,
+                           "End Date": month.end_time.normalize()}
+            self.assertAlmostEqual(cube.aggregate("sum", "Output Value", filter_dict), row['sum'])
+            self.assertEqual(cube.aggregate("count", "Output Value", filter_dict), row['count'])
+            self.assertEqual(cube.aggregate("max", "Output Value", filter_dict), row['max'])
+
+    def test_monthly_cube_of_a_month_range_equals_a_sum(self):
+        cube = aggregates.get_monthly_cube(self.df)
+        months = sorted(self.month.unique())
+        start_date, end_date = months[3].start_time, months[9].end_time.normalize()
+
+        mask = (self.df['Category'] == "supermarket") & (self.df['Date'] >= start_date) & (self.df['Date'] <= end_date)
+        filter_dict = {"Category": "supermarket", "Start Date": start_date, "End Date": end_date}
+        self.assertAlmostEqual(cube.aggregate("sum", "Output Value", filter_dict),
+                               self.df.loc[mask, 'Output Value'].sum())
+
+    def test_balances_equal_a_sum_of_the_flows(self):
+        balance_index = aggregates.get_balance_index(self.df)
+        start_date = self.df['Date'].iloc[1000]
+        end_date = self.df['Date'].iloc[3000]
+        in_range = (self.df['Date'] >= start_date) & (self.df['Date'] <= end_date)
+
+        for currency in self.df['Currency'].astype(str).unique():
+            currency_mask = (self.df['Currency'] == currency) & in_range
+            for account in self.df.loc[self.df['Currency'] == currency, 'Output Account'].astype(str).unique():
+                expected_balance = self.df.loc[currency_mask & (self.df['Input Account'] == account),
+                                               'Input Value'].sum() \
+                    - self.df.loc[currency_mask & (self.df['Output Account'] == account), 'Output Value'].sum()
+                self.assertAlmostEqual(balance_index.get_balance(currency, end_date, start_date=start_date,
+                                                                 account=account), expected_balance, places=6)
+
+            expected_total = self.df.loc[currency_mask, 'Input Value'].sum() \
+                - self.df.loc[currency_mask, 'Output Value'].sum()
+            self.assertAlmostEqual(balance_index.get_balance(currency, end_date, start_date=start_date),
+                                   expected_total, places=6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import indexes
+import aggregates
+import filter_plan
+from benchmarks import generator
+
+
+def get_naive_mask(df, filter_dict):
+    # Boolean mask of a filter dictionary, evaluated row by row with pandas
+    mask = pd.Series(True, index=df.index)
+    for key, value in filter_dict.items():
+        if key == "Start Date":
+            mask &= df['Date'] >= pd.Timestamp(value)
+        elif key == "End Date":
+            mask &= df['Date'] <= pd.Timestamp(value)
+        elif key in filter_plan.RANGE_FILTERS:
+            column, comparison = filter_plan.RANGE_FILTERS[key]
+            mask &= df[column] >= value if comparison == "min" else df[column] <= value
+        elif key in indexes.ACCOUNT_TYPE_FILTERS:
+            account_types = df[indexes.ACCOUNT_TYPE_FILTERS[key]].astype(str).map(aggregates.get_account_type)
+            mask &= account_types == value
+        elif key == "Description":
+            terms = indexes.get_query_terms(value)
+            normalized = df['Description'].astype(str).map(indexes.normalize_text)
+            mask &= normalized.map(lambda description: all(term in description for term in terms))
+        elif key == "Description Prefix":
+            terms = indexes.get_query_terms(value)
+            words = df['Description'].astype(str).map(indexes.normalize_text).str.split()
+            mask &= words.map(lambda word_list: all(any(word.startswith(term) for word in word_list)
+                                                    for term in terms))
+        else:
+            mask &= df[key].astype(str) == value
+
+    return mask.to_numpy()
+
+
+class FilterPlanTest(unittest.TestCase):
+
+    def setUp(self):
+        aggregates.clear_aggregate_cache()
+        self.df = indexes.sort_by_date(generator.generate_transactions(4000, seed=8, years=2))
+        aggregates.set_dataframe_version(self.df, "test-version")
+        self.start_date = self.df['Date'].iloc[1000]
+        self.end_date = self.df['Date'].iloc[3000]
+
+        self.filter_dicts = [{"Currency": "EUR"},
+                             {"Currency": "EUR", "Type": "spending", "Start Date": self.start_date,
+                              "End Date": self.end_date},
+                             {"Type": "spending", "Category": "supermarket", "Minimum Output Value": 10.0,
+                              "Maximum Output Value": 100.0},
+                             {"Currency": "BRL", "Output Account Type": "checking accounts",
+                              "End Date": self.end_date},
+                             {"Input Account Type": "saving accounts", "Start Date": self.start_date},
+                             {"Description": "super", "Currency": "EUR"},
+                             {"Start Date": self.start_date, "End Date": self.end_date}]
+
+    def tearDown(self):
+        aggregates.clear_aggregate_cache()
+
+    def assert_same_positions(self, df, filter_dict):
+        positions = filter_plan.get_filter_positions(df, filter_dict)
+        if positions is None:
+            positions = np.arange(len(df))
+
+        np.testing.assert_array_equal(positions, np.flatnonzero(get_naive_mask(df, filter_dict)),
+                                      err_msg=str(filter_dict))
+
+    def test_filters_equal_a_naive_mask(self):
+        for filter_dict in self.filter_dicts:
+            self.assert_same_positions(self.df, filter_dict)
+
+    def test_filters_equal_a_naive_mask_on_slices(self):
+        slices = [self.df.iloc[:2000], self.df.iloc[2000:], self.df.iloc[500:2500],
+                  self.df[(self.df['Currency'] == "EUR").to_numpy()]]
+        for df in slices:
+            for filter_dict in self.filter_dicts + [{"Description Prefix": "pada"}]:
+                self.assert_same_positions(df, filter_dict)
+
+    def test_slices_are_filtered_without_indexes(self):
+        df = self.df.iloc[500:2500]
+        for filter_dict in self.filter_dicts:
+            filter_plan.get_filter_positions(self.df, filter_dict)
+            filter_plan.get_filter_positions(df, filter_dict)
+
+        self.assertIsNone(aggregates.find_cached_aggregate(df, indexes.TransactionIndexes))
+        self.assertIsNotNone(aggregates.find_cached_aggregate(self.df, indexes.TransactionIndexes))
+
+    def test_filters_equal_a_naive_mask_on_an_unsorted_table(self):
+        df = self.df.sample(frac=1.0, random_state=1).reset_index(drop=True)
+        aggregates.set_dataframe_version(df, "test-version")
+        for filter_dict in self.filter_dicts:
+            self.assert_same_positions(df, filter_dict)
+
+    def test_aggregates_equal_pandas(self):
+        for filter_dict in self.filter_dicts:
+            values = self.df.loc[get_naive_mask(self.df, filter_dict), "Output Value"]
+            self.assertAlmostEqual(filter_plan.aggregate_filtered(self.df, filter_dict, "sum", "Output Value"),
+                                   values.sum())
+            self.assertEqual(filter_plan.aggregate_filtered(self.df, filter_dict, "count", "Output Value"),
+                             len(values))
+            if len(values) > 0:
+                self.assertEqual(filter_plan.aggregate_filtered(self.df, filter_dict, "max", "Output Value"),
+                                 values.max())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+
+import numpy as np
+
+import indexes
+from benchmarks import generator
+
+
+class InvertedIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.df = indexes.sort_by_date(generator.generate_transactions(3000, seed=4, years=2))
+
+    def assert_equal_indexes(self, inverted_index, expected_index):
+        self.assertEqual(set(inverted_index.position_dict), set(expected_index.position_dict))
+        for value, positions in expected_index.position_dict.items():
+            np.testing.assert_array_equal(inverted_index.get_positions(value), positions)
+
+    def test_extended_index_equals_rebuilt_index(self):
+        for new_row_count in [1, 10, 1000]:
+            first_new_position = len(self.df) - new_row_count
+            previous_index = indexes.InvertedIndex(self.df['Description'].iloc[:first_new_position])
+
+            extended_index = previous_index.extend(self.df['Description'], first_new_position)
+
+            self.assert_equal_indexes(extended_index, indexes.InvertedIndex(self.df['Description']))
+
+    def test_extend_keeps_the_previous_index(self):
+        previous_index = indexes.InvertedIndex(self.df['Category'].iloc[:2000])
+        previous_positions = {value: positions.copy() for value, positions in previous_index.position_dict.items()}
+
+        previous_index.extend(self.df['Category'], 2000)
+
+        self.assertEqual(set(previous_index.position_dict), set(previous_positions))
+        for value, positions in previous_positions.items():
+            np.testing.assert_array_equal(previous_index.get_positions(value), positions)
+
+
+if __name__ == '__main__':
+    unittest.main()
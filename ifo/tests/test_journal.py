@@ -0,0 +1,109 @@
+import hashlib
+import tempfile
+import unittest
+from os.path import join
+
+import pandas as pd
+
+import journal
+import indexes
+from benchmarks import generator
+from benchmarks import runner
+
+
+class TransactionJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.journal = journal.TransactionJournal(join(self.directory.name, 'journal.jsonl'))
+        self.df = indexes.sort_by_date(generator.generate_transactions(500, seed=6, years=1))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_new_transaction(self, transaction_id):
+        return {"ID": transaction_id, "Status": "new", "Date": pd.Timestamp(2021, 3, 1), "Type": "spending",
+                "Category": "supermarket", "Currency": "EUR", "Input Value": 0.0, "Output Value": 9.95,
+                "Input Account": "", "Output Account": "ING", "Description": "Açaí São Paulo"}
+
+    def test_replay_applies_new_updated_and_removed_transactions(self):
+        new_id = int(self.df['ID'].max()) + 1
+        updated_transaction = self.df.iloc[10].to_dict()
+        updated_transaction['Output Value'] = 123.45
+        removed_id = int(self.df['ID'].iloc[20])
+
+        self.journal.append("new", self.get_new_transaction(new_id))
+        self.journal.append("update", updated_transaction)
+        self.journal.append("remove", {'ID': removed_id})
+
+        df = self.journal.replay(self.df)
+
+        self.assertEqual(len(df), len(self.df))
+        self.assertNotIn(removed_id, df['ID'].tolist())
+        self.assertEqual(df.loc[df['ID'] == new_id, 'Description'].item(), "Açaí São Paulo")
+        self.assertEqual(df.loc[df['ID'] == updated_transaction['ID'], 'Output Value'].item(), 123.45)
+
+    def test_replay_keeps_the_table_of_the_caller(self):
+        updated_transaction = self.df.iloc[10].to_dict()
+        updated_transaction['Output Value'] = 123.45
+        self.journal.append("update", updated_transaction)
+        expected_df = self.df.copy()
+
+        self.journal.replay(self.df)
+
+        pd.testing.assert_frame_equal(self.df, expected_df)
+
+    def test_replay_is_idempotent(self):
+        self.journal.append("new", self.get_new_transaction(int(self.df['ID'].max()) + 1))
+        df = self.journal.replay(self.df)
+
+        pd.testing.assert_frame_equal(self.journal.replay(df), df)
+
+    def test_version_and_count_follow_the_file(self):
+        self.assertEqual(self.journal.get_version(), "")
+
+        for transaction_id in range(3):
+            self.journal.append("remove", {'ID': transaction_id})
+
+        with open(self.journal.journal_path, 'rb') as file:
+            self.assertEqual(self.journal.get_version(), hashlib.sha1(file.read()).hexdigest())
+        self.assertEqual(self.journal.get_entry_count(), 3)
+
+        # Records written by another journal object of the same file are picked up
+        journal.TransactionJournal(self.journal.journal_path).append("remove", {'ID': 3})
+        self.assertEqual(self.journal.get_entry_count(), 4)
+
+        self.journal.clear()
+        self.assertEqual(self.journal.get_entry_count(), 0)
+        self.assertEqual(self.journal.get_version(), "")
+
+
+class CompactionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = runner.create_database(self.directory.name)
+        self.db.save_database_store(generator.generate_transactions(500, seed=7, years=1))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_compaction_folds_the_journal_into_the_store(self):
+        self.db.compaction_threshold = 3
+        df = self.db.get_current_database_dataframe()
+        store_version = self.db.store.get_version()
+
+        df = self.db.remove_transaction_from_dataframe([0], df=df)
+        df = self.db.remove_transaction_from_dataframe([0], df=df)
+        self.assertEqual(self.db.journal.get_entry_count(), 2)
+        self.assertEqual(self.db.store.get_version(), store_version)
+
+        df = self.db.remove_transaction_from_dataframe([0], df=df)
+        self.assertEqual(self.db.journal.get_entry_count(), 0)
+        self.assertNotEqual(self.db.store.get_version(), store_version)
+        self.assertEqual(self.db.store.get_row_count(), 497)
+        self.assertEqual(self.db.get_current_database_dataframe()['ID'].tolist(), df['ID'].tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
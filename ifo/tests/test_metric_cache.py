@@ -0,0 +1,116 @@
+import tempfile
+import unittest
+from os.path import join
+
+import pandas as pd
+
+import sinks
+import compute
+import selection
+import aggregates
+import metric_cache
+from benchmarks import generator
+from benchmarks import runner
+
+
+class MetricCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = runner.create_database(self.directory.name)
+        self.db.save_database_store(generator.generate_transactions(2000, seed=10, years=2))
+        self.df = self.db.get_current_database_dataframe()
+        self.version = aggregates.get_dataframe_version(self.df)
+
+        self.year = int(self.df['Date'].max().year) - 1
+        self.today = self.df['Date'].max().date()
+        self.cache = metric_cache.MetricCache(cache_path=join(self.directory.name, 'buffer.json'))
+
+        # The months of the year before the edited year don't depend on the transactions of the edited month
+        self.selections = [compute.get_default_selection(self.df, "EUR", year, month)
+                           for year in [self.year - 1, self.year] for month in range(1, 13)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_metrics(self, df, selection_snapshot):
+        return compute.get_backend_metrics(df, selection_snapshot, template_dict=self.cache.get_template(),
+                                           today=self.today)
+
+    def fill_cache(self):
+        for selection_snapshot in self.selections:
+            self.cache.put(self.version, selection_snapshot, self.get_metrics(self.df, selection_snapshot),
+                           today=self.today)
+
+    def assert_same_values(self, values, expected_values):
+        # The cache holds the values as they are written to the sheet, where missing values are empty
+        self.assertEqual(set(values), set(expected_values))
+        for named_range, value in expected_values.items():
+            value = sinks.to_output_value(value)
+            if isinstance(value, float):
+                self.assertAlmostEqual(values[named_range], value, places=6, msg=named_range)
+            else:
+                self.assertEqual(values[named_range], value, named_range)
+
+    def test_entries_are_only_served_for_their_version(self):
+        self.fill_cache()
+
+        self.assertIsNotNone(self.cache.get(self.version, self.selections[0], today=self.today))
+        self.assertIsNone(self.cache.get("other-version", self.selections[0], today=self.today))
+        self.assertIsNone(self.cache.get(None, self.selections[0], today=self.today))
+        self.assertEqual(self.cache.get_stats()['stale'], 2)
+
+    def test_entries_are_kept_per_chart_end_date(self):
+        self.fill_cache()
+
+        default_selection = self.selections[17]
+        chart_selection = selection.Selection(dict(default_selection.selection_dict), end_year_number=self.year - 1,
+                                              end_month_number=12)
+
+        self.assertIsNone(self.cache.get(self.version, chart_selection, today=self.today))
+
+    def test_saved_entries_are_loaded(self):
+        self.fill_cache()
+        self.cache.save()
+
+        loaded_cache = metric_cache.MetricCache(cache_path=self.cache.cache_path)
+        for selection_snapshot in self.selections:
+            self.assert_same_values(loaded_cache.get(self.version, selection_snapshot, today=self.today),
+                                    self.cache.get(self.version, selection_snapshot, today=self.today))
+
+    def test_edit_rebases_unaffected_entries_and_recomputes_the_others(self):
+        self.fill_cache()
+
+        new_transaction = {"Status": "new", "Date": pd.Timestamp(self.year, 6, 15), "Type": "spending",
+                           "Category": "supermarket", "Currency": "EUR", "Input Value": 0.0, "Output Value": 250.0,
+                           "Input Account": "", "Output Account": "ING", "Description": "Albert Heijn Amsterdam"}
+        new_df = self.db.new_transaction_to_dataframe(new_transaction, df=self.df)
+        previous_version, version, changed_transactions = self.db.change_log[-1]
+
+        result = self.cache.apply_edit(previous_version, version, changed_transactions,
+                                       recompute_function=lambda selection_snapshot, today: self.get_metrics(
+                                           new_df, selection_snapshot))
+
+        self.assertGreater(result['rebased'], 0)
+        self.assertGreater(result['recomputed'], 0)
+        self.assertEqual(result['rebased'] + result['recomputed'], len(self.selections))
+
+        # Rebased and recomputed entries both equal the metrics of the edited table
+        for selection_snapshot in self.selections:
+            self.assert_same_values(self.cache.get(version, selection_snapshot, today=self.today),
+                                    self.get_metrics(new_df, selection_snapshot))
+
+    def test_edit_without_recompute_removes_the_affected_entries(self):
+        self.fill_cache()
+
+        changed_transactions = [("EUR", pd.Timestamp(self.year, 6, 15))]
+        result = self.cache.apply_edit(self.version, "next-version", changed_transactions)
+
+        self.assertGreater(result['invalidated'], 0)
+        self.assertEqual(result['rebased'] + result['invalidated'], len(self.selections))
+        self.assertIsNone(self.cache.get("next-version", self.selections[17], today=self.today))
+        self.assertIsNotNone(self.cache.get("next-version", self.selections[0], today=self.today))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import math
+import tempfile
+import unittest
+from os.path import join
+
+import backend
+import compute
+import indexes
+import session
+import sinks
+import selection
+import metric_cache
+from benchmarks import generator
+from benchmarks import runner
+
+
+def is_close(value, expected_value):
+    if isinstance(value, float) and isinstance(expected_value, float):
+        return math.isclose(value, expected_value, abs_tol=1e-6) or (math.isnan(value) and math.isnan(expected_value))
+
+    return value == expected_value
+
+
+class ChartTimeframeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.df = indexes.sort_by_date(generator.generate_transactions(3000, seed=2, years=3))
+
+        self.session = session.Session()
+        self.session.database = runner.create_database(self.directory.name)
+        self.session.metric_cache = metric_cache.MetricCache(cache_path=join(self.directory.name, 'buffer.json'))
+        self.session.set_dataframe(self.df)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_chart_values(self, selection_snapshot, blocks=None):
+        if blocks is None:
+            blocks = ["spending_per_category_chart", "transaction_per_type_chart", "spending_per_type_chart"]
+
+        sink = sinks.MemorySink()
+        chart_backend = backend.Backend(selection_snapshot=selection_snapshot, sink=sink, current_session=self.session)
+        for block in blocks:
+            getattr(chart_backend, block)(self.df)
+        chart_backend.flush_writes()
+
+        return sink.get_values()
+
+    def assert_metric_values(self, chart_values, selection_snapshot):
+        metric_values = compute.get_backend_metrics(self.df, selection_snapshot)
+
+        self.assertTrue(chart_values)
+        for name, value in chart_values.items():
+            self.assertIn(name, metric_values)
+            self.assertTrue(is_close(value, metric_values[name]), f"{name}: {value!r} != {metric_values[name]!r}")
+
+    def test_charts_follow_the_chart_end_date(self):
+        last_date = self.df['Date'].max()
+        default_selection = compute.get_default_selection(self.df, "EUR", last_date.year, last_date.month)
+
+        # The charts end a year before the selected month, so they can't be derived from the selected year
+        chart_selection = selection.Selection(dict(default_selection.selection_dict),
+                                              end_year_number=last_date.year - 1, end_month_number=6,
+                                              category_list=["supermarket", "health", "clothes"])
+
+        self.assert_metric_values(self.get_chart_values(chart_selection), chart_selection)
+
+    def test_investment_portfolio_ends_at_the_end_of_last_month(self):
+        # The investments until last month end at the last day of the month before the selected month, also when that
+        # month is longer than the month before it
+        for month_start_date in self.df['Date'].dt.to_period('M').unique().to_timestamp():
+            default_selection = compute.get_default_selection(self.df, "EUR", month_start_date.year,
+                                                              month_start_date.month)
+            self.assert_metric_values(self.get_chart_values(default_selection, ["investment_portfolio_chart"]),
+                                      default_selection)
+
+
+if __name__ == '__main__':
+    unittest.main()
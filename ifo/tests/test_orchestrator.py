@@ -0,0 +1,155 @@
+import tempfile
+import unittest
+from os.path import join
+
+import sinks
+import warmer
+import compute
+import session
+import selection
+import orchestrator
+import metric_cache
+from benchmarks import generator
+from benchmarks import runner
+
+
+# Categories of the spending per category chart, as listed in the Backend sheet of the workbook. The buffer template
+# holds the named ranges of these categories
+LISTED_CATEGORIES = ["clothes", "credit card payment", "gadgets", "taxes", "leisure", "supermarket", "food", "others",
+                     "transport", "rent", "mobile", "school supplies", "health", "gym", "investment loss", "vacation"]
+
+
+class OrchestratorCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+        self.session = session.Session()
+        self.session.database = runner.create_database(self.directory.name)
+        self.session.database.save_database_store(generator.generate_transactions(2000, seed=12, years=1))
+        self.session.metric_cache = metric_cache.MetricCache(cache_path=join(self.directory.name, 'buffer.json'))
+
+        df = self.session.get_dataframe()
+        self.last_date = df['Date'].max()
+        self.orchestrator = orchestrator.Orchestrator(current_session=self.session)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read_live_selection(self):
+        # Selection as read_selection_snapshot reads it from the workbook: empty cells are None, numbers are floats
+        # and the Backend inputs come from the formulas of the Backend sheet
+        default_selection = compute.get_default_selection(self.session.get_dataframe(), "EUR", self.last_date.year,
+                                                          self.last_date.month)
+        selection_dict = {named_range: None if value == "" else value
+                          for named_range, value in default_selection.selection_dict.items()}
+        selection_dict["YearValidation"] = float(self.last_date.year)
+        selection_dict = {named_range: selection.clean_selection_value(value)
+                          for named_range, value in selection_dict.items()}
+
+        return selection.Selection(selection_dict, end_year_number=float(self.last_date.year),
+                                   end_month_number=float(self.last_date.month),
+                                   category_list=LISTED_CATEGORIES)
+
+    def test_empty_cells_have_the_fingerprint_of_empty_selections(self):
+        default_selection = compute.get_default_selection(self.session.get_dataframe(), "EUR", self.last_date.year,
+                                                          self.last_date.month)
+        selection_dict = dict(default_selection.selection_dict, SavingAccountValidation2="")
+        sheet_dict = dict(selection_dict, SavingAccountValidation2=None, YearValidation=float(self.last_date.year))
+        sheet_selection = selection.Selection(sheet_dict, end_year_number=float(self.last_date.year),
+                                              end_month_number=float(self.last_date.month))
+
+        self.assertEqual(metric_cache.get_selection_fingerprint(selection.get_sheet_selection(selection_dict)),
+                         metric_cache.get_selection_fingerprint(sheet_selection))
+
+    def test_second_refresh_is_served_from_the_cache(self):
+        live_selection = self.read_live_selection()
+
+        values = self.orchestrator.refresh(selection_snapshot=live_selection, sink=sinks.MemorySink())
+        self.assertEqual(self.session.metric_cache.get_stats()['hits'], 0)
+
+        cached_values = self.orchestrator.refresh(selection_snapshot=live_selection, sink=sinks.MemorySink())
+        self.assertEqual(self.session.metric_cache.get_stats()['hits'], 1)
+        self.assertEqual(set(cached_values), set(values))
+
+    def test_warmed_up_selection_is_served_to_a_refresh(self):
+        buffer_warmer = warmer.BufferWarmer(current_session=self.session, max_workers=1)
+        buffer_warmer.warm(currencies=["EUR"], save=False)
+        live_selection = self.read_live_selection()
+
+        values = self.orchestrator.refresh(selection_snapshot=live_selection, sink=sinks.MemorySink())
+
+        self.assertEqual(self.session.metric_cache.get_stats()['hits'], 1)
+        computed_values = self.orchestrator.compute_blocks(live_selection)
+        for named_range, value in computed_values.items():
+            self.assertIn(named_range, values)
+            if isinstance(value, float):
+                self.assertAlmostEqual(sinks.to_output_value(value), values[named_range], places=6, msg=named_range)
+
+    def test_listed_categories_are_part_of_the_fingerprint(self):
+        live_selection = self.read_live_selection()
+        fewer_categories = selection.Selection(live_selection.selection_dict,
+                                               end_year_number=live_selection.end_year_number,
+                                               end_month_number=live_selection.end_month_number,
+                                               category_list=LISTED_CATEGORIES[:9])
+        reordered_categories = selection.Selection(live_selection.selection_dict,
+                                                   end_year_number=live_selection.end_year_number,
+                                                   end_month_number=live_selection.end_month_number,
+                                                   category_list=LISTED_CATEGORIES[::-1])
+
+        self.assertNotEqual(metric_cache.get_selection_fingerprint(fewer_categories),
+                            metric_cache.get_selection_fingerprint(live_selection))
+        self.assertEqual(metric_cache.get_selection_fingerprint(reordered_categories),
+                         metric_cache.get_selection_fingerprint(live_selection))
+
+
+class CacheProducerTest(unittest.TestCase):
+
+    def setUp(self):
+        # Investments of several months and years, so the investments until this and last month differ per month
+        self.directory = tempfile.TemporaryDirectory()
+        self.transactions = generator.generate_transactions(20000, seed=3, years=4)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_session(self, name):
+        current_session = session.Session()
+        current_session.database = runner.create_database(join(self.directory.name, name))
+        current_session.database.save_database_store(self.transactions)
+        current_session.metric_cache = metric_cache.MetricCache(cache_path=join(self.directory.name,
+                                                                                f'{name}_buffer.json'))
+
+        return current_session
+
+    def test_warmed_values_equal_refreshed_values(self):
+        warmed_session = self.create_session("warmed")
+        buffer_warmer = warmer.BufferWarmer(current_session=warmed_session, max_workers=1)
+        buffer_warmer.warm(currencies=["EUR"], save=False, category_list=LISTED_CATEGORIES)
+
+        refreshed_session = self.create_session("refreshed")
+        refresh_orchestrator = orchestrator.Orchestrator(current_session=refreshed_session)
+
+        df = warmed_session.get_dataframe()
+        version = warmed_session.database.get_database_version()
+        self.assertEqual(refreshed_session.database.get_database_version(), version)
+
+        for warmed_selection in warmer.get_warmup_selections(df, currencies=["EUR"], category_list=LISTED_CATEGORIES):
+            warmed_values = warmed_session.metric_cache.get(version, warmed_selection)
+            self.assertIsNotNone(warmed_values)
+
+            refreshed_values = refresh_orchestrator.refresh(selection_snapshot=warmed_selection,
+                                                            sink=sinks.MemorySink())
+            block_values = refresh_orchestrator.compute_blocks(warmed_selection)
+
+            for named_range, value in warmed_values.items():
+                self.assertEqual(sinks.to_output_value(refreshed_values[named_range]), value,
+                                 msg=f"{warmed_selection.year}-{warmed_selection.month} {named_range}")
+            for named_range, value in block_values.items():
+                if named_range in warmed_values and isinstance(value, float):
+                    self.assertAlmostEqual(sinks.to_output_value(value), warmed_values[named_range], places=6,
+                                           msg=f"{warmed_selection.year}-{warmed_selection.month} {named_range}")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import tempfile
+import unittest
+from os.path import join
+
+import pandas as pd
+
+import compute
+import session
+import metric_cache
+from benchmarks import generator
+from benchmarks import runner
+
+
+class SessionEditTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+        self.session = session.Session()
+        self.session.database = runner.create_database(self.directory.name)
+        self.session.database.save_database_store(generator.generate_transactions(2000, seed=3, years=2))
+        self.session.metric_cache = metric_cache.MetricCache(cache_path=join(self.directory.name, 'buffer.json'))
+
+        df = self.session.get_dataframe()
+        self.last_date = df['Date'].max()
+        self.selection = compute.get_default_selection(df, "EUR", self.last_date.year, self.last_date.month)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_metrics(self):
+        df = self.session.get_dataframe()
+        return self.session.metric_cache.get_or_compute(self.session.database.get_database_version(), self.selection,
+                                                        lambda: compute.get_backend_metrics(df, self.selection))
+
+    def test_new_transaction_brings_the_cache_to_the_new_version(self):
+        self.get_metrics()
+        row_count = len(self.session.get_dataframe())
+
+        new_transaction = {"Status": "new", "Date": self.last_date, "Type": "spending", "Category": "supermarket",
+                           "Currency": "EUR", "Input Value": 0.0, "Output Value": 12.5, "Input Account": "",
+                           "Output Account": "ING", "Description": "Albert Heijn Amsterdam"}
+        result = self.session.new_transaction(new_transaction)
+
+        df = self.session.get_dataframe()
+        self.assertEqual(len(df), row_count + 1)
+        self.assertEqual(result['recomputed'], 1)
+        self.assertEqual(self.session.database.change_log, [])
+
+        version = self.session.database.get_database_version()
+        cached_values = self.session.metric_cache.get(version, self.selection)
+        self.assertIsNotNone(cached_values)
+        expected_values = compute.get_backend_metrics(df, self.selection)
+        self.assertAlmostEqual(cached_values['ThisMonthSpend'], expected_values['ThisMonthSpend'])
+
+    def test_restore_reloads_the_transaction_table(self):
+        snapshot_id = self.session.database.backup_old_database()
+        self.session.remove_transactions([0, 1, 2])
+        self.assertEqual(len(self.session.get_dataframe()), 1997)
+
+        self.assertEqual(self.session.restore_database(snapshot_id=snapshot_id), snapshot_id)
+        self.assertEqual(len(self.session.get_dataframe()), 2000)
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(self.session.get_dataframe()['Date']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import os
+import tempfile
+import unittest
+from os.path import join
+from datetime import datetime, timedelta
+
+import snapshots
+import aggregates
+import filter_plan
+from benchmarks import generator
+from benchmarks import runner
+
+
+class SnapshotStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.snapshot_store = snapshots.SnapshotStore(join(self.directory.name, 'snapshots'), chunk_size=64)
+        self.file_path = join(self.directory.name, 'file.txt')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_file(self, text):
+        with open(self.file_path, 'w', encoding='utf8') as file:
+            file.write(text)
+
+    def read_file(self, file_path):
+        with open(file_path, 'r', encoding='utf8') as file:
+            return file.read()
+
+    def get_chunk_count(self):
+        return sum(len(file_names) for path, directories, file_names in os.walk(self.snapshot_store.chunk_dir))
+
+    def test_unchanged_chunks_are_stored_once(self):
+        self.write_file("a" * 640)
+        self.snapshot_store.create({'file': self.file_path}, version="1")
+        chunk_count = self.get_chunk_count()
+
+        self.write_file("a" * 640 + "b")
+        self.snapshot_store.create({'file': self.file_path}, version="2")
+
+        # Only the new last chunk and the tree object of the second snapshot are added
+        self.assertEqual(self.get_chunk_count(), chunk_count + 2)
+
+    def test_snapshot_of_the_same_version_is_not_taken_again(self):
+        self.write_file("first")
+        snapshot = self.snapshot_store.create({'file': self.file_path}, version="1")
+
+        self.assertEqual(self.snapshot_store.create({'file': self.file_path}, version="1")['id'], snapshot['id'])
+        self.assertEqual(len(self.snapshot_store.get_snapshots()), 1)
+
+    def test_snapshots_are_found_by_id_and_timestamp(self):
+        created = datetime(2021, 3, 1, 12, 0)
+        snapshot_ids = list()
+        for day in range(3):
+            self.write_file(f"day {day}")
+            snapshot = self.snapshot_store.create({'file': self.file_path}, version=str(day),
+                                                  created=created + timedelta(days=day))
+            snapshot_ids.append(snapshot['id'])
+
+        self.assertEqual(self.snapshot_store.find(snapshot_id=snapshot_ids[1])['id'], snapshot_ids[1])
+        self.assertEqual(self.snapshot_store.find(timestamp=created + timedelta(days=1, hours=1))['id'],
+                         snapshot_ids[1])
+        self.assertEqual(self.snapshot_store.find(timestamp="2021-03-02")['id'], snapshot_ids[1])
+        self.assertEqual(self.snapshot_store.find()['id'], snapshot_ids[2])
+        self.assertIsNone(self.snapshot_store.find(timestamp=created - timedelta(days=1)))
+        self.assertIsNone(self.snapshot_store.find(snapshot_id="unknown"))
+
+    def test_restored_file_equals_the_snapshot(self):
+        self.write_file("original " * 50)
+        snapshot = self.snapshot_store.create({'file': self.file_path}, version="1")
+        self.write_file("changed")
+
+        restored_path = join(self.directory.name, 'restored.txt')
+        self.snapshot_store.restore_file(self.snapshot_store.get_tree(snapshot)['file'], restored_path)
+
+        self.assertEqual(self.read_file(restored_path), "original " * 50)
+
+    def test_prune_applies_the_retention_policy(self):
+        self.snapshot_store.retention_policy = {'last': 2, 'daily': 0, 'monthly': 0}
+        created = datetime(2021, 3, 1)
+        for day in range(5):
+            self.write_file(f"unique contents of day {day}")
+            self.snapshot_store.create({'file': self.file_path}, version=str(day),
+                                       created=created + timedelta(days=day))
+
+        removed_ids = self.snapshot_store.prune()
+
+        self.assertEqual(len(removed_ids), 3)
+        kept_snapshots = self.snapshot_store.get_snapshots()
+        self.assertEqual([snapshot['version'] for snapshot in kept_snapshots], ["3", "4"])
+
+        # The chunks of the removed snapshots are gone, the kept snapshots can still be restored
+        self.assertEqual(self.get_chunk_count(), 4)
+        for snapshot in kept_snapshots:
+            restored_path = join(self.directory.name, 'restored.txt')
+            self.snapshot_store.restore_file(self.snapshot_store.get_tree(snapshot)['file'], restored_path)
+            self.assertEqual(self.read_file(restored_path), f"unique contents of day {snapshot['version']}")
+
+
+class DatabaseBackupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = runner.create_database(self.directory.name)
+        self.db.save_database_store(generator.generate_transactions(1000, seed=11, years=1))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_restore_brings_back_the_store_and_the_journal(self):
+        df = self.db.get_current_database_dataframe()
+        df = self.db.remove_transaction_from_dataframe([0], df=df)
+        snapshot_id = self.db.backup_old_database(label="before")
+        version = self.db.get_database_version()
+        ids = df['ID'].tolist()
+
+        self.db.remove_transaction_from_dataframe([0, 1, 2], df=df)
+        self.db.compact_database()
+        self.assertNotEqual(self.db.get_database_version(), version)
+
+        self.assertEqual(self.db.restore_old_database(snapshot_id=snapshot_id), snapshot_id)
+        self.assertEqual(self.db.get_database_version(), version)
+        self.assertEqual(self.db.journal.get_entry_count(), 1)
+        self.assertEqual(self.db.get_current_database_dataframe()['ID'].tolist(), ids)
+
+    def test_restore_drops_the_state_derived_from_the_previous_table(self):
+        snapshot_id = self.db.backup_old_database()
+        df = self.db.remove_transaction_from_dataframe([0], df=self.db.get_current_database_dataframe())
+        filter_plan.get_filter_positions(df, {"Currency": "EUR"})
+        aggregates.get_monthly_cube(df)
+
+        self.db.restore_old_database(snapshot_id=snapshot_id)
+
+        self.assertIsNone(self.db.database_df)
+        self.assertEqual(self.db.change_log, [])
+        self.assertIsNone(aggregates.find_cached_aggregate(df, aggregates.MonthlyCube))
+        self.assertEqual(filter_plan._plan_cache, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
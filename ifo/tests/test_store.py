@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+from os.path import join
+
+import pandas as pd
+
+import store
+import schema
+import indexes
+from benchmarks import generator
+
+
+def assert_same_transactions(test_case, df, expected_df):
+    # Compares two transaction tables by their values, regardless of the categories of the categorical columns
+    test_case.assertEqual(list(df.columns), list(expected_df.columns))
+    pd.testing.assert_frame_equal(schema.apply_schema(df).reset_index(drop=True),
+                                  schema.apply_schema(expected_df).reset_index(drop=True), check_categorical=False)
+
+
+class ColumnStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.column_store = store.ColumnStore(join(self.directory.name, 'store'))
+        self.df = generator.generate_transactions(2000, seed=5, years=2)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_saved_table_is_loaded_sorted_by_date(self):
+        self.column_store.save(self.df)
+
+        self.assertEqual(self.column_store.get_row_count(), len(self.df))
+        assert_same_transactions(self, self.column_store.load(), indexes.sort_by_date(self.df))
+
+    def test_date_range_and_columns_are_loaded_on_their_own(self):
+        self.column_store.save(self.df)
+        start_date = pd.Timestamp(self.df['Date'].min()) + pd.Timedelta(days=100)
+        end_date = start_date + pd.Timedelta(days=60)
+
+        df = self.column_store.load(columns=["ID", "Date", "Output Value"], start_date=start_date, end_date=end_date)
+
+        sorted_df = indexes.sort_by_date(self.df)
+        expected_df = sorted_df.loc[(sorted_df['Date'] >= start_date) & (sorted_df['Date'] <= end_date),
+                                    ["ID", "Date", "Output Value"]]
+        assert_same_transactions(self, df, expected_df)
+
+    def test_chunks_give_the_same_store_as_a_single_save(self):
+        self.column_store.save(self.df)
+        version = self.column_store.get_version()
+
+        chunked_store = store.ColumnStore(join(self.directory.name, 'chunked_store'))
+        row_count = chunked_store.save_chunks(self.df.iloc[start:start + 300] for start in range(0, len(self.df), 300))
+
+        self.assertEqual(row_count, len(self.df))
+        self.assertEqual(chunked_store.get_version(), version)
+        assert_same_transactions(self, chunked_store.load(), self.column_store.load())
+
+    def test_failed_write_keeps_the_previous_store(self):
+        self.column_store.save(self.df.iloc[:100])
+        version = self.column_store.get_version()
+
+        def iter_chunks():
+            yield self.df.iloc[100:200]
+            raise ValueError("Invalid chunk")
+
+        with self.assertRaises(ValueError):
+            self.column_store.save_chunks(iter_chunks())
+
+        self.column_store.meta = None
+        self.assertEqual(self.column_store.get_version(), version)
+        self.assertEqual(len(self.column_store.load()), 100)
+        self.assertEqual(sorted(name for name in os.listdir(self.directory.name)), ['store'])
+
+
+if __name__ == '__main__':
+    unittest.main()
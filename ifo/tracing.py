@@ -0,0 +1,205 @@
+import os
+from os.path import join
+import json
+import time
+import atexit
+import threading
+import functools
+
+
+# Tracing is off unless it is switched on with the IFO_TRACE environment variable or enable(). If IFO_TRACE_DIR is set
+# as well, the summary and the Chrome trace are written to that directory when the process exits
+TRACE_VARIABLE = "IFO_TRACE"
+TRACE_DIR_VARIABLE = "IFO_TRACE_DIR"
+
+SUMMARY_FILE_NAME = "trace_summary.json"
+CHROME_TRACE_FILE_NAME = "trace.json"
+
+# Maximum amount of spans kept for the Chrome trace. The summary keeps counting after that
+MAX_EVENTS = 1000000
+
+_enabled = os.environ.get(TRACE_VARIABLE, "") not in ["", "0"]
+_lock = threading.Lock()
+
+# Recorded spans as (name, category, start, duration, thread id, arguments), with times in nanoseconds
+_events = list()
+_dropped_events = 0
+
+# Count, cumulative, minimum and maximum duration per span name
+_stats = dict()
+
+# Start of the recording, the zero point of the Chrome trace
+_origin = time.perf_counter_ns()
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    # Removes all recorded spans
+    global _events, _dropped_events, _stats, _origin
+
+    with _lock:
+        _events = list()
+        _dropped_events = 0
+        _stats = dict()
+        _origin = time.perf_counter_ns()
+
+
+def record(name, category, start, duration, args=None):
+    # Records a finished span
+    global _dropped_events
+
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            _stats[name] = [category, 1, duration, duration, duration]
+        else:
+            stats[1] += 1
+            stats[2] += duration
+            stats[3] = min(stats[3], duration)
+            stats[4] = max(stats[4], duration)
+
+        if len(_events) < MAX_EVENTS:
+            _events.append((name, category, start, duration, threading.get_ident(), args))
+        else:
+            _dropped_events += 1
+
+
+class Span:
+
+    def __init__(self, name, category="function", args=None):
+        # Times the code within a with statement as a span
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        record(self.name, self.category, self.start, time.perf_counter_ns() - self.start, self.args)
+
+
+class NullSpan:
+
+    # Span that doesn't record anything, used while tracing is off
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_null_span = NullSpan()
+
+
+def span(name, category="function", **args):
+    # Gets a span for a with statement. While tracing is off, this is a span that does nothing
+    if not _enabled:
+        return _null_span
+
+    return Span(name, category, args or None)
+
+
+def traced(name=None, category="function"):
+    # Decorator recording a span for every call of a function. While tracing is off, the only cost is one check
+    def decorator(function):
+        span_name = function.__qualname__ if name is None else name
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(span_name, category, start, time.perf_counter_ns() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def get_summary():
+    # Gets the count and the cumulative, mean, minimum and maximum duration in milliseconds per span name, the spans
+    # with the largest cumulative duration first
+    with _lock:
+        stats_items = [(name, list(stats)) for name, stats in _stats.items()]
+        dropped_events = _dropped_events
+
+    spans = dict()
+    for name, (category, count, total, minimum, maximum) in sorted(stats_items, key=lambda item: -item[1][2]):
+        spans[name] = {'category': category,
+                       'count': count,
+                       'total_ms': total / 1e6,
+                       'mean_ms': total / count / 1e6,
+                       'min_ms': minimum / 1e6,
+                       'max_ms': maximum / 1e6}
+
+    return {'spans': spans, 'dropped_events': dropped_events}
+
+
+def get_chrome_trace():
+    # Gets the recorded spans in the Chrome trace event format (chrome://tracing or Perfetto), with times in
+    # microseconds
+    with _lock:
+        events = list(_events)
+        origin = _origin
+
+    process_id = os.getpid()
+    trace_events = list()
+    for name, category, start, duration, thread_id, args in events:
+        trace_event = {'name': name,
+                       'cat': category,
+                       'ph': "X",
+                       'ts': (start - origin) / 1000,
+                       'dur': duration / 1000,
+                       'pid': process_id,
+                       'tid': thread_id}
+        if args:
+            trace_event['args'] = {key: str(value) for key, value in args.items()}
+        trace_events.append(trace_event)
+
+    return {'traceEvents': trace_events, 'displayTimeUnit': "ms"}
+
+
+def save_summary(summary_path):
+    with open(summary_path, 'w', encoding='utf8') as file:
+        json.dump(get_summary(), file, indent=4)
+
+
+def save_chrome_trace(trace_path):
+    with open(trace_path, 'w', encoding='utf8') as file:
+        json.dump(get_chrome_trace(), file)
+
+
+def save(trace_dir):
+    # Saves the summary and the Chrome trace into a directory
+    os.makedirs(trace_dir, exist_ok=True)
+    save_summary(join(trace_dir, SUMMARY_FILE_NAME))
+    save_chrome_trace(join(trace_dir, CHROME_TRACE_FILE_NAME))
+
+
+def save_at_exit():
+    trace_dir = os.environ.get(TRACE_DIR_VARIABLE)
+    if trace_dir and _stats:
+        save(trace_dir)
+
+
+atexit.register(save_at_exit)
@@ -0,0 +1,155 @@
+import os
+import calendar
+import threading
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import tracing
+import compute
+import metrics
+import aggregates
+import session
+import selection
+
+
+# Transaction table and metric template of a worker process, set once when the worker starts
+_worker_df = None
+_worker_template_dict = None
+
+
+def init_worker(df, template_dict, version):
+    # Receives the transaction table and the template once per worker, instead of once per selection. The table is
+    # registered with its database version, so the worker builds the indexes of the table once
+    global _worker_df, _worker_template_dict
+    _worker_df = df
+    _worker_template_dict = template_dict
+    aggregates.set_dataframe_version(df, version)
+
+
+def compute_selection(selection_snapshot, today):
+    # Evaluates all template metrics of a selection in a worker process
+    return compute.get_backend_metrics(_worker_df, selection_snapshot, template_dict=_worker_template_dict,
+                                       today=today)
+
+
+def get_warmup_months(df, currency, today=None):
+    # Gets the (year, month number) of every month from the first transaction of a currency up to the last
+    # transaction of the table, and this month, which the Dashboard shows by default
+    if today is None:
+        today = datetime.today().date()
+
+    currency_dates = df.loc[(df["Currency"] == currency).to_numpy(), 'Date']
+    if len(currency_dates) == 0:
+        return list()
+
+    first_date = currency_dates.min()
+    last_date = df['Date'].max()
+
+    months = list()
+    year, month = first_date.year, first_date.month
+    while (year, month) <= (last_date.year, last_date.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    if (today.year, today.month) not in months:
+        months.append((today.year, today.month))
+
+    return months
+
+
+def get_warmup_selections(df, currencies=None, today=None, category_list=None):
+    # Gets the selections of every currency, year and month of the database, with the accounts a refreshed Dashboard
+    # selects for them and the categories listed in the Backend sheet
+    if currencies is None:
+        currencies = compute.get_validation_list(df, "CurrencyValidation")
+
+    selections = list()
+    for currency in currencies:
+        months = get_warmup_months(df, currency, today=today)
+        if not months:
+            continue
+
+        # The selected accounts only depend on the currency, so they are determined once per currency
+        currency_selection = compute.get_default_selection(df, currency, months[0][0], months[0][1])
+        for year, month in months:
+            selection_dict = dict(currency_selection.selection_dict)
+            selection_dict["YearValidation"] = year
+            selection_dict["MonthValidation"] = calendar.month_name[month]
+            selections.append(selection.get_sheet_selection(selection_dict, category_list=category_list))
+
+    return selections
+
+
+class BufferWarmer:
+
+    def __init__(self, current_session=None, max_workers=None):
+        # Fills the metric cache of the session ahead of time with the metrics of every currency, year and month of the
+        # database, evaluated on a pool of worker processes. Switching the month or currency of the Dashboard is then
+        # served from the cache
+        self.session = session.get_session(current_session)
+        self.max_workers = os.cpu_count() if max_workers is None else max_workers
+
+        # Background warm-up thread, if one has been started
+        self.thread = None
+
+        # Amount of selections computed and skipped (already cached) by the last warm-up
+        self.result = {'computed': 0, 'skipped': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    @tracing.traced(category="warmer")
+    def warm(self, currencies=None, today=None, save=True, category_list=None):
+        # Computes the metrics of all selections that are not cached for the current database version yet. By default
+        # the selections list the categories of the metric template, as the Backend sheet does
+        if today is None:
+            today = datetime.today().date()
+
+        df = self.session.get_dataframe()
+        version = aggregates.get_dataframe_version(df)
+        cache = self.session.metric_cache
+        if version is None:
+            return self.result
+
+        if category_list is None:
+            category_list = metrics.get_listed_categories(cache.get_template())
+
+        selections = get_warmup_selections(df, currencies=currencies, today=today, category_list=category_list)
+        missing_selections = [selection_snapshot for selection_snapshot in selections
+                              if not cache.contains(version, selection_snapshot, today=today)]
+        self.result = {'computed': len(missing_selections), 'skipped': len(selections) - len(missing_selections)}
+
+        # The cache has to hold all warmed up selections, otherwise the first ones would be evicted again
+        cache.max_entries = max(cache.max_entries, len(selections))
+
+        if missing_selections:
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=init_worker,
+                                     initargs=(df, cache.get_template(), version)) as executor:
+                chunk_size = max(1, len(missing_selections) // (4 * self.max_workers))
+                value_dicts = executor.map(compute_selection, missing_selections,
+                                           [today] * len(missing_selections), chunksize=chunk_size)
+
+                for selection_snapshot, values in zip(missing_selections, value_dicts):
+                    cache.put(version, selection_snapshot, values, today=today)
+
+        if save:
+            cache.save()
+
+        return self.result
+
+    def start(self, currencies=None, today=None, category_list=None):
+        # Starts the warm-up in a background thread, so the Dashboard can be used in the meantime
+        self.thread = threading.Thread(target=self.warm, kwargs={'currencies': currencies, 'today': today,
+                                                                 'category_list': category_list},
+                                       name="BufferWarmer", daemon=True)
+        self.thread.start()
+
+        return self.thread
+
+    def join(self, timeout=None):
+        # Waits for the background warm-up to finish
+        if self.thread is not None:
+            self.thread.join(timeout)